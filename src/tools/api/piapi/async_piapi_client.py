@@ -0,0 +1,129 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+from tools.api.piapi.piapi_client import (
+    PIAPI_HOST,
+    PIAPI_STATES,
+    PiAPIClient,
+    build_image2video_payload,
+    task_id_from_response,
+)
+from tools.common.download import async_download_file
+from tools.common.errors import Deadline, PermanentError, error_for_status, parse_retry_after
+from tools.common.logging import LazyPayload, default_logger
+from tools.common.poller import TaskState, TaskStatus, async_watch
+from tools.common.resilience import network_errors
+
+
+class AsyncPiAPIClient:
+    """
+    asyncio-native client for the PiAPI task API.
+
+    Waiting on a task yields to the event loop instead of sleeping a thread, so a
+    single process can keep many generations in flight. Failures raise the same
+    typed errors as PiAPIClient.
+    """
+
+    PROVIDER = PiAPIClient.PROVIDER
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.logger = default_logger
+        self.api_key = os.getenv("PI_API_KEY")
+        self.base_url = os.getenv("PIAPI_BASE_URL", f"https://{PIAPI_HOST}")
+        self.http_client = http_client or httpx.AsyncClient(timeout=60)
+
+    def _raise_for_status(self, response: httpx.Response) -> None:
+        if response.status_code >= 400:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+    async def get_status(self, task_id: str) -> TaskStatus:
+        """
+        Check a task once and map PiAPI's status onto a TaskStatus carrying the task.
+        """
+        with network_errors(self.PROVIDER):
+            response = await self.http_client.get(
+                f"{self.base_url}/api/v1/task/{task_id}", headers={"x-api-key": self.api_key}
+            )
+        self._raise_for_status(response)
+        try:
+            task = response.json()
+            status = task["data"]["status"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"unexpected task {task_id}: {response.text[:200]}") from e
+        return TaskStatus(PIAPI_STATES.get(status, TaskState.RUNNING), payload=task, error=status)
+
+    async def submit_image2video(self, image_url: str, prompt: str) -> str:
+        """
+        Submit a video generation task and return its task ID without waiting for it.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        with network_errors(self.PROVIDER):
+            response = await self.http_client.post(
+                f"{self.base_url}/api/v1/task",
+                content=json.dumps(build_image2video_payload(image_url, prompt)),
+                headers={"x-api-key": self.api_key, "Content-Type": "application/json"},
+            )
+        self._raise_for_status(response)
+        self.logger.debug("Video task submitted: %s", LazyPayload(response.text))
+        try:
+            return task_id_from_response(response.json())
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no task ID in response: {response.text[:200]}") from e
+
+    async def watch_image2video(self, task_id: str, timeout: float = 600) -> TaskStatus:
+        """Wait for a submitted task and return its final TaskStatus."""
+        return await async_watch(self.PROVIDER, task_id, self.get_status, timeout=timeout)
+
+    async def download_image2video(self, task_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Download the video of a task that finished with ``status``. Raises
+        TransientError if the transfer fails and PermanentError if the task has
+        no video.
+        """
+        try:
+            video_url = status.payload["data"]["output"]["works"][0]["video"]["resource_without_watermark"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no video in finished task: {e}") from e
+        self.logger.debug(f"Video generated successfully, downloading video from url: {video_url}")
+        with network_errors(self.PROVIDER):
+            await async_download_file(self.http_client, video_url, output_path)
+        self.logger.debug(f"Video downloaded successfully to path: {output_path}")
+
+    async def cancel(self, task_id: str) -> None:
+        """
+        Cancel a task that is no longer needed. PiAPI only cancels tasks that
+        have not started processing yet.
+        """
+        try:
+            await self.http_client.delete(f"{self.base_url}/api/v1/task/{task_id}", headers={"x-api-key": self.api_key})
+        except Exception as e:
+            self.logger.error(f"Failed to cancel task with task_id: {task_id}, error: {e}")
+
+    async def image2video(self,
+                          image_url: str,
+                          prompt: str,
+                          output_path: str,
+                          deadline: Optional[Deadline] = None) -> None:
+        """
+        Generate a video from the image at ``image_url``, without retries. Raises a
+        typed error if no video was made; a task still running at ``deadline`` is
+        cancelled.
+        """
+        deadline = deadline or Deadline(None)
+        self.logger.debug(f"Generating video from image with url: {image_url}")
+        task_id = await self.submit_image2video(image_url, prompt)
+        try:
+            status = await self.watch_image2video(task_id, timeout=deadline.remaining(600))
+        except BaseException:
+            await self.cancel(task_id)
+            raise
+        if status.state != TaskState.SUCCEEDED:
+            raise PermanentError(self.PROVIDER, f"task {task_id} did not succeed, status: {status.error}")
+        await self.download_image2video(task_id, status, output_path)
@@ -1,107 +1,223 @@
-import http.client
 import json
 import os
-import requests
 
-import time
-from typing import Dict, Any
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from tools.common.download import download_file
+from tools.common.errors import PermanentError, error_for_status, parse_retry_after
+from tools.common.logging import LazyPayload, default_logger
+from tools.common.poller import Poller, TaskState, TaskStatus, default_poller
+from tools.common.resilience import network_errors
+from tools.common.staging import InputStager, default_stager
+from tools.common.transport import HTTPTransport, default_transport
+from tools.common.webhook import WebhookReceiver, default_webhook_receiver, verify_shared_secret
+
+PIAPI_HOST = "api.piapi.ai"
+
+PIAPI_STATES = {
+    "Pending": TaskState.PENDING,
+    "Staged": TaskState.PENDING,
+    "Processing": TaskState.RUNNING,
+    "Completed": TaskState.SUCCEEDED,
+    "Failed": TaskState.FAILED,
+}
+
+
+def build_image2video_payload(image_url: str,
+                              prompt: str,
+                              webhook_endpoint: str = "",
+                              webhook_secret: str = "") -> Dict[str, Any]:
+    """
+    Build the PiAPI kling video_generation task payload for an image and prompt.
+    """
+    return {
+        "model": "kling",
+        "task_type": "video_generation",
+        "input": {
+            "image_url": image_url,
+            "prompt": prompt,
+            "negative_prompt": "distort the image, show anything that is not in the image, like human hand or fingers.",
+            "cfg_scale": 0.5,
+            "duration": 5,
+            "aspect_ratio": "9:16",
+            "camera_control": {
+                "type": "simple",
+                "config": {
+                    "horizontal": 0,
+                    "vertical": 0,
+                    "pan": -10,
+                    "tilt": 0,
+                    "roll": 0,
+                    "zoom": 0,
+                },
+            },
+            "mode": "std",
+        },
+        "config": {
+            "service_mode": "",
+            "webhook_config": {"endpoint": webhook_endpoint, "secret": webhook_secret},
+        },
+    }
+
+
+def task_id_from_response(body: Dict[str, Any]) -> str:
+    """
+    Task ID from a create-task response. The API wraps the task in ``data`` like a
+    task lookup; older responses had the ID at the top level.
+    """
+    return (body.get("data") or body)["task_id"]
+
+
+def parse_webhook(body: Dict[str, Any]) -> Tuple[str, TaskStatus]:
+    """
+    Map a PiAPI task callback onto (task_id, TaskStatus). The callback's ``data``
+    has the same shape as a task fetched from the API.
+    """
+    status = body["data"]["status"]
+    return body["data"]["task_id"], TaskStatus(
+        PIAPI_STATES.get(status, TaskState.RUNNING), payload=body, error=status
+    )
 
-from tools.common.logging import default_logger
 
 class PiAPIClient:
-    def __init__(self):
+    PROVIDER = "PiAPI"
+
+    def __init__(self,
+                 poller: Optional[Poller] = None,
+                 webhook_receiver: Optional[WebhookReceiver] = None,
+                 transport: Optional[HTTPTransport] = None,
+                 stager: Optional[InputStager] = None):
         self.logger = default_logger
+        self.poller = poller or default_poller()
+        self.transport = transport or default_transport()
+        # PiAPI fetches start images by URL; local files are published through the stager.
+        self.stager = stager or default_stager()
+        self.base_url = os.getenv("PIAPI_BASE_URL", f"https://{PIAPI_HOST}")
         self.api_key = os.getenv("PI_API_KEY")
-        self.conn = http.client.HTTPSConnection("api.piapi.ai")
+        self.webhook_receiver = webhook_receiver or default_webhook_receiver()
+        self.webhook_endpoint = ""
+        self.webhook_secret = ""
+        if self.webhook_receiver is not None:
+            self.webhook_endpoint = self.webhook_receiver.endpoint(self.PROVIDER)
+            self.webhook_secret = os.getenv("PI_API_WEBHOOK_SECRET") or self.webhook_receiver.shared_secret
+            self.webhook_receiver.register(
+                self.PROVIDER, parse_webhook, self.webhook_secret, verify_shared_secret
+            )
+
+    def _raise_for_status(self, response) -> None:
+        if response.status_code >= 400:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
 
     def _get_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        Fetch a task. Raises TransientError for network and server errors and
+        PermanentError when the task cannot be read.
+        """
+        headers = {"x-api-key": self.api_key}
+        with network_errors(self.PROVIDER):
+            response = self.transport.get(f"{self.base_url}/api/v1/task/{task_id}", headers=headers)
+        self._raise_for_status(response)
         try:
-            headers = {"x-api-key": self.api_key}
-            self.conn.request("GET", f"/api/v1/task/{task_id}", headers=headers)
-            res = self.conn.getresponse()
-            data = res.read()
-            return json.loads(data.decode("utf-8"))
-        except Exception as e:
-            self.logger.error(f"Failed to get task with task_id: {task_id}, error: {e}")
+            task = response.json()
+            task["data"]["status"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"unexpected task {task_id}: {response.text[:200]}") from e
+        return task
 
     def _get_video(self, task: Dict[str, Any], output_path: str) -> None:
         try:
             video_url = task["data"]["output"]["works"][0]["video"][
                 "resource_without_watermark"
             ]
-            self.logger.debug(
-                f"Video generated successfully, downloading video from url: {video_url}"
-            )
-            response = requests.get(video_url)
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                f.write(response.content)               
-            self.logger.debug(f"Video downloaded successfully to path: {output_path}")
+        except (KeyError, IndexError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no video in finished task: {e}") from e
+        self.logger.debug(
+            f"Video generated successfully, downloading video from url: {video_url}"
+        )
+        with network_errors(self.PROVIDER):
+            download_file(video_url, output_path, session=self.transport.session)
+        self.logger.debug(f"Video downloaded successfully to path: {output_path}")
+
+    def get_status(self, task_id: str) -> TaskStatus:
+        """
+        Check a task once and map PiAPI's status onto a TaskStatus carrying the task.
+        """
+        task = self._get_task(task_id)
+        status = task["data"]["status"]
+        return TaskStatus(PIAPI_STATES.get(status, TaskState.RUNNING), payload=task, error=status)
+
+    def submit_image2video(self, image_url: str, prompt: str) -> str:
+        """
+        Submit a video generation task and return its task ID without waiting for it.
+        A local file is staged first and submitted by URL.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        image_url = self.stager.url_for(image_url)
+        payload = json.dumps(
+            build_image2video_payload(image_url, prompt, self.webhook_endpoint, self.webhook_secret)
+        )
+        headers = {"x-api-key": self.api_key, "Content-Type": "application/json"}
+
+        with network_errors(self.PROVIDER):
+            response = self.transport.post(f"{self.base_url}/api/v1/task", data=payload, headers=headers)
+        self._raise_for_status(response)
+        data = response.text
+        self.logger.debug("Video task submitted: %s", LazyPayload(data))
+        try:
+            return task_id_from_response(json.loads(data))
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no task ID in response: {data[:200]}") from e
+
+    def watch_image2video(self,
+                          task_id: str,
+                          timeout: float = 600,
+                          on_update: Optional[Callable[[TaskStatus], None]] = None) -> Future:
+        """
+        Hand a submitted task to the poller; the Future resolves to its final TaskStatus.
+        ``on_update`` receives every status the poller sees on the way.
+        """
+        return self.poller.watch(self.PROVIDER, task_id, self.get_status, timeout=timeout, on_update=on_update)
+
+    def download_image2video(self, task_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Download the video of a task that finished with ``status``. Raises
+        TransientError if the transfer fails and PermanentError if the task has
+        no video.
+        """
+        self._get_video(status.payload, output_path)
+
+    def cancel(self, task_id: str) -> None:
+        """
+        Cancel a task that is no longer needed. PiAPI only cancels tasks that
+        have not started processing yet.
+        """
+        try:
+            self.transport.delete(f"{self.base_url}/api/v1/task/{task_id}", headers={"x-api-key": self.api_key})
         except Exception as e:
-            self.logger.error(f"Failed to download video, error: {e}")
+            self.logger.error(f"Failed to cancel task with task_id: {task_id}, error: {e}")
+
+    def resume_image2video(self, task_id: str, output_path: str) -> None:
+        """
+        Wait for an already submitted task and download its video.
+        """
+        status = self.watch_image2video(task_id).result()
+        if status.state == TaskState.SUCCEEDED:
+            self.download_image2video(task_id, status, output_path)
+        else:
+            self.logger.error(
+                f"Failed to generate video for task: {task_id}, task status: {status.error}"
+            )
 
     def image2video(self, image_url: str, prompt: str, output_path: str) -> None:
         try:
             self.logger.debug(f"Generating video from image with url: {image_url}")
-            payload = json.dumps(
-                {
-                    "model": "kling",
-                    "task_type": "video_generation",
-                    "input": {
-                        "image_url": image_url,
-                        "prompt": prompt,
-                        "negative_prompt": "distort the image, show anything that is not in the image, like human hand or fingers.",
-                        "cfg_scale": 0.5,
-                        "duration": 5,
-                        "aspect_ratio": "9:16",
-                        "camera_control": {
-                            "type": "simple",
-                            "config": {
-                                "horizontal": 0,
-                                "vertical": 0,
-                                "pan": -10,
-                                "tilt": 0,
-                                "roll": 0,
-                                "zoom": 0,
-                            },
-                        },
-                        "mode": "std",
-                    },
-                    "config": {
-                        "service_mode": "",
-                        "webhook_config": {"endpoint": "", "secret": ""},
-                    },
-                }
-            )
-
-            headers = {"x-api-key": self.api_key, "Content-Type": "application/json"}
-
-            self.conn.request("POST", "/api/v1/task", payload, headers)
-            res = self.conn.getresponse()
-            data = res.read().decode("utf-8")
-            self.logger.debug(f"Video task submitted: {data}")
-            task_id = json.loads(data)["task_id"]
-
-            timeout = 600
-            task = self._get_task(task_id)
-            self.logger.debug(f"Video task retrieved: \n{json.dumps(task, indent=4)}")
-            while timeout > 0 and (
-                task["data"]["status"] != "Completed"
-                or task["data"]["status"] != "Failed"
-            ):
-                time.sleep(15)
-                timeout -= 15
-                task = self._get_task(task_id)
-
-            if task["data"]["status"] == "Completed":
-                self._get_video(task, output_path)
-            else:
-                self.logger.error(
-                    f"Failed to generate video from image with url: {image_url},"
-                    f" task status: {task['data']['status']}"
-                )
+            task_id = self.submit_image2video(image_url, prompt)
+            self.resume_image2video(task_id, output_path)
         except Exception as e:
             self.logger.error(
                 f"Failed to generate video from image with path: {image_url}, error: {e}"
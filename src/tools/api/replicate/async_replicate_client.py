@@ -0,0 +1,142 @@
+import os
+from typing import Dict, Optional
+
+import httpx
+
+from tools.api.replicate.replicate_client import (
+    IMAGE2VIDEO_MODEL,
+    ReplicateClient,
+    build_image2video_input,
+    prediction_status,
+    predictions_url,
+)
+from tools.common.download import async_download_file
+from tools.common.errors import Deadline, PermanentError, error_for_status, parse_retry_after
+from tools.common.logging import default_logger
+from tools.common.poller import TaskState, TaskStatus, async_watch
+from tools.common.resilience import network_errors
+
+
+class AsyncReplicateClient:
+    """
+    asyncio-native client for Replicate's image-to-video predictions.
+
+    Talks to the HTTP API directly on the given ``httpx.AsyncClient``, rather than
+    through the SDK's own client, so uploads, status checks and downloads all share
+    one connection pool and its limits. Failures raise the same typed errors as
+    ReplicateClient.
+    """
+
+    PROVIDER = ReplicateClient.PROVIDER
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.logger = default_logger
+        self.base_url = os.getenv("REPLICATE_BASE_URL", "https://api.replicate.com")
+        self.http_client = http_client or httpx.AsyncClient(timeout=60)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {os.getenv('REPLICATE_API_TOKEN')}"}
+
+    def _raise_for_status(self, response: httpx.Response) -> None:
+        if response.status_code >= 400:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+    async def _upload_file(self, path: str) -> str:
+        """Upload a file through the files API and return the URL predictions can take it from."""
+        with open(path, "rb") as f:
+            with network_errors(self.PROVIDER):
+                response = await self.http_client.post(
+                    f"{self.base_url}/v1/files",
+                    headers=self._headers(),
+                    data={"metadata": "{}"},
+                    files={"content": (os.path.basename(path), f)},
+                )
+        self._raise_for_status(response)
+        return response.json()["urls"]["get"]
+
+    async def get_status(self, prediction_id: str) -> TaskStatus:
+        """
+        Check a prediction once and return a TaskStatus carrying the prediction.
+        """
+        with network_errors(self.PROVIDER):
+            response = await self.http_client.get(
+                f"{self.base_url}/v1/predictions/{prediction_id}", headers=self._headers()
+            )
+        self._raise_for_status(response)
+        return prediction_status(response.json())
+
+    async def submit_image2video(self, image_path: str, prompt: str) -> str:
+        """
+        Create an image-to-video prediction and return its ID without waiting for it.
+        A local image is uploaded first.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        start_image = image_path
+        if not image_path.startswith(("http://", "https://")):
+            start_image = await self._upload_file(image_path)
+        url, model = predictions_url(self.base_url, IMAGE2VIDEO_MODEL)
+        with network_errors(self.PROVIDER):
+            response = await self.http_client.post(
+                url, headers=self._headers(), json={**model, "input": build_image2video_input(prompt, start_image)}
+            )
+        self._raise_for_status(response)
+        try:
+            return response.json()["id"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no prediction ID in response: {response.text[:200]}") from e
+
+    async def watch_image2video(self, prediction_id: str, timeout: float = 600) -> TaskStatus:
+        """Wait for a prediction and return its final TaskStatus."""
+        return await async_watch(self.PROVIDER, prediction_id, self.get_status, timeout=timeout)
+
+    async def download_image2video(self, prediction_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Download the video of a prediction that finished with ``status``. Raises
+        TransientError if the transfer fails.
+        """
+        with network_errors(self.PROVIDER):
+            await async_download_file(self.http_client, status.payload["output"], output_path)
+
+    async def cancel(self, prediction_id: str) -> None:
+        """
+        Cancel a prediction that is no longer needed.
+        """
+        try:
+            await self.http_client.post(
+                f"{self.base_url}/v1/predictions/{prediction_id}/cancel", headers=self._headers()
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to cancel prediction: {prediction_id}, error: {e}")
+
+    async def image2video(self,
+                          image_path: str,
+                          prompt: str,
+                          output_path: str,
+                          deadline: Optional[Deadline] = None) -> None:
+        """
+        Generate a video from the provided image and prompt, without retries.
+
+        Parameters:
+            image_path (str): Path or URL of the input image.
+            prompt (str): Prompt or caption to guide video generation.
+            output_path (str): Path where the generated video will be saved.
+            deadline (Deadline): When to stop waiting; a prediction still running
+                then is cancelled.
+
+        Raises a typed error if no video was made.
+        """
+        deadline = deadline or Deadline(None)
+        self.logger.debug(f"Generating video from image: {image_path}")
+        prediction_id = await self.submit_image2video(image_path, prompt)
+        try:
+            status = await self.watch_image2video(prediction_id, timeout=deadline.remaining(600))
+        except BaseException:
+            await self.cancel(prediction_id)
+            raise
+        if status.state != TaskState.SUCCEEDED:
+            raise PermanentError(self.PROVIDER, f"prediction {prediction_id} did not succeed, status: {status.error}")
+        await self.download_image2video(prediction_id, status, output_path)
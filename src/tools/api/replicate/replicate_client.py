@@ -1,10 +1,123 @@
-import replicate
-import requests
-import time
+import hashlib
+import json
 import os
+import tempfile
+import threading
+import replicate
 
-from typing import Dict, Any
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from tools.common.audio import detect_silences, extract_chunk, merge_transcripts, plan_chunks, probe_duration
+from tools.common.download import download_file
+from tools.common.errors import PermanentError, error_for_status, parse_retry_after
 from tools.common.logging import default_logger
+from tools.common.poller import Poller, TaskState, TaskStatus, default_poller
+from tools.common.resilience import network_errors
+from tools.common.result_cache import ResultCache, hash_file
+from tools.common.staging import InputStager, MultipartStream, default_stager
+from tools.common.transport import HTTPTransport, default_transport
+from tools.common.webhook import WebhookReceiver, default_webhook_receiver, verify_standard_webhook
+
+IMAGE2VIDEO_MODEL = "kwaivgi/kling-v1.6-standard"
+IMAGE2TEXT_MODEL = "salesforce/blip:2e1dddc8621f72155f24cf2e0adbde548458d3cab9f00c0139eea840d0ac4746"
+TEXT2IMAGE_MODEL = "black-forest-labs/flux-schnell"
+# Uploaded files expire after a day; staged handles are reused for a little less.
+FILE_TTL_SECONDS = 23 * 3600
+SPEECH2TEXT_MODEL = "vaibhavs10/incredibly-fast-whisper:3ab86df6c8f54c11309d4d1f930ac292bad43ace52d10c80d87eb258b3c9f79c"
+
+
+def build_image2video_input(prompt: str, start_image: Any) -> Dict[str, Any]:
+    """
+    Build the kling-v1.6-standard prediction input for a start image and prompt.
+    """
+    return {
+        "prompt": prompt,
+        "duration": 5,
+        "cfg_scale": 0.5,
+        "start_image": start_image,
+        "aspect_ratio": "9:16",
+        "negative_prompt": (
+            "distort the image, show anything that is not in the image, "
+            "like human hand or fingers."
+        )
+    }
+
+
+def build_text2image_input(prompt: str, num_outputs: int = 1) -> Dict[str, Any]:
+    """
+    Build the flux-schnell input for a prompt; the model returns up to four images.
+    """
+    return {
+        "prompt": prompt,
+        "go_fast": True,
+        "num_outputs": num_outputs,
+        "aspect_ratio": "16:9",
+        "output_format": "png",
+        "output_quality": 80,
+        "disable_safety_checker": False
+    }
+
+
+def build_speech2text_input(audio: Any) -> Dict[str, Any]:
+    """
+    Build the incredibly-fast-whisper input for an audio file, with segment timestamps.
+    """
+    return {
+        "task": "transcribe",
+        "audio": audio,
+        "language": "None",
+        "timestamp": "chunk",
+        "diarise_audio": False
+    }
+
+
+REPLICATE_STATES = {
+    "starting": TaskState.PENDING,
+    "processing": TaskState.RUNNING,
+    "succeeded": TaskState.SUCCEEDED,
+    "failed": TaskState.FAILED,
+    "canceled": TaskState.FAILED,
+}
+
+
+def prediction_status(prediction: Dict[str, Any]) -> TaskStatus:
+    """Map a prediction, as the API or a webhook returns it, onto a TaskStatus carrying it."""
+    return TaskStatus(
+        REPLICATE_STATES.get(prediction["status"], TaskState.RUNNING),
+        payload=prediction,
+        error=prediction["status"],
+    )
+
+
+# Words in Replicate's validation errors for a start image URL it could not fetch.
+_FETCH_FAILURES = ("fetch", "download", "expired", "not found", "404")
+
+
+def _rejects_input(status_code: int, text: str) -> bool:
+    """
+    Whether Replicate turned a prediction away because it could not fetch the
+    staged start image, e.g. because the uploaded file expired early. Other
+    validation errors are not, since uploading again would not fix them.
+    """
+    text = text.lower()
+    return (status_code in (400, 404, 422) and "start_image" in text
+            and any(word in text for word in _FETCH_FAILURES))
+
+
+def predictions_url(base_url: str, model: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    URL that creates a prediction of ``model`` and the body fields naming it: an
+    ``owner/name`` model runs its latest version, ``owner/name:version`` that version.
+    """
+    if ":" in model:
+        return f"{base_url}/v1/predictions", {"version": model.split(":", 1)[1]}
+    return f"{base_url}/v1/models/{model}/predictions", {}
+
+
+def parse_webhook(body: Dict[str, Any]) -> Tuple[str, TaskStatus]:
+    """Map a Replicate prediction callback onto (prediction_id, TaskStatus)."""
+    return body["id"], prediction_status(body)
 
 
 class ReplicateClient:
@@ -12,28 +125,70 @@ class ReplicateClient:
     Client for interacting with Replicate's API to perform various media processing tasks.
     """
 
-    def __init__(self):
+    PROVIDER = "Replicate"
+    # Pages of recent predictions a batch status check reads at most.
+    MAX_STATUS_PAGES = 5
+    # Creation times of predictions submitted here, kept to know when to stop paging.
+    MAX_TRACKED = 10000
+
+    def __init__(self,
+                 poller: Optional[Poller] = None,
+                 webhook_receiver: Optional[WebhookReceiver] = None,
+                 transport: Optional[HTTPTransport] = None,
+                 cache: Optional[ResultCache] = None,
+                 stager: Optional[InputStager] = None):
         self.logger = default_logger
+        self.poller = poller or default_poller()
+        self.transport = transport or default_transport()
+        self.cache = cache
+        self.stager = stager or default_stager()
+        # Uploaded files belong to the account that uploaded them, so staged URLs are
+        # only shared between clients that use the same API token.
+        token = os.getenv("REPLICATE_API_TOKEN")
+        self.staging_namespace = self.PROVIDER
+        if token:
+            self.staging_namespace += ":" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+        self.base_url = os.getenv("REPLICATE_BASE_URL", "https://api.replicate.com")
+        self._created: "OrderedDict[str, str]" = OrderedDict()
+        self._created_lock = threading.Lock()
+        self.poller.set_batch_check(self.PROVIDER, self.get_statuses)
+        self.webhook_receiver = webhook_receiver or default_webhook_receiver()
+        if self.webhook_receiver is not None:
+            secret = os.getenv("REPLICATE_WEBHOOK_SECRET") or replicate.webhooks.default.secret().key
+            self.webhook_receiver.register(self.PROVIDER, parse_webhook, secret, verify_standard_webhook)
 
     def image2text(self, image_path: str) -> str:
         """
         Generate a textual caption from the given image.
 
         Parameters:
-            image_path (str): Path to the image file.
+            image_path (str): Path or URL of the image.
 
         Returns:
             str: Generated caption or an empty string if an error occurs.
         """
         try:
-            with open(image_path, "rb") as image_file:
-                payload = {"image": image_file}
-                output = replicate.run(
-                    "salesforce/blip:2e1dddc8621f72155f24cf2e0adbde548458d3cab9f00c0139eea840d0ac4746",
-                    input=payload
-                )
+            is_url = image_path.startswith(("http://", "https://"))
+            cache_key = None
+            if self.cache is not None:
+                if is_url:
+                    cache_key = self.cache.key({"task": "image2text", "model": IMAGE2TEXT_MODEL, "image": image_path})
+                else:
+                    cache_key = self.cache.key({"task": "image2text", "model": IMAGE2TEXT_MODEL}, [image_path])
+                cached = self.cache.get_text(cache_key)
+                if cached is not None:
+                    return cached
+
+            if is_url:
+                output = replicate.run(IMAGE2TEXT_MODEL, input={"image": image_path})
+            else:
+                with open(image_path, "rb") as image_file:
+                    payload = {"image": image_file}
+                    output = replicate.run(IMAGE2TEXT_MODEL, input=payload)
             if output.startswith("Caption:"):
                 output = output.replace("Caption:", "").strip()
+            if cache_key is not None and output:
+                self.cache.put_text(cache_key, output)
             return output
         except Exception as e:
             self.logger.error(
@@ -41,6 +196,156 @@ class ReplicateClient:
             )
             return ""
 
+    def _headers(self, content_type: str = "application/json") -> Dict[str, str]:
+        return {"Authorization": f"Bearer {os.getenv('REPLICATE_API_TOKEN')}", "Content-Type": content_type}
+
+    def _raise_for_status(self, response) -> None:
+        if response.status_code >= 400:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
+
+    def _upload_file(self, path: str) -> str:
+        """
+        Upload a file through the files API, streamed from disk, and return the URL
+        predictions can take it from.
+        """
+        body = MultipartStream({"metadata": "{}"}, {"content": path})
+        with network_errors(self.PROVIDER):
+            response = self.transport.post(
+                f"{self.base_url}/v1/files", headers=self._headers(body.content_type), data=body
+            )
+        self._raise_for_status(response)
+        return response.json()["urls"]["get"]
+
+    def submit_image2video(self, image_path: str, prompt: str) -> str:
+        """
+        Create an image-to-video prediction and return its ID without waiting for it.
+        The image is uploaded once and its file URL reused for later predictions; if
+        Replicate rejects a reused file, e.g. because it expired early, the image is
+        uploaded again once.
+
+        The prediction is created through the pooled transport rather than the SDK, so
+        that a 429's Retry-After reaches the caller as ``RateLimitError.retry_after``.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        url, model = predictions_url(self.base_url, IMAGE2VIDEO_MODEL)
+        webhook = {}
+        if self.webhook_receiver is not None:
+            webhook = {
+                "webhook": self.webhook_receiver.endpoint(self.PROVIDER),
+                "webhook_events_filter": ["completed"],
+            }
+        staged = not image_path.startswith(("http://", "https://"))
+        for attempt in range(2):
+            start_image = image_path
+            if staged:
+                start_image = self.stager.stage(self.staging_namespace, image_path, self._upload_file, FILE_TTL_SECONDS)
+            body = json.dumps({**model, "input": build_image2video_input(prompt, start_image), **webhook})
+            with network_errors(self.PROVIDER):
+                response = self.transport.post(url, headers=self._headers(), data=body)
+            if staged and attempt == 0 and _rejects_input(response.status_code, response.text):
+                self.logger.debug(f"Replicate rejected staged file {start_image}, uploading {image_path} again")
+                self.stager.forget(self.staging_namespace, image_path)
+                continue
+            self._raise_for_status(response)
+            break
+        try:
+            prediction = response.json()
+            prediction_id = prediction["id"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise PermanentError(self.PROVIDER, f"no prediction ID in response: {response.text[:200]}") from e
+        if prediction.get("created_at"):
+            with self._created_lock:
+                self._created[prediction_id] = prediction["created_at"]
+                while len(self._created) > self.MAX_TRACKED:
+                    self._created.popitem(last=False)
+        return prediction_id
+
+    def get_status(self, prediction_id: str) -> TaskStatus:
+        """
+        Check a prediction once and return a TaskStatus carrying the prediction.
+        """
+        with network_errors(self.PROVIDER):
+            response = self.transport.get(f"{self.base_url}/v1/predictions/{prediction_id}", headers=self._headers())
+        self._raise_for_status(response)
+        return prediction_status(response.json())
+
+    def get_statuses(self, prediction_ids: List[str]) -> Dict[str, TaskStatus]:
+        """
+        Check many predictions by paging through the recent predictions, newest
+        first, until all of them are found. Paging stops early once it has passed
+        the oldest of them (if all were submitted by this client, so their creation
+        times are known), and after MAX_STATUS_PAGES pages; the poller checks any
+        prediction not reported individually.
+        """
+        wanted = set(prediction_ids)
+        with self._created_lock:
+            created = [self._created[prediction_id] for prediction_id in wanted if prediction_id in self._created]
+        oldest = min(created) if len(created) == len(wanted) else None
+        statuses: Dict[str, TaskStatus] = {}
+        url = f"{self.base_url}/v1/predictions"
+        for _ in range(self.MAX_STATUS_PAGES):
+            with network_errors(self.PROVIDER):
+                response = self.transport.get(url, headers=self._headers())
+            self._raise_for_status(response)
+            page = response.json()
+            results = page.get("results") or []
+            for prediction in results:
+                if prediction["id"] in wanted:
+                    statuses[prediction["id"]] = prediction_status(prediction)
+            if len(statuses) == len(wanted) or not page.get("next") or not results:
+                break
+            if oldest is not None and (results[-1].get("created_at") or oldest) < oldest:
+                break
+            url = page["next"]
+        with self._created_lock:
+            for prediction_id, status in statuses.items():
+                if status.done:
+                    self._created.pop(prediction_id, None)
+        return statuses
+
+    def watch_image2video(self,
+                          prediction_id: str,
+                          timeout: float = 600,
+                          on_update: Optional[Callable[[TaskStatus], None]] = None) -> Future:
+        """
+        Hand a prediction to the poller; the Future resolves to its final TaskStatus.
+        ``on_update`` receives every status the poller sees on the way.
+        """
+        return self.poller.watch(self.PROVIDER, prediction_id, self.get_status, timeout=timeout, on_update=on_update)
+
+    def download_image2video(self, prediction_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Download the video of a prediction that finished with ``status``. Raises
+        TransientError if the transfer fails.
+        """
+        with network_errors(self.PROVIDER):
+            download_file(status.payload["output"], output_path, session=self.transport.session)
+
+    def cancel(self, prediction_id: str) -> None:
+        """
+        Cancel a prediction that is no longer needed.
+        """
+        try:
+            self.transport.post(f"{self.base_url}/v1/predictions/{prediction_id}/cancel", headers=self._headers())
+        except Exception as e:
+            self.logger.error(f"Failed to cancel prediction: {prediction_id}, error: {e}")
+
+    def resume_image2video(self, prediction_id: str, output_path: str) -> None:
+        """
+        Wait for an already created prediction and download its video.
+        """
+        status = self.watch_image2video(prediction_id).result()
+        if status.state == TaskState.SUCCEEDED:
+            self.download_image2video(prediction_id, status, output_path)
+        else:
+            self.logger.error(
+                f"Video generation did not succeed, status: {status.error}"
+            )
+
     def image2video(self, image_path: str, prompt: str, output_path: str) -> None:
         """
         Generate a video from the provided image and prompt.
@@ -51,40 +356,9 @@ class ReplicateClient:
             output_path (str): Path where the generated video will be saved.
         """
         try:
-            with open(image_path, "rb") as image_file:
-                self.logger.debug(f"Generating video from image: {image_path}")
-                prediction = replicate.predictions.create(
-                    model="kwaivgi/kling-v1.6-standard",
-                    input={
-                        "prompt": prompt,
-                        "duration": 5,
-                        "cfg_scale": 0.5,
-                        "start_image": image_file,
-                        "aspect_ratio": "9:16",
-                        "negative_prompt": (
-                            "distort the image, show anything that is not in the image, "
-                            "like human hand or fingers."
-                        )
-                    }
-                )
-
-            timeout_seconds = 600
-            while prediction.status not in {"succeeded", "failed", "canceled"} and timeout_seconds > 0:
-                time.sleep(10)
-                timeout_seconds -= 10
-                prediction.reload()
-
-            if prediction.status == "succeeded":
-                video_url = prediction.output
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                response = requests.get(video_url)
-                response.raise_for_status()  # Raises an HTTPError for bad responses
-                with open(output_path, "wb") as f:
-                    f.write(response.content)
-            else:
-                self.logger.error(
-                    f"Video generation did not succeed, status: {prediction.status}"
-                )
+            self.logger.debug(f"Generating video from image: {image_path}")
+            prediction_id = self.submit_image2video(image_path, prompt)
+            self.resume_image2video(prediction_id, output_path)
         except Exception as e:
             self.logger.error(
                 f"Failed to generate video from image with path: {image_path}, error: {e}"
@@ -99,34 +373,111 @@ class ReplicateClient:
             output_path (str): Path where the generated image will be saved.
         """
         try:
-            output = replicate.run(
-                "black-forest-labs/flux-schnell",
-                input={
-                    "prompt": prompt,
-                    "go_fast": True,
-                    "num_outputs": 1,
-                    "aspect_ratio": "16:9",
-                    "output_format": "png",
-                    "output_quality": 80,
-                    "disable_safety_checker": False
-                }
-            )
+            model_input = build_text2image_input(prompt)
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.cache.key(
+                    {"task": "text2image", "model": TEXT2IMAGE_MODEL, "input": {**model_input, "prompt": prompt.strip()}}
+                )
+                if self.cache.get(cache_key, output_path):
+                    return
+
+            output = replicate.run(TEXT2IMAGE_MODEL, input=model_input)
             if not output:
                 self.logger.error("No output received from text2image")
                 return
 
             img_url = output[0]
             self.logger.debug(f"Image generated: {output}")
-            response = requests.get(img_url)
-            response.raise_for_status()
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                f.write(response.content)
+            download_file(img_url, output_path, session=self.transport.session)
+            if cache_key is not None:
+                self.cache.put(cache_key, output_path)
         except Exception as e:
             self.logger.error(
                 f"Failed to generate image from text with prompt: {prompt}, error: {e}"
             )
 
+    def text2image_batch(self,
+                         prompts: List[str],
+                         output_dir: str,
+                         num_outputs: int = 1,
+                         max_workers: int = 4,
+                         download_workers: int = 8) -> Dict[str, List[str]]:
+        """
+        Generate images for many prompts at once.
+
+        Up to ``max_workers`` predictions run concurrently, each asking for
+        ``num_outputs`` images (at most 4). Images are downloaded in parallel over
+        the pooled transport as soon as their prediction finishes, while other
+        predictions are still running. Repeated prompts are generated once.
+
+        Parameters:
+            prompts (List[str]): Text prompts to generate images for.
+            output_dir (str): Directory the images are written to, as
+                ``image-<prompt index>-<output index>.png``.
+            num_outputs (int): Images per prompt.
+            max_workers (int): Predictions in flight at once.
+            download_workers (int): Images downloaded at once.
+
+        Returns:
+            Dict[str, List[str]]: Paths of the images saved for each prompt; empty
+            for prompts whose prediction failed.
+        """
+        unique_prompts = list(dict.fromkeys(prompts))
+        results: Dict[str, List[str]] = {prompt: [] for prompt in unique_prompts}
+        os.makedirs(output_dir, exist_ok=True)
+
+        def download(url: str, path: str, cache_key: Optional[str]) -> None:
+            download_file(url, path, session=self.transport.session)
+            if cache_key is not None:
+                self.cache.put(cache_key, path)
+
+        with ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="text2image-download") as downloads:
+            def generate(index: int, prompt: str) -> List[Tuple[str, Optional[Future]]]:
+                model_input = build_text2image_input(prompt, num_outputs)
+                paths = [os.path.join(output_dir, f"image-{index:04d}-{n}.png") for n in range(num_outputs)]
+                cache_keys: List[Optional[str]] = [None] * num_outputs
+                if self.cache is not None:
+                    cache_keys = [
+                        self.cache.key({
+                            "task": "text2image", "model": TEXT2IMAGE_MODEL,
+                            "input": {**model_input, "prompt": prompt.strip()}, "output": n,
+                        })
+                        for n in range(num_outputs)
+                    ]
+                    if all(self.cache.get(key, path) for key, path in zip(cache_keys, paths)):
+                        return [(path, None) for path in paths]
+
+                output = replicate.run(TEXT2IMAGE_MODEL, input=model_input)
+                if not output:
+                    raise ValueError("no output received")
+                self.logger.debug(f"Images generated for prompt: {prompt}, {len(output)} outputs")
+                return [
+                    (path, downloads.submit(download, str(url), path, cache_key))
+                    for url, path, cache_key in zip(output, paths, cache_keys)
+                ]
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="text2image") as predictions:
+                pending = {
+                    predictions.submit(generate, index, prompt): prompt
+                    for index, prompt in enumerate(unique_prompts)
+                }
+                for future in as_completed(pending):
+                    prompt = pending[future]
+                    try:
+                        saved = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Failed to generate image from text with prompt: {prompt}, error: {e}")
+                        continue
+                    for path, download_future in saved:
+                        try:
+                            if download_future is not None:
+                                download_future.result()
+                            results[prompt].append(path)
+                        except Exception as e:
+                            self.logger.error(f"Failed to download image for prompt: {prompt}, error: {e}")
+        return results
+
     def speech2text(self, audio_path: str) -> Dict[str, Any]:
         """
         Transcribe speech from an audio file.
@@ -139,19 +490,83 @@ class ReplicateClient:
         """
         try:
             with open(audio_path, "rb") as audio_file:
-                output = replicate.run(
-                    "vaibhavs10/incredibly-fast-whisper:3ab86df6c8f54c11309d4d1f930ac292bad43ace52d10c80d87eb258b3c9f79c",
-                    input={
-                        "task": "transcribe",
-                        "audio": audio_file,
-                        "language": "None",
-                        "timestamp": "chunk",
-                        "diarise_audio": False
-                    }
-                )
+                output = replicate.run(SPEECH2TEXT_MODEL, input=build_speech2text_input(audio_file))
             return output
         except Exception as e:
             self.logger.error(
                 f"Failed to generate text from audio with path: {audio_path}, error: {e}"
             )
             return None
+
+    def speech2text_long(self,
+                         audio_path: str,
+                         chunk_seconds: float = 600.0,
+                         overlap_seconds: float = 5.0,
+                         max_workers: int = 4,
+                         cache: Optional[ResultCache] = None) -> Optional[Dict[str, Any]]:
+        """
+        Transcribe a long recording in parallel chunks.
+
+        The audio is split with ffmpeg into chunks of about ``chunk_seconds``, cut at
+        silences where possible and overlapping by ``overlap_seconds``. Up to
+        ``max_workers`` chunks are transcribed at once, and the results are merged
+        into one transcript in the same shape as ``speech2text``'s, with timestamps
+        relative to the whole file and words repeated at the overlaps removed.
+
+        Each chunk's transcript is cached under the audio content and chunk bounds,
+        so after a partial failure a re-run only transcribes the missing chunks.
+
+        Parameters:
+            audio_path (str): Path to the audio file.
+            chunk_seconds (float): Target chunk length in seconds.
+            overlap_seconds (float): Seconds each chunk runs into the next.
+            max_workers (int): Chunks transcribed concurrently.
+            cache (ResultCache): Chunk cache; defaults to the client's cache, or the
+                default cache directory if the client has none.
+
+        Returns:
+            Dict[str, Any]: Merged transcription, or None if any chunk failed.
+        """
+        cache = cache or self.cache or ResultCache()
+        try:
+            duration = probe_duration(audio_path)
+            silences = detect_silences(audio_path) if duration > chunk_seconds else []
+            audio_hash = hash_file(audio_path)
+        except Exception as e:
+            self.logger.error(f"Failed to read audio with path: {audio_path}, error: {e}")
+            return None
+        chunks = plan_chunks(duration, silences, chunk_seconds, overlap_seconds)
+        self.logger.debug(f"Transcribing {audio_path} ({duration:.0f}s) in {len(chunks)} chunks")
+
+        with tempfile.TemporaryDirectory(prefix="speech2text-") as work_dir:
+            def transcribe(index: int) -> Optional[Dict[str, Any]]:
+                start, end = chunks[index]
+                key = cache.key({
+                    "task": "speech2text", "model": SPEECH2TEXT_MODEL,
+                    "audio": audio_hash, "start": round(start, 3), "end": round(end, 3),
+                })
+                cached = cache.get_text(key)
+                if cached is not None:
+                    return json.loads(cached)
+                try:
+                    chunk_path = os.path.join(work_dir, f"chunk-{index}.mp3")
+                    extract_chunk(audio_path, start, end, chunk_path)
+                    with open(chunk_path, "rb") as audio_file:
+                        output = replicate.run(SPEECH2TEXT_MODEL, input=build_speech2text_input(audio_file))
+                    os.remove(chunk_path)
+                except Exception as e:
+                    self.logger.error(f"Failed to transcribe {audio_path} from {start:.0f}s to {end:.0f}s, error: {e}")
+                    return None
+                cache.put_text(key, json.dumps(output))
+                return output
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speech2text") as executor:
+                outputs = list(executor.map(transcribe, range(len(chunks))))
+
+        failed = sum(output is None for output in outputs)
+        if failed:
+            self.logger.error(
+                f"{failed} of {len(chunks)} chunks of {audio_path} failed; run again to retry only those"
+            )
+            return None
+        return merge_transcripts(list(zip(chunks, outputs)), overlap_seconds)
@@ -0,0 +1,136 @@
+import os
+from typing import Optional
+
+import httpx
+
+from tools.api.stabilityai.stability_ai_client import (
+    STABILITY_API_URL,
+    StabilityAIClient,
+    build_image2video_data,
+    generation_error,
+)
+from tools.common.download import async_download_file
+from tools.common.errors import Deadline, PermanentError, error_for_status, parse_retry_after
+from tools.common.logging import LazyPayload, default_logger
+from tools.common.poller import TaskState, TaskStatus, async_watch
+from tools.common.resilience import network_errors
+
+
+class AsyncStabilityAIClient:
+    """
+    asyncio-native client for the Stability AI Image-to-Video API. Failures raise
+    the same typed errors as StabilityAIClient.
+    """
+
+    PROVIDER = StabilityAIClient.PROVIDER
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.logger = default_logger
+        self.api_url = os.getenv("STABILITY_API_URL", STABILITY_API_URL)
+        self.api_key = os.getenv("STABILITY_AI_API_KEY")
+        if not self.api_key:
+            self.logger.error("STABILITY_AI_API_KEY environment variable not set.")
+        self.http_client = http_client or httpx.AsyncClient(timeout=60)
+
+    def _result_headers(self) -> dict:
+        return {"accept": "video/*", "authorization": self.api_key}
+
+    async def get_status(self, generation_id: str) -> TaskStatus:
+        """
+        Check a generation once. A finished generation's payload is the open,
+        still-unread result response, so the video is streamed only once.
+        Network and server errors raise TransientError.
+        """
+        request = self.http_client.build_request(
+            "GET", f"{self.api_url}/result/{generation_id}", headers=self._result_headers()
+        )
+        with network_errors(self.PROVIDER):
+            response = await self.http_client.send(request, stream=True)
+            if response.status_code != 200:
+                await response.aread()
+        if response.status_code == 202:
+            self.logger.debug("Waiting for video generation: %s", LazyPayload(response.text))
+            return TaskStatus(TaskState.RUNNING)
+        if response.status_code == 200:
+            return TaskStatus(TaskState.SUCCEEDED, payload=response)
+        if response.status_code >= 500 and generation_error(response) is not None:
+            return TaskStatus(TaskState.FAILED, error=generation_error(response))
+        if response.status_code >= 500 or response.status_code == 429:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
+        return TaskStatus(TaskState.FAILED, error=response.text)
+
+    async def submit_image2video(self, image_path: str, prompt: str) -> str:
+        """
+        Start a video generation and return its generation ID without waiting for it.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        with open(image_path, "rb") as image_file:
+            with network_errors(self.PROVIDER):
+                response = await self.http_client.post(
+                    self.api_url,
+                    headers={"authorization": self.api_key},
+                    files={"image": image_file},
+                    data=build_image2video_data(prompt),
+                )
+        if response.status_code != 200:
+            raise error_for_status(
+                self.PROVIDER, response.status_code,
+                f"Failed to create video generation request for image: {image_path}, response: {response.text}",
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+        generation_id = response.json().get("id")
+        self.logger.debug(f"Video generation ID: {generation_id}")
+        if not generation_id:
+            raise PermanentError(self.PROVIDER, f"Generation ID not found in response: {response.text}")
+        return generation_id
+
+    async def watch_image2video(self, generation_id: str, timeout: float = 600) -> TaskStatus:
+        """Wait for a generation and return its final TaskStatus."""
+        return await async_watch(self.PROVIDER, generation_id, self.get_status, timeout=timeout)
+
+    async def download_image2video(self, generation_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Stream the video of a generation that finished with ``status``, or fetch it
+        again if that response was already used by an earlier attempt. Raises
+        TransientError if the transfer fails.
+        """
+        response = status.payload if not status.payload.is_closed else None
+        with network_errors(self.PROVIDER):
+            await async_download_file(
+                self.http_client,
+                f"{self.api_url}/result/{generation_id}",
+                output_path,
+                headers=self._result_headers(),
+                response=response,
+            )
+        self.logger.debug(f"Video written to {output_path}")
+
+    async def cancel(self, generation_id: str) -> None:
+        """
+        Stability has no cancel endpoint; an unneeded generation simply runs to completion.
+        """
+        self.logger.debug(f"Abandoning generation {generation_id}, Stability does not support cancellation")
+
+    async def image2video(self,
+                          image_path: str,
+                          prompt: str,
+                          output_path: str,
+                          deadline: Optional[Deadline] = None) -> None:
+        """
+        Convert an image to a video by sending a request to the Stability AI API,
+        without retries. The prompt is provided to guide video generation. Raises a
+        typed error if no video was made.
+        """
+        deadline = deadline or Deadline(None)
+        generation_id = await self.submit_image2video(image_path, prompt)
+        status = await self.watch_image2video(generation_id, timeout=deadline.remaining(600))
+        if status.state != TaskState.SUCCEEDED:
+            raise PermanentError(
+                self.PROVIDER, f"Failed to retrieve video for image: {image_path}, response: {status.error}"
+            )
+        await self.download_image2video(generation_id, status, output_path)
+        self.logger.debug(f"Video generated successfully from image: {image_path}")
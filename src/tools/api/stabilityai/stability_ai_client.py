@@ -1,9 +1,45 @@
 import os
 import click
 import requests
-import time
 
-from tools.common.logging import default_logger
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from tools.common.download import download_file
+from tools.common.errors import PermanentError, error_for_status, parse_retry_after
+from tools.common.logging import LazyPayload, default_logger
+from tools.common.poller import Poller, TaskState, TaskStatus, default_poller
+from tools.common.resilience import network_errors
+from tools.common.staging import MultipartStream
+from tools.common.transport import HTTPTransport, default_transport
+
+STABILITY_API_URL = "https://api.stability.ai/v2beta/image-to-video"
+
+
+def build_image2video_data(prompt: str) -> dict:
+    """
+    Build the form fields sent alongside the image to the image-to-video endpoint.
+    """
+    return {
+        "seed": 0,
+        "cfg_scale": 1.8,
+        "motion_bucket_id": 127,
+        "prompt": prompt  # Assuming the API accepts a prompt; adjust if needed.
+    }
+
+
+def generation_error(response: requests.Response) -> Optional[str]:
+    """
+    The error of a failed generation, if ``response`` carries Stability's JSON error
+    envelope (``name`` and ``errors``); None for other bodies, e.g. a proxy's error page.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if not isinstance(body, dict) or "name" not in body or "errors" not in body:
+        return None
+    return f"{body['name']}: {'; '.join(str(error) for error in body['errors'] or [])}"
 
 
 class StabilityAIClient:
@@ -11,17 +47,29 @@ class StabilityAIClient:
     Client for interacting with the Stability AI Image-to-Video API.
     """
 
-    def __init__(self):
+    PROVIDER = "Stability"
+
+    def __init__(self, poller: Optional[Poller] = None, transport: Optional[HTTPTransport] = None):
         self.logger = default_logger
+        self.poller = poller or default_poller()
+        self.transport = transport or default_transport()
+        # Overridable to point the client at a local stand-in, e.g. for benchmarks.
+        self.api_url = os.getenv("STABILITY_API_URL", STABILITY_API_URL)
         self.api_key = os.getenv("STABILITY_AI_API_KEY")
         if not self.api_key:
             self.logger.error("STABILITY_AI_API_KEY environment variable not set.")
 
-    def _write_video_file(self, content: bytes, output_path: str) -> None:
-        """Ensure output directory exists and write video content to file."""
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "wb") as video_file:
-            video_file.write(content)
+    def _result_headers(self) -> dict:
+        return {
+            "accept": "video/*",  # For raw video; change to application/json if expecting JSON.
+            "authorization": self.api_key,
+        }
+
+    def _write_video_file(self, response: requests.Response, url: str, output_path: str) -> None:
+        """Stream a finished result response to the output path."""
+        download_file(
+            url, output_path, headers=self._result_headers(), session=self.transport.session, response=response
+        )
         self.logger.debug(f"Video written to {output_path}")
 
     def _get_video(self, generation_id: str, output_path: str) -> requests.Response:
@@ -29,107 +77,128 @@ class StabilityAIClient:
         Retrieve the generated video using the generation ID.
         If successful, write the video content to the specified output path.
         """
-        url = f"https://api.stability.ai/v2beta/image-to-video/result/{generation_id}"
+        url = f"{self.api_url}/result/{generation_id}"
         try:
-            response = requests.get(
-                url,
-                headers={
-                    "accept": "video/*",  # For raw video; change to application/json if expecting JSON.
-                    "authorization": self.api_key,
-                },
-            )
+            response = self.transport.get(url, headers=self._result_headers(), stream=True)
             if response.status_code != 200:
                 self.logger.error(
                     f"Failed to get video for ID: {generation_id}, response: {response.json()}"
                 )
                 return None
 
-            self._write_video_file(response.content, output_path)
+            self._write_video_file(response, url, output_path)
             return response
 
         except Exception as e:
             self.logger.error(f"Failed to get video for ID: {generation_id}, error: {e}")
             return None
 
-    def _get_generation_status(self, generation_id: str) -> requests.Response:
+    def get_status(self, generation_id: str) -> TaskStatus:
         """
-        Retrieve the current status of the video generation.
+        Check a generation once. A finished generation's payload is the open,
+        still-unread result response, so the video is streamed only once.
+        Network and server errors raise TransientError.
         """
-        url = f"https://api.stability.ai/v2beta/image-to-video/result/{generation_id}"
-        try:
-            response = requests.get(
-                url,
+        with network_errors(self.PROVIDER):
+            response = self.transport.get(
+                f"{self.api_url}/result/{generation_id}", headers=self._result_headers(), stream=True
+            )
+        if response.status_code == 202:
+            self.logger.debug("Waiting for video generation: %s", LazyPayload(response.text))
+            return TaskStatus(TaskState.RUNNING)
+        if response.status_code == 200:
+            return TaskStatus(TaskState.SUCCEEDED, payload=response)
+        if response.status_code >= 500 and generation_error(response) is not None:
+            # A generation that failed comes back as a 5xx in Stability's error envelope;
+            # polling again would only fetch the same answer until the deadline.
+            return TaskStatus(TaskState.FAILED, error=generation_error(response))
+        if response.status_code >= 500 or response.status_code == 429:
+            raise error_for_status(
+                self.PROVIDER, response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+            )
+        return TaskStatus(TaskState.FAILED, error=response.text)
+
+    def submit_image2video(self, image_path: str, prompt: str) -> str:
+        """
+        Start a video generation and return its generation ID without waiting for it.
+
+        Raises RateLimitError or TransientError for failures worth retrying and
+        PermanentError for rejected requests.
+        """
+        # The endpoint takes the image itself with every request, so it is streamed
+        # from disk rather than read into memory.
+        body = MultipartStream(build_image2video_data(prompt), {"image": image_path})
+        with network_errors(self.PROVIDER):
+            response = self.transport.post(
+                self.api_url,
                 headers={
-                    "accept": "video/*",  # Or application/json if expecting status info in JSON.
                     "authorization": self.api_key,
+                    "Content-Type": body.content_type,
                 },
+                data=body,
+            )
+
+        if response.status_code != 200:
+            raise error_for_status(
+                self.PROVIDER, response.status_code,
+                f"Failed to create video generation request for image: {image_path}, response: {response.text}",
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+
+        response_json = response.json()
+        generation_id = response_json.get("id")
+        self.logger.debug(f"Video generation ID: {generation_id}")
+        if not generation_id:
+            raise PermanentError(self.PROVIDER, f"Generation ID not found in response: {response_json}")
+        return generation_id
+
+    def watch_image2video(self,
+                          generation_id: str,
+                          timeout: float = 600,
+                          on_update: Optional[Callable[[TaskStatus], None]] = None) -> Future:
+        """
+        Hand a generation to the poller; the Future resolves to its final TaskStatus.
+        ``on_update`` receives every status the poller sees on the way.
+        """
+        return self.poller.watch(self.PROVIDER, generation_id, self.get_status, timeout=timeout, on_update=on_update)
+
+    def download_image2video(self, generation_id: str, status: TaskStatus, output_path: str) -> None:
+        """
+        Stream the video of a generation that finished with ``status``. Raises
+        TransientError if the transfer fails.
+        """
+        with network_errors(self.PROVIDER):
+            self._write_video_file(
+                status.payload, f"{self.api_url}/result/{generation_id}", output_path
+            )
+
+    def cancel(self, generation_id: str) -> None:
+        """
+        Stability has no cancel endpoint; an unneeded generation simply runs to completion.
+        """
+        self.logger.debug(f"Abandoning generation {generation_id}, Stability does not support cancellation")
+
+    def resume_image2video(self, generation_id: str, output_path: str) -> None:
+        """
+        Wait for an already started generation and stream its video to the output path.
+        """
+        status = self.watch_image2video(generation_id).result()
+        if status.state == TaskState.SUCCEEDED:
+            self.download_image2video(generation_id, status, output_path)
+            self.logger.debug(f"Video generated successfully for generation: {generation_id}")
+        else:
+            self.logger.error(
+                f"Failed to retrieve video for generation: {generation_id}, response: {status.error}"
             )
-            return response
-        except Exception as e:
-            self.logger.error(f"Failed to get generation status for ID: {generation_id}, error: {e}")
-            return None
 
     def image2video(self, image_path: str, prompt: str, output_path: str) -> None:
         """
         Convert an image to a video by sending a request to the Stability AI API.
         The prompt is provided to guide video generation.
         """
-        post_url = "https://api.stability.ai/v2beta/image-to-video"
         try:
-            # Use a context manager to ensure the file is properly closed
-            with open(image_path, "rb") as image_file:
-                response = requests.post(
-                    post_url,
-                    headers={
-                        "authorization": self.api_key
-                    },
-                    files={
-                        "image": image_file
-                    },
-                    data={
-                        "seed": 0,
-                        "cfg_scale": 1.8,
-                        "motion_bucket_id": 127,
-                        "prompt": prompt  # Assuming the API accepts a prompt; adjust if needed.
-                    },
-                )
-            
-            if response.status_code != 200:
-                self.logger.error(
-                    f"Failed to create video generation request for image: {image_path}, response: {response.json()}"
-                )
-                return
-
-            try:
-                response_json = response.json()
-                generation_id = response_json.get("id")
-                self.logger.debug(f"Video generation ID: {generation_id}")
-                if not generation_id:
-                    self.logger.error(f"Generation ID not found in response: {response_json}")
-                    return
-            except Exception as e:
-                self.logger.error(f"Failed to extract generation ID from response: {response.json()}, error: {e}")
-                return
-
-            # Poll for video generation status
-            timeout = 600
-            wait_interval = 15
-            status_response = self._get_generation_status(generation_id)
-            while status_response and status_response.status_code != 200 and timeout > 0:
-                self.logger.debug(f"Waiting for video generation: {status_response.json()}")
-                time.sleep(wait_interval)
-                timeout -= wait_interval
-                status_response = self._get_generation_status(generation_id)
-
-            if status_response and status_response.status_code == 200:
-                self._write_video_file(status_response.content, output_path)
-                self.logger.debug(f"Video generated successfully from image: {image_path}")
-            else:
-                error_details = status_response.json() if status_response else "No response"
-                self.logger.error(
-                    f"Failed to retrieve video for image: {image_path}, response: {error_details}"
-                )
-
+            generation_id = self.submit_image2video(image_path, prompt)
+            self.resume_image2video(generation_id, output_path)
         except Exception as e:
             self.logger.error(f"Failed to generate video from image {image_path}, error: {e}")
 
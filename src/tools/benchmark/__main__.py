@@ -0,0 +1,4 @@
+from tools.benchmark.throughput import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import base64
+import hashlib
+import hmac
+import io
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from tools.common.logging import default_logger
+
+
+class FakeBehavior:
+    """
+    How the fake providers behave.
+
+    Parameters:
+        queue_seconds: (min, max) seconds a task waits before it starts running.
+        generation_seconds: (min, max) seconds a task runs before it finishes.
+        failure_rate: Fraction of tasks that end failed.
+        rate_limit_rate: Fraction of submissions answered with 429.
+        retry_after: Retry-After seconds sent with each 429.
+        video_bytes: Size of every generated video.
+        request_latency: Seconds added to every API response, to imitate the network.
+        seed: Seed for the random draws, for repeatable runs.
+        cut_after: If set, video responses end after this many bytes, as if the
+            connection dropped; ranged requests then fetch the rest piece by piece.
+        webhook_delay: Seconds after a task finishes before its callback is sent.
+    """
+
+    def __init__(self,
+                 queue_seconds: Tuple[float, float] = (0.0, 0.5),
+                 generation_seconds: Tuple[float, float] = (1.0, 3.0),
+                 failure_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0,
+                 video_bytes: int = 2 * 1024 * 1024,
+                 request_latency: float = 0.02,
+                 seed: Optional[int] = None,
+                 cut_after: Optional[int] = None,
+                 webhook_delay: float = 0.0):
+        self.queue_seconds = queue_seconds
+        self.generation_seconds = generation_seconds
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.video_bytes = video_bytes
+        self.request_latency = request_latency
+        self.seed = seed
+        self.cut_after = cut_after
+        self.webhook_delay = webhook_delay
+
+
+class _FakeTask:
+    def __init__(self, provider: str, behavior: FakeBehavior, rng: random.Random):
+        self.id = uuid.uuid4().hex
+        self.provider = provider
+        self.created = time.time()
+        self.starts = self.created + rng.uniform(*behavior.queue_seconds)
+        self.finishes = self.starts + rng.uniform(*behavior.generation_seconds)
+        self.fails = rng.random() < behavior.failure_rate
+        self.canceled = False
+        # Bumped by ``FakeProviderServer.regenerate``; changes the video and its ETag.
+        self.revision = 0
+        self.webhook: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.webhook_sent = False
+
+    def state(self) -> str:
+        """One of pending, running, succeeded, failed, canceled."""
+        now = time.time()
+        if self.canceled:
+            return "canceled"
+        if now < self.starts:
+            return "pending"
+        if now < self.finishes:
+            return "running"
+        return "failed" if self.fails else "succeeded"
+
+
+_PIAPI_STATES = {
+    "pending": "Pending", "running": "Processing", "succeeded": "Completed",
+    "failed": "Failed", "canceled": "Failed",
+}
+_REPLICATE_STATES = {
+    "pending": "starting", "running": "processing", "succeeded": "succeeded",
+    "failed": "failed", "canceled": "canceled",
+}
+
+
+class FakeProviderServer:
+    """
+    Local HTTP server imitating the parts of the PiAPI task API, Stability's v2beta
+    image-to-video endpoints and the Replicate predictions and files API that the
+    clients use, with tasks that queue, run and finish according to a FakeBehavior.
+
+    All three providers are served from one port under their own path prefixes;
+    ``env()`` returns the environment variables that point the clients at it.
+    The server keeps request, 429 and connection counts for benchmarks.
+
+    Every task has its own video bytes, served with a strong ETag and support for
+    Range and If-Range. Tasks submitted with a webhook get a signed callback when
+    they finish, like the real providers send.
+    """
+
+    # Predictions per page of the Replicate list endpoint.
+    PAGE_SIZE = 100
+
+    def __init__(self, behavior: Optional[FakeBehavior] = None, host: str = "127.0.0.1", port: int = 0):
+        self.logger = default_logger
+        self.behavior = behavior or FakeBehavior()
+        self._rng = random.Random(self.behavior.seed)
+        # Replicate signs callbacks with the account's Standard Webhooks secret.
+        self.webhook_secret = "whsec_" + base64.b64encode(b"fake-webhook-secret").decode("ascii")
+        self.webhooks_sent = 0
+        self._webhook_stop = threading.Event()
+        self._webhook_thread: Optional[threading.Thread] = None
+        # Start image served for providers that fetch images by URL, like PiAPI.
+        image = io.BytesIO()
+        Image.new("RGB", (1024, 576), (128, 128, 128)).save(image, "JPEG")
+        self._image = image.getvalue()
+        self._tasks: Dict[str, _FakeTask] = {}
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point every client at this server."""
+        return {
+            "PIAPI_BASE_URL": self.url,
+            "STABILITY_API_URL": f"{self.url}/v2beta/image-to-video",
+            "REPLICATE_BASE_URL": self.url,
+            "PI_API_KEY": "fake",
+            "STABILITY_AI_API_KEY": "fake",
+            "REPLICATE_API_TOKEN": "fake",
+            "REPLICATE_WEBHOOK_SECRET": self.webhook_secret,
+        }
+
+    def image_url(self) -> str:
+        """URL of a start image served by this server, for providers that fetch images."""
+        return f"{self.url}/images/start.jpg"
+
+    def start(self) -> "FakeProviderServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="fake-providers", daemon=True)
+            self._thread.start()
+            self._webhook_thread = threading.Thread(target=self._send_webhooks, name="fake-webhooks", daemon=True)
+            self._webhook_thread.start()
+            self.logger.debug(f"Fake providers listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self._webhook_stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def regenerate(self, task_id: str) -> None:
+        """Replace a task's video with different bytes, as if its output had been regenerated."""
+        with self._lock:
+            self._tasks[task_id].revision += 1
+
+    def video(self, task_id: str) -> bytes:
+        """The video bytes the server serves for a task."""
+        task = self._task(task_id)
+        seed = f"{task.id}-{task.revision}".encode("utf-8")
+        block = hashlib.sha256(seed).digest()
+        size = self.behavior.video_bytes
+        return (block * (size // len(block) + 1))[:size]
+
+    @staticmethod
+    def _etag(task: _FakeTask) -> str:
+        return f'"{task.id}-{task.revision}"'
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "rate_limited": self.rate_limited,
+                "webhooks": self.webhooks_sent,
+                "connections": self.connections,
+                "peak_connections": self.peak_connections,
+            }
+
+    def reset_peak(self) -> None:
+        """Start tracking peak open connections afresh, e.g. between benchmark levels."""
+        with self._lock:
+            self.peak_connections = self.open_connections
+
+    def _count(self, route: str) -> None:
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def _connection_opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+            self.open_connections += 1
+            self.peak_connections = max(self.peak_connections, self.open_connections)
+
+    def _connection_closed(self) -> None:
+        with self._lock:
+            self.open_connections -= 1
+
+    def _create(self,
+                provider: str,
+                webhook: Optional[str] = None,
+                webhook_secret: Optional[str] = None) -> Optional[_FakeTask]:
+        """Create a task, or return None if this submission should be rate limited."""
+        with self._lock:
+            if self._rng.random() < self.behavior.rate_limit_rate:
+                self.rate_limited += 1
+                return None
+            task = _FakeTask(provider, self.behavior, self._rng)
+            task.webhook = webhook or None
+            task.webhook_secret = webhook_secret
+            self._tasks[task.id] = task
+            return task
+
+    def _webhook_request(self, task: _FakeTask) -> Tuple[bytes, Dict[str, str]]:
+        if task.provider == "PiAPI":
+            body = json.dumps(self._piapi_task(task)).encode("utf-8")
+            return body, {"x-webhook-secret": task.webhook_secret or ""}
+        body = json.dumps(self._prediction(task)).encode("utf-8")
+        webhook_id = f"msg_{uuid.uuid4().hex}"
+        timestamp = str(int(time.time()))
+        key = base64.b64decode(self.webhook_secret.split("_", 1)[-1])
+        signed = f"{webhook_id}.{timestamp}.".encode("utf-8") + body
+        signature = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode("ascii")
+        return body, {"webhook-id": webhook_id, "webhook-timestamp": timestamp, "webhook-signature": f"v1,{signature}"}
+
+    def _send_webhooks(self) -> None:
+        # Callbacks are sent once, when the task is final, and a failed one is not
+        # retried; clients still poll now and then in case one is lost.
+        while not self._webhook_stop.wait(0.05):
+            now = time.time()
+            with self._lock:
+                due: List[_FakeTask] = [
+                    task for task in self._tasks.values()
+                    if task.webhook and not task.webhook_sent and task.state() != "canceled"
+                    and task.state() in ("succeeded", "failed")
+                    and now >= task.finishes + self.behavior.webhook_delay
+                ]
+                for task in due:
+                    task.webhook_sent = True
+            for task in due:
+                body, headers = self._webhook_request(task)
+                request = urllib.request.Request(
+                    task.webhook, data=body, method="POST", headers={"Content-Type": "application/json", **headers}
+                )
+                try:
+                    urllib.request.urlopen(request, timeout=5).close()
+                    with self._lock:
+                        self.webhooks_sent += 1
+                except Exception as e:
+                    self.logger.debug(f"Fake webhook for {task.provider} task {task.id} failed, error: {e}")
+
+    def _task(self, task_id: str) -> Optional[_FakeTask]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def _video_url(self, task: _FakeTask) -> str:
+        return f"{self.url}/videos/{task.id}.mp4"
+
+    def _piapi_task(self, task: _FakeTask) -> Dict[str, Any]:
+        state = task.state()
+        output = {}
+        if state == "succeeded":
+            output = {"works": [{"video": {"resource_without_watermark": self._video_url(task)}}]}
+        return {
+            "code": 200,
+            "data": {"task_id": task.id, "status": _PIAPI_STATES[state], "output": output},
+            "message": "success",
+        }
+
+    def _prediction(self, task: _FakeTask) -> Dict[str, Any]:
+        state = task.state()
+        return {
+            "id": task.id,
+            "model": "fake/model",
+            "version": "fake",
+            "status": _REPLICATE_STATES[state],
+            "input": {},
+            "output": self._video_url(task) if state == "succeeded" else None,
+            "logs": "",
+            "error": "fake failure" if state == "failed" else None,
+            "metrics": {},
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(task.created)),
+            "urls": {
+                "get": f"{self.url}/v1/predictions/{task.id}",
+                "cancel": f"{self.url}/v1/predictions/{task.id}/cancel",
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so connection reuse by the clients shows in the counts.
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                server._connection_opened()
+
+            def finish(self):
+                super().finish()
+                server._connection_closed()
+
+            def _json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _bytes(self, data: bytes, content_type: str, etag: Optional[str] = None) -> None:
+                start, end = 0, len(data) - 1
+                range_header = self.headers.get("Range", "")
+                if_range = self.headers.get("If-Range")
+                if if_range is not None and if_range != etag:
+                    # The client's partial copy is of another version; send it all.
+                    range_header = ""
+                if range_header.startswith("bytes="):
+                    first, _, last = range_header[len("bytes="):].partition("-")
+                    start = int(first or 0)
+                    end = int(last) if last else end
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(end - start + 1))
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                body = data[start:end + 1]
+                if server.behavior.cut_after is not None and len(body) > server.behavior.cut_after:
+                    # Promise the whole range but drop the connection part way.
+                    self.wfile.write(body[:server.behavior.cut_after])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def _video(self, task: Optional[_FakeTask]) -> None:
+                server._count("video")
+                if task is None:
+                    return self._json(404, {"detail": "no such video"})
+                self._bytes(server.video(task.id), "video/mp4", server._etag(task))
+
+            def _rate_limited(self) -> None:
+                self._json(429, {"detail": "rate limited"}, {"Retry-After": str(server.behavior.retry_after)})
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _route(self, method: str) -> None:
+                path = self.path.split("?", 1)[0]
+                parts = [part for part in path.split("/") if part]
+                if method != "GET" or not path.startswith(("/videos/", "/images/")):
+                    time.sleep(server.behavior.request_latency)
+                body = self._read_body() if method in ("POST", "PUT") else b""
+
+                # PiAPI
+                if parts[:3] == ["api", "v1", "task"]:
+                    server._count(f"PiAPI {method}")
+                    if method == "POST" and len(parts) == 3:
+                        webhook = ((json.loads(body or b"{}").get("config") or {}).get("webhook_config") or {})
+                        task = server._create("PiAPI", webhook.get("endpoint"), webhook.get("secret"))
+                        return self._rate_limited() if task is None else self._json(200, server._piapi_task(task))
+                    task = server._task(parts[3]) if len(parts) == 4 else None
+                    if task is None:
+                        return self._json(404, {"code": 404, "message": "task not found"})
+                    if method == "DELETE":
+                        task.canceled = True
+                    return self._json(200, server._piapi_task(task))
+
+                # Stability
+                if parts[:2] == ["v2beta", "image-to-video"]:
+                    server._count(f"Stability {method}")
+                    if method == "POST" and len(parts) == 2:
+                        task = server._create("Stability")
+                        return self._rate_limited() if task is None else self._json(200, {"id": task.id})
+                    task = server._task(parts[3]) if len(parts) == 4 and parts[2] == "result" else None
+                    if task is None:
+                        return self._json(404, {"name": "not_found", "errors": ["generation not found"]})
+                    state = task.state()
+                    if state in ("pending", "running"):
+                        return self._json(202, {"id": task.id, "status": "in-progress"})
+                    if state == "succeeded":
+                        return self._video(task)
+                    return self._json(500, {"name": "generation_failed", "errors": ["fake failure"]})
+
+                # Replicate
+                if parts[:2] == ["v1", "files"] and method == "POST":
+                    server._count("Replicate files")
+                    file_id = uuid.uuid4().hex
+                    return self._json(201, {
+                        "id": file_id, "name": "start.jpg", "content_type": "image/jpeg", "size": len(body),
+                        "etag": file_id, "checksums": {}, "metadata": {},
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "expires_at": None,
+                        "urls": {"get": f"{server.url}/images/{file_id}.jpg"},
+                    })
+                if parts[:1] == ["v1"] and "predictions" in parts:
+                    server._count(f"Replicate {method}")
+                    if method == "POST" and parts[-1] == "predictions":
+                        task = server._create("Replicate", json.loads(body or b"{}").get("webhook"))
+                        if task is None:
+                            return self._json(429, {"detail": "rate limited", "status": 429},
+                                              {"Retry-After": str(server.behavior.retry_after)})
+                        return self._json(201, server._prediction(task))
+                    if method == "GET" and parts == ["v1", "predictions"]:
+                        query = parse_qs(urlsplit(self.path).query)
+                        offset = int(query.get("cursor", ["0"])[0])
+                        with server._lock:
+                            recent = sorted((task for task in server._tasks.values() if task.provider == "Replicate"),
+                                            key=lambda t: t.created, reverse=True)
+                        page = recent[offset:offset + server.PAGE_SIZE]
+                        more = offset + server.PAGE_SIZE < len(recent)
+                        return self._json(200, {
+                            "results": [server._prediction(task) for task in page],
+                            "next": f"{server.url}/v1/predictions?cursor={offset + server.PAGE_SIZE}" if more else None,
+                            "previous": None,
+                        })
+                    task = server._task(parts[2]) if len(parts) >= 3 else None
+                    if task is None:
+                        return self._json(404, {"detail": "not found", "status": 404})
+                    if method == "POST" and parts[-1] == "cancel":
+                        task.canceled = True
+                    return self._json(200, server._prediction(task))
+
+                # Generated videos and start images
+                if method == "GET" and parts[:1] == ["videos"]:
+                    return self._video(server._task(parts[-1].rsplit(".", 1)[0]))
+                if method == "GET" and parts[:1] == ["images"]:
+                    return self._bytes(server._image, "image/jpeg")
+
+                self._json(404, {"detail": f"no fake route for {method} {path}"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,264 @@
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import click
+from PIL import Image
+
+from tools.benchmark.fake_providers import FakeBehavior, FakeProviderServer
+from tools.common.poller import AdaptiveBackoff, set_backoff
+from tools.image2video.image2video_models import Image2VideoModelType
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (0-100) of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _rss_bytes() -> int:
+    """Current resident set size, falling back to the peak where /proc is missing."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _open_sockets() -> int:
+    """Number of sockets this process holds open, or 0 where /proc is missing."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return 0
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+
+class _Sampler:
+    """Samples RSS and open sockets in the background while a level runs."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_sockets = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="benchmark-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+            self.peak_sockets = max(self.peak_sockets, _open_sockets())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_Sampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class ThroughputBenchmark:
+    """
+    Drives Image2VideoConverter, directly or through the batch runner, against a
+    FakeProviderServer at increasing concurrency and reports jobs/sec, latency
+    percentiles, peak RSS and connection counts for each level.
+    """
+
+    def __init__(self,
+                 model: str = Image2VideoModelType.REPLICATE.value,
+                 behavior: Optional[FakeBehavior] = None,
+                 submit_rate: float = 100.0,
+                 min_poll_interval: float = 0.25,
+                 work_dir: Optional[str] = None):
+        """
+        :param model: Model type to convert with.
+        :param behavior: Behavior of the fake providers.
+        :param submit_rate: Submissions per second the router allows each provider.
+        :param min_poll_interval: Shortest delay between status checks of one task.
+        :param work_dir: Directory for inputs and outputs; a temporary one by default.
+        """
+        self.model = model
+        self.behavior = behavior or FakeBehavior()
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="image2video-benchmark-")
+        self.server = FakeProviderServer(self.behavior).start()
+        # Clients read their endpoints and keys when they are first created, which
+        # happens lazily in the converter below, after this.
+        os.environ.update(self.server.env())
+        os.environ.pop("WEBHOOK_PUBLIC_URL", None)
+
+        expected = sum(self.behavior.queue_seconds) / 2 + sum(self.behavior.generation_seconds) / 2
+        providers = [model]
+        if model in (Image2VideoModelType.AUTO.value, Image2VideoModelType.FASTEST.value):
+            providers = [Image2VideoModelType.PIAPI.value, Image2VideoModelType.REPLICATE.value,
+                         Image2VideoModelType.STABILITY.value]
+        for provider in providers:
+            set_backoff(provider, AdaptiveBackoff(
+                min_interval=min_poll_interval, max_interval=max(min_poll_interval, 5.0), initial_estimate=expected
+            ))
+
+        from tools.image2video.image2video_converter import Image2VideoConverter
+        from tools.image2video.image_preprocessor import ImagePreprocessor
+        from tools.image2video.provider_router import ProviderLimits, ProviderRouter
+
+        limits = {provider: ProviderLimits(rate=submit_rate, burst=int(submit_rate), max_concurrency=1024)
+                  for provider in providers}
+        self.converter = Image2VideoConverter(
+            preprocessor=ImagePreprocessor(cache_dir=os.path.join(self.work_dir, "preprocessed")),
+            router=ProviderRouter(limits),
+        )
+        self.image = self._start_image()
+
+    def _start_image(self) -> str:
+        if self.model == Image2VideoModelType.PIAPI.value:
+            # PiAPI fetches start images by URL.
+            return self.server.image_url()
+        path = os.path.join(self.work_dir, "start.jpg")
+        Image.new("RGB", (1024, 576), (128, 128, 128)).save(path, "JPEG")
+        return path
+
+    def _run_converter(self, jobs: int, concurrency: int, output_dir: str) -> List[Dict[str, Any]]:
+        def run(index: int) -> Dict[str, Any]:
+            output_path = os.path.join(output_dir, f"video-{index}.mp4")
+            start = time.monotonic()
+            result = self.converter.convert(self.image, f"benchmark {index}", output_path, self.model)
+            return {"elapsed": time.monotonic() - start, "succeeded": result.succeeded}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(run, range(jobs)))
+
+    def _run_batch(self, jobs: int, concurrency: int, output_dir: str) -> List[Dict[str, Any]]:
+        from tools.image2video.batch import BatchRunner
+
+        rows = [
+            {"id": f"row-{index}", "image": self.image, "prompt": f"benchmark {index}", "model": self.model}
+            for index in range(jobs)
+        ]
+        runner = BatchRunner(
+            output_dir, os.path.join(output_dir, "results.jsonl"), concurrency, converter=self.converter
+        )
+        runner.run(rows)
+        with open(runner.results_path) as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        return [{"elapsed": row["elapsed"], "succeeded": row["status"] == "succeeded"} for row in results]
+
+    def run_level(self, jobs: int, concurrency: int, mode: str = "converter") -> Dict[str, Any]:
+        """Run ``jobs`` conversions with ``concurrency`` in flight and return the measurements."""
+        output_dir = os.path.join(self.work_dir, f"{mode}-{concurrency}-{time.monotonic_ns()}")
+        os.makedirs(output_dir, exist_ok=True)
+        server_before = self.server.stats()
+        self.server.reset_peak()
+
+        started = time.monotonic()
+        with _Sampler() as sampler:
+            if mode == "batch":
+                results = self._run_batch(jobs, concurrency, output_dir)
+            else:
+                results = self._run_converter(jobs, concurrency, output_dir)
+        wall = time.monotonic() - started
+
+        server_after = self.server.stats()
+        latencies = [result["elapsed"] for result in results if result["succeeded"]]
+        succeeded = len(latencies)
+        return {
+            "mode": mode,
+            "model": self.model,
+            "concurrency": concurrency,
+            "jobs": jobs,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "seconds": round(wall, 3),
+            "jobs_per_sec": round(succeeded / wall, 3) if wall else None,
+            "p50": _rounded(percentile(latencies, 50)),
+            "p95": _rounded(percentile(latencies, 95)),
+            "p99": _rounded(percentile(latencies, 99)),
+            "peak_rss_mb": round(sampler.peak_rss / 1024 / 1024, 1),
+            "peak_open_sockets": sampler.peak_sockets,
+            "server_peak_connections": server_after["peak_connections"],
+            "server_new_connections": server_after["connections"] - server_before["connections"],
+            "rate_limited": server_after["rate_limited"] - server_before["rate_limited"],
+        }
+
+    def close(self) -> None:
+        self.server.stop()
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def _pair(value: str) -> tuple:
+    low, _, high = value.partition(",")
+    return float(low), float(high or low)
+
+
+@click.command()
+@click.option("--model", "-m", default=Image2VideoModelType.REPLICATE.value, show_default=True,
+              type=click.Choice([member.value for member in Image2VideoModelType]), help="Model to convert with.")
+@click.option("--mode", default="converter", show_default=True, type=click.Choice(["converter", "batch"]),
+              help="Call the converter directly or go through the batch runner.")
+@click.option("--jobs", "-n", default=50, show_default=True, type=int, help="Conversions per concurrency level.")
+@click.option("--concurrency", "-c", default="1,4,16,64", show_default=True,
+              help="Comma-separated concurrency levels.")
+@click.option("--queue_seconds", default="0,0.5", show_default=True, help="Fake queue wait range (min,max).")
+@click.option("--generation_seconds", default="1,3", show_default=True, help="Fake generation time range (min,max).")
+@click.option("--failure_rate", default=0.0, show_default=True, type=float, help="Fraction of fake tasks that fail.")
+@click.option("--rate_limit_rate", default=0.0, show_default=True, type=float,
+              help="Fraction of submissions answered with 429.")
+@click.option("--retry_after", default=1.0, show_default=True, type=float, help="Retry-After sent with each 429.")
+@click.option("--video_bytes", default=2 * 1024 * 1024, show_default=True, type=int, help="Size of each fake video.")
+@click.option("--request_latency", default=0.02, show_default=True, type=float,
+              help="Seconds added to every fake API response.")
+@click.option("--submit_rate", default=100.0, show_default=True, type=float,
+              help="Submissions per second the router allows.")
+@click.option("--seed", default=None, type=int, help="Seed for repeatable fake behavior.")
+@click.option("--output", "-o", default=None, help="Append one JSON line per level to this file.")
+def main(model: str, mode: str, jobs: int, concurrency: str, queue_seconds: str, generation_seconds: str,
+         failure_rate: float, rate_limit_rate: float, retry_after: float, video_bytes: int,
+         request_latency: float, submit_rate: float, seed: Optional[int], output: Optional[str]):
+    """
+    Measure conversion throughput and latency offline against fake providers.
+    """
+    behavior = FakeBehavior(
+        queue_seconds=_pair(queue_seconds),
+        generation_seconds=_pair(generation_seconds),
+        failure_rate=failure_rate,
+        rate_limit_rate=rate_limit_rate,
+        retry_after=retry_after,
+        video_bytes=video_bytes,
+        request_latency=request_latency,
+        seed=seed,
+    )
+    benchmark = ThroughputBenchmark(model, behavior, submit_rate=submit_rate)
+    try:
+        for level in (int(value) for value in concurrency.split(",") if value.strip()):
+            result = benchmark.run_level(jobs, level, mode)
+            click.echo(json.dumps(result))
+            if output:
+                with open(output, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+    finally:
+        benchmark.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# audio.py
+import json
+import re
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def probe_duration(audio_path: str) -> float:
+    """Duration of an audio file in seconds, read with ffprobe."""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", audio_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(json.loads(output)["format"]["duration"])
+
+
+def detect_silences(audio_path: str, noise_db: float = -30.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    (start, end) seconds of every silence in an audio file, found with ffmpeg's
+    silencedetect filter. The audio is decoded once; nothing is written.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"],
+        check=True, capture_output=True, text=True,
+    )
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(duration: float,
+                silences: List[Tuple[float, float]],
+                chunk_seconds: float = 600.0,
+                overlap_seconds: float = 5.0,
+                search_seconds: float = 60.0) -> List[Tuple[float, float]]:
+    """
+    Split ``duration`` seconds into (start, end) chunks of about ``chunk_seconds``.
+
+    Each cut is moved to the middle of the silence closest to the target length,
+    looking back up to ``search_seconds`` but never to or before the chunk's start;
+    without one the cut is made at the target. Every chunk except the last runs ``overlap_seconds`` past its cut, so
+    words at the boundary are heard whole by one of the two chunks.
+    """
+    chunks = []
+    start = 0.0
+    while duration - start > chunk_seconds:
+        target = start + chunk_seconds
+        candidates = [
+            (silence_start + silence_end) / 2
+            for silence_start, silence_end in silences
+            if max(start, target - search_seconds) < (silence_start + silence_end) / 2 <= target
+        ]
+        cut = min(candidates, key=lambda middle: target - middle) if candidates else target
+        chunks.append((start, min(duration, cut + overlap_seconds)))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
+
+
+def extract_chunk(audio_path: str, start: float, end: float, output_path: str) -> None:
+    """
+    Cut [start, end) out of an audio file as 16 kHz mono MP3, which is what speech
+    models resample to anyway and keeps uploads small.
+    """
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+         "-i", audio_path, "-vn", "-ac", "1", "-ar", "16000", "-b:a", "64k", output_path],
+        check=True, capture_output=True,
+    )
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _drop_repeated_prefix(previous: str, text: str, max_words: int = 20) -> str:
+    """
+    Remove from the start of ``text`` the longest run of words that also ends
+    ``previous``, i.e. words transcribed twice because they fell in an overlap.
+    """
+    tail = _words(previous)[-max_words:]
+    tokens = text.split()
+    normalized = [_words(token) for token in tokens]
+    for length in range(min(len(tail), len(tokens)), 0, -1):
+        head = [word for words in normalized[:length] for word in words]
+        if head and head == tail[-len(head):]:
+            return " ".join(tokens[length:])
+    return text
+
+
+def merge_transcripts(results: List[Tuple[Tuple[float, float], Dict[str, Any]]],
+                      overlap_seconds: float) -> Dict[str, Any]:
+    """
+    Merge per-chunk whisper outputs ({"text", "chunks": [{"timestamp", "text"}]})
+    into one transcript with timestamps relative to the whole file.
+
+    In the overlap between two chunks, the earlier chunk keeps the segments that
+    start before the middle of the overlap, and the later one only contributes
+    segments that end after what has been kept so far; words still transcribed
+    twice at the seam are dropped from the later chunk's segments that start inside
+    the overlap.
+    """
+    segments: List[Dict[str, Any]] = []
+    covered_until = 0.0
+    previous_end = float("-inf")
+    for index, ((start, end), output) in enumerate(results):
+        keep_until = end - overlap_seconds / 2 if index < len(results) - 1 else float("inf")
+        for segment in output.get("chunks") or []:
+            segment_start, segment_end = segment.get("timestamp") or (0.0, None)
+            absolute_start = start + (segment_start or 0.0)
+            absolute_end = start + segment_end if segment_end is not None else None
+            reaches = absolute_end if absolute_end is not None else absolute_start
+            if absolute_start >= keep_until or (segments and reaches <= covered_until):
+                continue
+            text = segment.get("text", "").strip()
+            if segments and text and absolute_start < previous_end:
+                text = _drop_repeated_prefix(segments[-1]["text"], text)
+            if text:
+                segments.append({"timestamp": [round(absolute_start, 2), _round(absolute_end)], "text": text})
+                covered_until = max(covered_until, reaches)
+        previous_end = end
+    return {"text": " ".join(segment["text"] for segment in segments), "chunks": segments}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
@@ -0,0 +1,230 @@
+# download.py
+import json
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+import urllib3
+
+from tools.common.logging import default_logger
+
+CHUNK_SIZE = 1024 * 1024
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class IncompleteDownloadError(IOError):
+    """Raised when a transfer ends before the advertised number of bytes arrived."""
+
+
+def _partial_path(output_path: str) -> str:
+    return f"{output_path}.part"
+
+
+def _meta_path(output_path: str) -> str:
+    # Records which URL and which version of it the partial file holds.
+    return f"{output_path}.part.json"
+
+
+def _discard_partial(output_path: str) -> None:
+    for path in (_partial_path(output_path), _meta_path(output_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _validator(headers) -> Optional[str]:
+    """Strong ETag, or else Last-Modified, of a response; usable in If-Range."""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("last-modified")
+
+
+def _expected_size(status_code: int, headers, offset: int) -> Optional[int]:
+    """Total size of the resource, from Content-Range on a 206 or Content-Length on a 200."""
+    if status_code == 206:
+        match = _CONTENT_RANGE.match(headers.get("content-range", ""))
+        if match and match.group(3) != "*":
+            return int(match.group(3))
+        return None
+    length = headers.get("content-length")
+    return int(length) if length is not None else None
+
+
+def _prepare(output_path: str, url: str) -> Tuple[int, Optional[str]]:
+    """
+    Create the output directory and return the bytes a previous attempt left behind
+    and the validator they were fetched under. A partial file of another URL, or of
+    a response without an ETag or Last-Modified, cannot be resumed safely and is
+    dropped.
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    partial = _partial_path(output_path)
+    if not os.path.exists(partial):
+        _discard_partial(output_path)
+        return 0, None
+    try:
+        with open(_meta_path(output_path)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get("url") != url or not meta.get("validator"):
+        _discard_partial(output_path)
+        return 0, None
+    return os.path.getsize(partial), meta["validator"]
+
+
+def _range_headers(headers: Optional[Dict[str, str]], offset: int, validator: Optional[str]) -> Dict[str, str]:
+    # Bytes are written exactly as sent, so ask for them unencoded.
+    request_headers = {"Accept-Encoding": "identity", **(headers or {})}
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+        # The server sends the whole, current resource instead if it changed.
+        request_headers["If-Range"] = validator
+    return request_headers
+
+
+def _is_encoded(headers) -> bool:
+    return headers.get("content-encoding", "identity").lower() != "identity"
+
+
+def _begin(output_path: str, url: str, status_code: int, headers, offset: int, validator: Optional[str]) -> Optional[int]:
+    """
+    Check that a response continues the partial file, or record what a fresh one
+    holds. Returns the expected total size.
+    """
+    if status_code == 206:
+        match = _CONTENT_RANGE.match(headers.get("content-range", ""))
+        start = int(match.group(1)) if match else None
+        current = _validator(headers)
+        if start != offset or (current is not None and current != validator):
+            _discard_partial(output_path)
+            raise IncompleteDownloadError(f"Resumed range of {url} does not continue the partial file")
+    else:
+        with open(_meta_path(output_path), "w") as f:
+            json.dump({"url": url, "validator": _validator(headers)}, f)
+    return _expected_size(status_code, headers, offset)
+
+
+def _finish(output_path: str, expected: Optional[int]) -> int:
+    """Verify the byte count of the partial file and atomically move it into place."""
+    partial = _partial_path(output_path)
+    written = os.path.getsize(partial)
+    if expected is not None and written != expected:
+        raise IncompleteDownloadError(
+            f"Downloaded {written} of {expected} bytes for {output_path}"
+        )
+    os.replace(partial, output_path)
+    _discard_partial(output_path)
+    return written
+
+
+def download_file(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    session: Optional[requests.Session] = None,
+    response: Optional[requests.Response] = None,
+    max_attempts: int = 3,
+    timeout: float = 60,
+) -> int:
+    """
+    Stream ``url`` to ``output_path`` in fixed-size chunks.
+
+    Bytes go to ``<output_path>.part`` first, which is renamed into place only once
+    the byte count matches what the server advertised, so a half-written file never
+    appears at ``output_path``. An interrupted transfer is resumed with a Range
+    request on the next attempt (or the next call for the same URL), guarded by
+    If-Range so that a resource that changed in between is fetched whole again.
+
+    :param url: URL to download.
+    :param output_path: Final location of the file.
+    :param headers: Extra request headers, e.g. authorization.
+    :param session: Session to issue requests with; defaults to ``requests``.
+    :param response: An already-open streaming response for ``url`` to consume first.
+    :param max_attempts: Number of attempts before giving up.
+    :param timeout: Per-request timeout in seconds.
+    :return: Number of bytes written.
+    """
+    http = session or requests
+    last_error = None
+    for attempt in range(max_attempts):
+        offset, validator = _prepare(output_path, url)
+        try:
+            if response is None or offset or _is_encoded(response.headers):
+                if response is not None:
+                    response.close()
+                response = http.get(
+                    url, headers=_range_headers(headers, offset, validator), stream=True, timeout=timeout
+                )
+            with response:
+                if response.status_code == 416:
+                    # Our partial file is not a prefix the server recognises; start over.
+                    _discard_partial(output_path)
+                    raise IncompleteDownloadError(f"Range not satisfiable for {url}")
+                response.raise_for_status()
+                expected = _begin(output_path, url, response.status_code, response.headers, offset, validator)
+                with open(_partial_path(output_path), "ab" if response.status_code == 206 else "wb") as f:
+                    # Raw bytes, so the count is comparable with Content-Length.
+                    for chunk in response.raw.stream(CHUNK_SIZE, decode_content=False):
+                        f.write(chunk)
+            return _finish(output_path, expected)
+        except (requests.RequestException, IncompleteDownloadError) as e:
+            last_error = e
+            default_logger.debug(f"Download attempt {attempt + 1} for {url} failed: {e}")
+        except urllib3.exceptions.HTTPError as e:
+            # Reading the raw stream raises urllib3's errors rather than requests'.
+            last_error = IncompleteDownloadError(f"Transfer of {url} failed: {e}")
+            default_logger.debug(f"Download attempt {attempt + 1} for {url} failed: {e}")
+        finally:
+            response = None
+    raise last_error
+
+
+async def async_download_file(
+    client: httpx.AsyncClient,
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    response: Optional[httpx.Response] = None,
+    max_attempts: int = 3,
+) -> int:
+    """
+    asyncio counterpart of :func:`download_file` built on an ``httpx.AsyncClient``.
+
+    ``response``, if given, must have been sent with ``stream=True``.
+    """
+    last_error = None
+    for attempt in range(max_attempts):
+        offset, validator = _prepare(output_path, url)
+        try:
+            if response is None or offset or _is_encoded(response.headers):
+                if response is not None:
+                    await response.aclose()
+                response = await client.send(
+                    client.build_request("GET", url, headers=_range_headers(headers, offset, validator)),
+                    stream=True,
+                )
+            try:
+                if response.status_code == 416:
+                    _discard_partial(output_path)
+                    raise IncompleteDownloadError(f"Range not satisfiable for {url}")
+                response.raise_for_status()
+                expected = _begin(output_path, url, response.status_code, response.headers, offset, validator)
+                with open(_partial_path(output_path), "ab" if response.status_code == 206 else "wb") as f:
+                    # Unsized, so bytes received before a cut reach the partial file;
+                    # httpx holds back a short final chunk when the stream errors.
+                    async for chunk in response.aiter_raw():
+                        f.write(chunk)
+            finally:
+                await response.aclose()
+            return _finish(output_path, expected)
+        except (httpx.HTTPError, IncompleteDownloadError) as e:
+            last_error = e
+            default_logger.debug(f"Download attempt {attempt + 1} for {url} failed: {e}")
+        finally:
+            response = None
+    raise last_error
@@ -0,0 +1,129 @@
+# errors.py
+import time
+from typing import Optional
+
+
+class ProviderError(Exception):
+    """
+    A provider rejected or failed a request.
+    """
+
+    def __init__(self, provider: str, message: str):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+
+
+class TransientError(ProviderError):
+    """
+    A failure that may go away on its own: a 5xx answer, a dropped connection or a
+    network timeout. Worth retrying after a pause of ``retry_after`` seconds, if the
+    provider said. ``status_code`` is the HTTP status, if the provider answered.
+    """
+
+    def __init__(self,
+                 provider: str,
+                 message: str,
+                 retry_after: Optional[float] = None,
+                 status_code: Optional[int] = None):
+        super().__init__(provider, message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class RateLimitError(TransientError):
+    """
+    A provider answered 429. ``retry_after`` holds the seconds it asked us to wait,
+    if it said.
+    """
+
+
+class ConnectionFailedError(TransientError):
+    """
+    No connection to the provider could be opened, so the request was never sent.
+    """
+
+
+class PermanentError(ProviderError):
+    """
+    A failure that repeating the request will not fix: the request was rejected
+    (4xx) or the provider reported the task as failed.
+    """
+
+
+class DeadlineExceeded(ProviderError, TimeoutError):
+    """
+    A job ran out of time. ``stage`` names where, e.g. "submit", "poll" or "download".
+    """
+
+    def __init__(self, provider: str, message: str, stage: str = ""):
+        super().__init__(provider, message)
+        self.stage = stage
+
+
+class CircuitOpenError(ProviderError):
+    """
+    The provider's circuit breaker is open after repeated failures, so the request
+    was not sent. ``retry_after`` is how long until a trial request is let through.
+    """
+
+    def __init__(self, provider: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(provider, message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header; HTTP-date values are not used by our providers."""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def error_for_status(provider: str,
+                     status_code: int,
+                     message: str,
+                     retry_after: Optional[float] = None) -> ProviderError:
+    """The typed error for an unsuccessful HTTP answer from ``provider``."""
+    if status_code == 429:
+        return RateLimitError(provider, message, retry_after, status_code)
+    if status_code >= 500 or status_code == 408:
+        return TransientError(provider, f"HTTP {status_code}: {message}", retry_after, status_code)
+    return PermanentError(provider, f"HTTP {status_code}: {message}")
+
+
+def never_processed(error: TransientError) -> bool:
+    """
+    Whether the provider certainly did not act on the failed request: it could not
+    be sent, or the provider turned it away with 429 or 503. Requests that create
+    something, such as a paid task, are only safe to retry after such failures; a
+    timeout or a 502 may come after the provider already started the work.
+    """
+    return isinstance(error, (ConnectionFailedError, RateLimitError)) or error.status_code == 503
+
+
+class Deadline:
+    """
+    Point in time by which a job must be done, handed down through queueing, submit
+    retries and polling so that each step only waits as long as the job has left.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        """
+        :param seconds: Time the job has from now; None means no deadline.
+        """
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self, default: float = float("inf")) -> float:
+        """Seconds left, never negative; ``default`` when there is no deadline."""
+        if self.expires_at is None:
+            return default
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, provider: str, stage: str) -> None:
+        """Raise DeadlineExceeded if the deadline has passed before ``stage``."""
+        if self.expired:
+            raise DeadlineExceeded(provider, f"deadline passed before {stage}", stage)
@@ -0,0 +1,214 @@
+# job_store.py
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import List, Optional
+
+from tools.common.logging import default_logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    provider_job_id TEXT,
+    state TEXT NOT NULL,
+    error TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_output ON jobs (output_path, state);
+"""
+
+
+class JobState(str, Enum):
+    """
+    Lifecycle of a persisted generation job.
+    """
+    CREATED = "created"
+    SUBMITTED = "submitted"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job:
+    """
+    One row of the job table.
+    """
+
+    def __init__(self, row: sqlite3.Row):
+        self.id = row["id"]
+        self.model = row["model"]
+        self.image_path = row["image_path"]
+        self.prompt = row["prompt"]
+        self.output_path = row["output_path"]
+        self.provider_job_id = row["provider_job_id"]
+        self.state = JobState(row["state"])
+        self.error = row["error"]
+        self.lease_owner = row["lease_owner"]
+        self.lease_expires = row["lease_expires"]
+        self.created_at = row["created_at"]
+        self.updated_at = row["updated_at"]
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id!r}, model={self.model!r}, state={self.state.value!r})"
+
+
+class JobStore:
+    """
+    SQLite-backed record of generation jobs, shared by every worker process that
+    points at the same database file.
+
+    Each job is leased by the process working on it; a background thread renews
+    the leases of live jobs. Jobs whose lease has expired belong to a dead process
+    and can be claimed by another one, which reattaches to the provider job instead
+    of paying for a new generation.
+    """
+
+    def __init__(self, db_path: str = "~/.cache/tools/jobs.db", lease_seconds: float = 60):
+        self.logger = default_logger
+        self.db_path = os.path.expanduser(db_path)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._connection().executescript(_SCHEMA)
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="job-store-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["JobStore"]:
+        """Open the store at TOOLS_JOB_DB, or return None if it is unset."""
+        db_path = os.getenv("TOOLS_JOB_DB")
+        return cls(db_path) if db_path else None
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connection().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+        )
+
+    def create(self, model: str, image_path: str, prompt: str, output_path: str, job_id: Optional[str] = None) -> str:
+        """Record a new job leased to this process and return its ID (``job_id`` if given)."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, model, image_path, prompt, output_path, state, lease_owner,"
+            " lease_expires, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, model, image_path, prompt or "", output_path, JobState.CREATED.value,
+             self.owner, now + self.lease_seconds, now, now),
+        )
+        with self._active_lock:
+            self._active.add(job_id)
+        return job_id
+
+    def set_submitted(self, job_id: str, provider_job_id: str) -> None:
+        """Record the provider's job ID as soon as the provider accepted the job."""
+        self._update(job_id, provider_job_id=provider_job_id, state=JobState.SUBMITTED.value)
+
+    def finish(self, job_id: str, state: JobState, error: Optional[str] = None) -> None:
+        """Record a final state and release the lease."""
+        self._update(job_id, state=state.value, error=error, lease_owner=None, lease_expires=None)
+        with self._active_lock:
+            self._active.discard(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row else None
+
+    def unfinished_for(self, output_path: str) -> List[Job]:
+        """Jobs, of any process, still working towards ``output_path``, oldest first."""
+        rows = self._connection().execute(
+            "SELECT * FROM jobs WHERE output_path = ? AND state IN (?, ?) ORDER BY created_at",
+            (output_path, JobState.CREATED.value, JobState.SUBMITTED.value),
+        ).fetchall()
+        return [Job(row) for row in rows]
+
+    def claim(self, job_id: str) -> Optional[Job]:
+        """
+        Take over one unfinished job if its owner stopped renewing its lease, and
+        return it; None if it is finished or another process still holds it.
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET lease_owner = ?, lease_expires = ?, updated_at = ?"
+            " WHERE id = ? AND state IN (?, ?) AND (lease_expires IS NULL OR lease_expires < ?)",
+            (self.owner, now + self.lease_seconds, now, job_id,
+             JobState.CREATED.value, JobState.SUBMITTED.value, now),
+        )
+        if cursor.rowcount == 0:
+            return None
+        with self._active_lock:
+            self._active.add(job_id)
+        return self.get(job_id)
+
+    def claim_orphans(self, limit: int = 100) -> List[Job]:
+        """
+        Take over unfinished jobs whose owner stopped renewing its lease.
+
+        The claim runs in an immediate transaction, so two processes starting
+        together never claim the same job.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state IN (?, ?) AND (lease_expires IS NULL OR lease_expires < ?)"
+                " ORDER BY created_at LIMIT ?",
+                (JobState.CREATED.value, JobState.SUBMITTED.value, now, limit),
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (self.owner, now + self.lease_seconds, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        jobs = [Job(row) for row in rows]
+        with self._active_lock:
+            self._active.update(job.id for job in jobs)
+        return jobs
+
+    def _renew_leases(self) -> None:
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._active_lock:
+                active = list(self._active)
+            if not active:
+                continue
+            try:
+                placeholders = ", ".join("?" for _ in active)
+                self._connection().execute(
+                    f"UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? AND id IN ({placeholders})",
+                    [time.time() + self.lease_seconds, self.owner, *active],
+                )
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to renew job leases, error: {e}")
@@ -1,12 +1,155 @@
 # logging.py
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
 import sys
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Fields such as job_id attached to every record logged inside ``log_context``.
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """
+    Attach ``fields`` (e.g. job_id, provider) to every record logged by this thread
+    or task inside the block. JSON output includes them as top-level keys.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class LazyPayload:
+    """
+    Defers serializing a large payload until a record is actually written, and
+    truncates it. Use with %-style arguments so disabled or dropped records cost
+    nothing:
+
+        logger.debug("Task submitted: %s", LazyPayload(task))
+    """
+
+    def __init__(self, payload: Any, max_chars: int = 500):
+        self.payload = payload
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, (str, bytes)):
+            text = self.payload.decode("utf-8", "replace") if isinstance(self.payload, bytes) else self.payload
+        else:
+            try:
+                text = json.dumps(self.payload, default=str)
+            except (TypeError, ValueError):
+                text = repr(self.payload)
+        if len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... ({len(text)} chars)"
+        return text
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the current ``log_context`` fields onto each record. It runs in the
+    logging thread, before the record may be handed to a background writer.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most ``burst`` records per logging call site through, refilled at ``rate``
+    per second, so repetitive messages such as status polls cannot flood the output.
+    The next record that passes reports how many were suppressed.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 10):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Keyed by call site: messages are mostly f-strings, formatted before they
+        # get here, so the text differs between records of the same call.
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = [tokens, now, suppressed + 1]
+                return False
+            self._buckets[key] = [tokens - 1, now, 0]
+            if len(self._buckets) > 10000:
+                self._buckets.clear()
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, with the ``log_context``
+    fields (job_id, provider, ...) as top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(getattr(record, "context", {}))
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the background writer and drops records
+    instead of blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler formats the message here, on the caller's thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
 def setup_logger(name: str,
                  log_file: str = None,
                  level: int = logging.DEBUG,
-                 fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s") -> logging.Logger:
+                 fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                 json_format: bool = False,
+                 async_mode: bool = False,
+                 rate_limit: Optional[float] = None,
+                 queue_size: int = 10000) -> logging.Logger:
     """
     Set up a logger with the specified name and configuration.
 
@@ -14,22 +157,29 @@ def setup_logger(name: str,
     :param log_file: If provided, logs will also be written to this file.
     :param level: Logging level (e.g., logging.DEBUG, logging.INFO).
     :param fmt: Logging format.
+    :param json_format: Write one JSON object per record, including log_context fields.
+    :param async_mode: Hand records to a background writer thread through a bounded
+        queue, so callers never wait on formatting or I/O; records are dropped when
+        the queue is full.
+    :param rate_limit: If set, the number of records per second each logging call
+        may log after an initial burst; the rest are suppressed.
+    :param queue_size: Capacity of the queue in async mode.
     :return: Configured logger.
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     # If logger already has handlers, avoid adding duplicates
     if logger.handlers:
         return logger
 
     # Formatter for logging messages
-    formatter = logging.Formatter(fmt)
+    formatter = JsonFormatter() if json_format else logging.Formatter(fmt)
 
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
 
     # File handler, if a log_file path is provided
     if log_file:
@@ -37,10 +187,54 @@ def setup_logger(name: str,
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
         file_handler = logging.FileHandler(log_file)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    if async_mode:
+        queue_handler = _DeferredQueueHandler(queue.Queue(maxsize=queue_size))
+        listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        # Flush what is still queued when the process exits.
+        atexit.register(listener.stop)
+        handlers = [queue_handler]
+
+    # Filters run on the logging thread, before records are queued or formatted.
+    for handler in handlers:
+        handler.addFilter(ContextFilter())
+        if rate_limit is not None:
+            handler.addFilter(RateLimitFilter(rate=rate_limit))
+        logger.addHandler(handler)
 
     return logger
 
+def _level_from_env(default: int = logging.DEBUG) -> int:
+    # A typo in TOOLS_LOG_LEVEL must not stop every tool from importing.
+    name = os.getenv("TOOLS_LOG_LEVEL", "").strip().upper()
+    level = logging.getLevelName(name) if name else default
+    if not isinstance(level, int):
+        print(f"Ignoring unknown TOOLS_LOG_LEVEL {name!r}", file=sys.stderr)
+        return default
+    return level
+
+
+def _rate_from_env() -> Optional[float]:
+    value = os.getenv("TOOLS_LOG_RATE")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Ignoring invalid TOOLS_LOG_RATE {value!r}", file=sys.stderr)
+        return None
+
+
 # Example: Creating a module-level logger that can be imported elsewhere.
 # This logger writes to the console, and optionally you can specify a log file.
-default_logger = setup_logger(__name__)
+# TOOLS_LOG_LEVEL, TOOLS_LOG_FORMAT=json, TOOLS_LOG_ASYNC=1 and TOOLS_LOG_RATE
+# (records per second per logging call) configure it for large batch runs.
+default_logger = setup_logger(
+    __name__,
+    level=_level_from_env(),
+    json_format=os.getenv("TOOLS_LOG_FORMAT", "").lower() == "json",
+    async_mode=os.getenv("TOOLS_LOG_ASYNC", "") not in ("", "0", "false"),
+    rate_limit=_rate_from_env(),
+)
@@ -0,0 +1,288 @@
+# metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from tools.common.logging import default_logger
+
+# Upper bounds in seconds, from a fast status poll up to a slow generation.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+_Labels = Tuple[str, str, str]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the ``q`` quantile (0-1) by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Span:
+    """
+    One timed stage of a job. Code inside the span adds the bytes it moved and the
+    HTTP requests it made; the duration is measured by ``Metrics.span``.
+    """
+
+    def __init__(self, stage: str, provider: str, model: str, job_id: Optional[str]):
+        self.stage = stage
+        self.provider = provider
+        self.model = model
+        self.job_id = job_id
+        self.started = time.time()
+        self.seconds = 0.0
+        self.bytes = 0
+        self.requests = 0
+        self.error: Optional[str] = None
+
+    def add(self, bytes: int = 0, requests: int = 0) -> None:
+        self.bytes += bytes
+        self.requests += requests
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "provider": self.provider,
+            "model": self.model,
+            "job_id": self.job_id,
+            "started": self.started,
+            "seconds": round(self.seconds, 4),
+            "bytes": self.bytes,
+            "requests": self.requests,
+            "error": self.error,
+        }
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and byte/request counters, labelled by stage,
+    provider and model, plus a ring of the most recent spans for debugging single
+    jobs. Stages used by the pipeline: caption, preprocess, upload, queue_wait,
+    generation, poll and download.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, recent_spans: int = 1000):
+        self.buckets = buckets
+        self._histograms: Dict[_Labels, Histogram] = {}
+        self._bytes: Dict[_Labels, int] = {}
+        self._requests: Dict[_Labels, int] = {}
+        self._errors: Dict[_Labels, int] = {}
+        self._recent: Deque[Span] = deque(maxlen=recent_spans)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, provider: str = "", model: str = "", job_id: Optional[str] = None) -> Iterator[Span]:
+        """Time the enclosed block as ``stage``; exceptions are counted and re-raised."""
+        span = Span(stage, provider, model, job_id)
+        started = time.monotonic()
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.seconds = time.monotonic() - started
+            self._record_span(span)
+
+    def record(self,
+               stage: str,
+               seconds: float,
+               provider: str = "",
+               model: str = "",
+               job_id: Optional[str] = None,
+               bytes: int = 0,
+               requests: int = 0) -> None:
+        """Record a stage timed elsewhere, e.g. provider queue wait reported by the poller."""
+        span = Span(stage, provider, model, job_id)
+        span.started -= seconds
+        span.seconds = seconds
+        span.add(bytes, requests)
+        self._record_span(span)
+
+    def _record_span(self, span: Span) -> None:
+        labels = (span.stage, span.provider, span.model)
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = Histogram(self.buckets)
+            histogram.observe(span.seconds)
+            self._bytes[labels] = self._bytes.get(labels, 0) + span.bytes
+            self._requests[labels] = self._requests.get(labels, 0) + span.requests
+            if span.error is not None:
+                self._errors[labels] = self._errors.get(labels, 0) + 1
+            self._recent.append(span)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Count, mean and estimated p50/p90 seconds per stage and provider."""
+        with self._lock:
+            items = list(self._histograms.items())
+        summary = {}
+        for (stage, provider, model), histogram in items:
+            key = "/".join(part for part in (stage, provider, model) if part)
+            summary[key] = {
+                "count": histogram.count,
+                "mean": round(histogram.sum / histogram.count, 3),
+                "p50": round(histogram.quantile(0.5), 3),
+                "p90": round(histogram.quantile(0.9), 3),
+            }
+        return summary
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Everything, including the recent spans, as JSON-serializable data."""
+        bounds = [*map(str, self.buckets), "+Inf"]
+        stages = []
+        with self._lock:
+            for labels, histogram in self._histograms.items():
+                stage, provider, model = labels
+                stages.append({
+                    "stage": stage,
+                    "provider": provider,
+                    "model": model,
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 4),
+                    "buckets": dict(zip(bounds, histogram.counts)),
+                    "bytes": self._bytes.get(labels, 0),
+                    "requests": self._requests.get(labels, 0),
+                    "errors": self._errors.get(labels, 0),
+                })
+            spans = [span.as_dict() for span in self._recent]
+        return {"stages": stages, "recent_spans": spans}
+
+    def render_prometheus(self) -> str:
+        """Render the histograms and counters in the Prometheus text exposition format."""
+        lines: List[str] = [
+            "# HELP tools_stage_seconds Time spent per job stage.",
+            "# TYPE tools_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = {
+                "tools_stage_bytes_total": dict(self._bytes),
+                "tools_stage_requests_total": dict(self._requests),
+                "tools_stage_errors_total": dict(self._errors),
+            }
+        for labels, histogram in histograms:
+            label_text = _label_text(labels)
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'tools_stage_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"tools_stage_seconds_sum{{{label_text}}} {histogram.sum}")
+            lines.append(f"tools_stage_seconds_count{{{label_text}}} {histogram.count}")
+        for name, values in counters.items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in values.items():
+                lines.append(f"{name}{{{_label_text(labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_text(labels: _Labels) -> str:
+    stage, provider, model = labels
+    return ",".join(
+        f'{name}="{value}"'
+        for name, value in (("stage", stage), ("provider", provider), ("model", model))
+    )
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint serving ``/metrics`` (Prometheus text) and
+    ``/metrics.json`` (``Metrics.as_dict``).
+    """
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9464):
+        self.logger = default_logger
+        self.metrics = metrics
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+            self._thread.start()
+            self.logger.debug(f"Metrics endpoint listening on port {self.port}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = server.metrics.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(server.metrics.as_dict()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+_default_metrics: Optional[Metrics] = None
+_default_metrics_lock = threading.Lock()
+
+
+def default_metrics() -> Metrics:
+    """
+    Return the process-wide Metrics. On first use, also serve them on METRICS_PORT
+    if that is set.
+    """
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+            port = os.getenv("METRICS_PORT")
+            if port:
+                MetricsServer(_default_metrics, port=int(port)).start()
+        return _default_metrics
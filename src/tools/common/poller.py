@@ -0,0 +1,451 @@
+# poller.py
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tools.common.errors import DeadlineExceeded, PermanentError, TransientError
+from tools.common.logging import default_logger
+from tools.common.metrics import Metrics, default_metrics
+
+
+class TaskState(str, Enum):
+    """
+    Provider-neutral state of a submitted generation task.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class TaskStatus:
+    """
+    Result of one status check: the normalized state plus the raw provider payload.
+    """
+
+    def __init__(self, state: TaskState, payload: Any = None, error: Optional[str] = None):
+        self.state = state
+        self.payload = payload
+        self.error = error
+        # Filled in by the Poller for final statuses: seconds from submission to
+        # completion, and to the first check that saw the task running.
+        self.elapsed: Optional[float] = None
+        self.queue_seconds: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in (TaskState.SUCCEEDED, TaskState.FAILED)
+
+    def __repr__(self) -> str:
+        return f"TaskStatus(state={self.state.value!r}, error={self.error!r})"
+
+
+class AdaptiveBackoff:
+    """
+    Per-provider polling schedule that learns how long tasks usually take.
+
+    Keeps an exponentially weighted mean and deviation of completion times. Far from
+    the expected finish it sleeps long intervals; inside the expected window it polls
+    at ``min_interval``; once a task overruns the window the interval grows
+    geometrically back towards ``max_interval``. Every delay is jittered so tasks
+    submitted together do not poll in lockstep.
+    """
+
+    def __init__(self,
+                 min_interval: float = 2.0,
+                 max_interval: float = 30.0,
+                 initial_estimate: float = 120.0,
+                 alpha: float = 0.2,
+                 jitter: float = 0.2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.jitter = jitter
+        self.mean = initial_estimate
+        self.deviation = initial_estimate / 4
+        self._lock = threading.Lock()
+
+    def observe(self, duration: float) -> None:
+        """Record the submit-to-completion time of a finished task."""
+        with self._lock:
+            error = duration - self.mean
+            self.mean += self.alpha * error
+            self.deviation += self.alpha * (abs(error) - self.deviation)
+
+    def next_delay(self, elapsed: float) -> float:
+        """Seconds to wait before the next check of a task submitted ``elapsed`` seconds ago."""
+        with self._lock:
+            window_start = self.mean - 2 * self.deviation
+            window_end = self.mean + 2 * self.deviation
+        if elapsed < window_start:
+            # Sleep most of the way to the window, but never past its start.
+            delay = max(self.min_interval, (window_start - elapsed) * 0.75)
+        elif elapsed <= window_end:
+            delay = self.min_interval
+        else:
+            overrun = (elapsed - window_end) / max(self.deviation, 1.0)
+            delay = self.min_interval * (1.5 ** overrun)
+        delay = min(delay, self.max_interval)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+_backoffs: Dict[str, AdaptiveBackoff] = {}
+_backoffs_lock = threading.Lock()
+
+
+def get_backoff(provider: str) -> AdaptiveBackoff:
+    """Return the process-wide backoff schedule for ``provider``, creating it on first use."""
+    with _backoffs_lock:
+        if provider not in _backoffs:
+            _backoffs[provider] = AdaptiveBackoff()
+        return _backoffs[provider]
+
+
+def set_backoff(provider: str, backoff: AdaptiveBackoff) -> None:
+    """Replace the backoff schedule for ``provider``, e.g. to poll a fast local stand-in."""
+    with _backoffs_lock:
+        _backoffs[provider] = backoff
+
+
+class _Watch:
+    def __init__(self,
+                 provider: str,
+                 task_id: str,
+                 check: Callable[[str], TaskStatus],
+                 timeout: float,
+                 on_update: Optional[Callable[[TaskStatus], None]] = None):
+        self.provider = provider
+        self.task_id = task_id
+        self.check = check
+        self.on_update = on_update
+        self.submitted_at = time.monotonic()
+        self.running_at: Optional[float] = None
+        self.errors = 0
+        self.transient_errors = 0
+        self.deadline = self.submitted_at + timeout
+        self.future: Future = Future()
+        # Checks run on pool threads; they log with the watcher's log_context.
+        self.context = contextvars.copy_context()
+
+    def run(self, function: Callable, *args: Any) -> Any:
+        # A copy, since one context cannot be entered by two threads at once.
+        return self.context.copy().run(function, *args)
+
+
+class Poller:
+    """
+    Single scheduler that tracks every outstanding task across providers.
+
+    Clients hand over a task ID and a status-check callable and get back a Future
+    that resolves to the final TaskStatus. Checks run on a small thread pool at the
+    times chosen by each provider's AdaptiveBackoff. Providers that can report many
+    tasks in one request may register a batch check; tasks it does not report fall
+    back to the individual check.
+
+    A check that raises PermanentError fails the task's Future at once. A
+    TransientError, e.g. a brief network outage, is retried more patiently, since
+    the task is still running and paid for: it fails the Future only after
+    ``max_transient_errors`` in a row, so a provider that keeps answering 5xx does
+    not hold the job until its timeout. Other errors fail the Future after
+    ``max_check_errors`` in a row.
+    """
+
+    def __init__(self,
+                 max_workers: int = 8,
+                 metrics: Optional[Metrics] = None,
+                 max_check_errors: int = 5,
+                 max_transient_errors: int = 10,
+                 early_ttl: float = 600,
+                 max_early: int = 10000):
+        self.logger = default_logger
+        self.max_check_errors = max_check_errors
+        self.max_transient_errors = max_transient_errors
+        # Pushed statuses nobody watches yet are kept this long, and this many at most.
+        self.early_ttl = early_ttl
+        self.max_early = max_early
+        self.metrics = metrics or default_metrics()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poller")
+        self._batch_checks: Dict[str, Callable[[List[str]], Dict[str, TaskStatus]]] = {}
+        self._push_intervals: Dict[str, float] = {}
+        self._watches: Dict[tuple, _Watch] = {}
+        self._early: "OrderedDict[tuple, Tuple[TaskStatus, float]]" = OrderedDict()
+        self._heap: List = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="poller", daemon=True)
+        self._thread.start()
+
+    def set_batch_check(self, provider: str, batch_check: Callable[[List[str]], Dict[str, TaskStatus]]) -> None:
+        """Register a callable that checks many task IDs of ``provider`` in one request."""
+        self._batch_checks[provider] = batch_check
+
+    def set_push_enabled(self, provider: str, safety_interval: float = 120) -> None:
+        """
+        Mark ``provider`` as pushing completions (see ``notify``). Its tasks are then
+        only checked every ``safety_interval`` seconds in case a callback is lost.
+        """
+        self._push_intervals[provider] = safety_interval
+
+    def notify(self, provider: str, task_id: str, status: TaskStatus) -> None:
+        """
+        Deliver a pushed status, e.g. from a webhook. A final status resolves the
+        task's Future at once; one that arrives before ``watch`` is kept for it for
+        ``early_ttl`` seconds, since callbacks also come for tasks nobody here
+        watches, e.g. those of another process.
+        """
+        if not status.done:
+            return
+        with self._condition:
+            watch = self._watches.get((provider, task_id))
+            if watch is None:
+                now = time.monotonic()
+                self._early[(provider, task_id)] = (status, now)
+                self._early.move_to_end((provider, task_id))
+                while self._early and (
+                    len(self._early) > self.max_early or next(iter(self._early.values()))[1] < now - self.early_ttl
+                ):
+                    self._early.popitem(last=False)
+                return
+        watch.run(self._handle, watch, status)
+
+    def watch(self,
+              provider: str,
+              task_id: str,
+              check: Callable[[str], TaskStatus],
+              timeout: float = 600,
+              on_update: Optional[Callable[[TaskStatus], None]] = None) -> Future:
+        """
+        Start tracking a task.
+
+        :param provider: Provider name, selects the backoff schedule and batch check.
+        :param task_id: Provider task/prediction/generation ID.
+        :param check: Callable returning the current TaskStatus for ``task_id``.
+        :param timeout: Seconds after which the Future fails with DeadlineExceeded, a
+            TimeoutError.
+        :param on_update: Called with every status seen for the task, e.g. to show progress.
+        :return: Future resolving to the final TaskStatus.
+        """
+        watch = _Watch(provider, task_id, check, timeout, on_update)
+        with self._condition:
+            self._watches[(provider, task_id)] = watch
+            early = self._early.pop((provider, task_id), None)
+        if early is not None and early[1] >= time.monotonic() - self.early_ttl:
+            self._handle(watch, early[0])
+        else:
+            self._schedule(watch, self._next_delay(provider, 0))
+        return watch.future
+
+    def _next_delay(self, provider: str, elapsed: float) -> float:
+        if provider in self._push_intervals:
+            return self._push_intervals[provider]
+        return get_backoff(provider).next_delay(elapsed)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def _schedule(self, watch: _Watch, delay: float) -> None:
+        due = min(time.monotonic() + delay, watch.deadline)
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._counter), watch))
+            self._condition.notify()
+
+    def _pop_due(self) -> List[_Watch]:
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        due.append(heapq.heappop(self._heap)[2])
+                    return due
+                self._condition.wait(self._heap[0][0] - now if self._heap else None)
+            return []
+
+    def _run(self) -> None:
+        while True:
+            due = self._pop_due()
+            if not due:
+                return
+            by_provider: Dict[str, List[_Watch]] = {}
+            for watch in due:
+                if not watch.future.done():
+                    by_provider.setdefault(watch.provider, []).append(watch)
+            for provider, watches in by_provider.items():
+                if provider in self._batch_checks and len(watches) > 1:
+                    self._executor.submit(self._check_batch, provider, watches)
+                else:
+                    for watch in watches:
+                        self._executor.submit(watch.run, self._check_one, watch)
+
+    def _check_batch(self, provider: str, watches: List[_Watch]) -> None:
+        try:
+            with self.metrics.span("poll", provider) as span:
+                span.add(requests=1)
+                statuses = self._batch_checks[provider]([watch.task_id for watch in watches])
+        except Exception as e:
+            self.logger.error(f"Batch status check for {provider} failed, error: {e}")
+            statuses = {}
+        for watch in watches:
+            if watch.task_id in statuses:
+                watch.run(self._handle, watch, statuses[watch.task_id])
+            else:
+                watch.run(self._check_one, watch)
+
+    def _check_one(self, watch: _Watch) -> None:
+        try:
+            with self.metrics.span("poll", watch.provider) as span:
+                span.add(requests=1)
+                status = watch.check(watch.task_id)
+        except PermanentError as e:
+            self.logger.error(f"Status check for {watch.provider} task {watch.task_id} failed, error: {e}")
+            self._resolve(watch, exception=e)
+            return
+        except TransientError as e:
+            watch.transient_errors += 1
+            self.logger.error(
+                f"Status check for {watch.provider} task {watch.task_id} failed "
+                f"({watch.transient_errors}/{self.max_transient_errors}), retrying, error: {e}"
+            )
+            if watch.transient_errors >= self.max_transient_errors:
+                self._resolve(watch, exception=e)
+                return
+            status = None
+        except Exception as e:
+            watch.errors += 1
+            self.logger.error(
+                f"Status check for {watch.provider} task {watch.task_id} failed "
+                f"({watch.errors}/{self.max_check_errors}), error: {e}"
+            )
+            if watch.errors >= self.max_check_errors:
+                self._resolve(watch, exception=e)
+                return
+            status = None
+        else:
+            watch.errors = 0
+            watch.transient_errors = 0
+        self._handle(watch, status)
+
+    def _handle(self, watch: _Watch, status: Optional[TaskStatus]) -> None:
+        now = time.monotonic()
+        elapsed = now - watch.submitted_at
+        if status is not None and status.state != TaskState.PENDING and watch.running_at is None:
+            watch.running_at = now
+        if status is not None and watch.on_update is not None:
+            try:
+                watch.on_update(status)
+            except Exception as e:
+                self.logger.error(f"Status callback for {watch.provider} task {watch.task_id} failed, error: {e}")
+        if status is not None and status.done:
+            status.elapsed = elapsed
+            if watch.running_at is not None and watch.running_at < now:
+                status.queue_seconds = watch.running_at - watch.submitted_at
+            if status.state == TaskState.SUCCEEDED:
+                get_backoff(watch.provider).observe(elapsed)
+            self._resolve(watch, status)
+        elif now >= watch.deadline:
+            self._resolve(
+                watch,
+                exception=DeadlineExceeded(
+                    watch.provider, f"task {watch.task_id} not finished after {elapsed:.0f}s", "poll"
+                ),
+            )
+        else:
+            self._schedule(watch, self._next_delay(watch.provider, elapsed))
+
+    def _resolve(self, watch: _Watch, status: Optional[TaskStatus] = None, exception: Optional[Exception] = None) -> None:
+        with self._condition:
+            if watch.future.done():
+                return
+            self._watches.pop((watch.provider, watch.task_id), None)
+            if exception is not None:
+                watch.future.set_exception(exception)
+            else:
+                watch.future.set_result(status)
+
+
+async def async_watch(provider: str,
+                      task_id: str,
+                      check: Callable[[str], Awaitable[TaskStatus]],
+                      timeout: float = 600,
+                      on_update: Optional[Callable[[TaskStatus], None]] = None,
+                      max_check_errors: int = 5,
+                      max_transient_errors: int = 10) -> TaskStatus:
+    """
+    asyncio counterpart of ``Poller.watch`` for clients that wait on the event loop:
+    awaits ``check`` on the provider's AdaptiveBackoff schedule and returns the
+    final TaskStatus. Errors are handled as the Poller handles them; after
+    ``timeout`` seconds it raises DeadlineExceeded.
+    """
+    # Imported here so that the synchronous CLIs do not pay for asyncio at startup.
+    import asyncio
+
+    backoff = get_backoff(provider)
+    submitted_at = time.monotonic()
+    deadline = submitted_at + timeout
+    running_at: Optional[float] = None
+    errors = transient_errors = 0
+    while True:
+        status: Optional[TaskStatus] = None
+        try:
+            status = await check(task_id)
+        except PermanentError:
+            raise
+        except TransientError as e:
+            transient_errors += 1
+            default_logger.error(
+                f"Status check for {provider} task {task_id} failed "
+                f"({transient_errors}/{max_transient_errors}), retrying, error: {e}"
+            )
+            if transient_errors >= max_transient_errors:
+                raise
+        except Exception as e:
+            errors += 1
+            default_logger.error(
+                f"Status check for {provider} task {task_id} failed ({errors}/{max_check_errors}), error: {e}"
+            )
+            if errors >= max_check_errors:
+                raise
+        else:
+            errors = transient_errors = 0
+
+        now = time.monotonic()
+        elapsed = now - submitted_at
+        if status is not None:
+            if status.state != TaskState.PENDING and running_at is None:
+                running_at = now
+            if on_update is not None:
+                on_update(status)
+            if status.done:
+                status.elapsed = elapsed
+                if running_at is not None and running_at < now:
+                    status.queue_seconds = running_at - submitted_at
+                if status.state == TaskState.SUCCEEDED:
+                    backoff.observe(elapsed)
+                return status
+        if now >= deadline:
+            raise DeadlineExceeded(provider, f"task {task_id} not finished after {elapsed:.0f}s", "poll")
+        await asyncio.sleep(min(backoff.next_delay(elapsed), deadline - now))
+
+
+_default_poller: Optional[Poller] = None
+_default_poller_lock = threading.Lock()
+
+
+def default_poller() -> Poller:
+    """Return the process-wide Poller shared by all provider clients."""
+    global _default_poller
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = Poller()
+        return _default_poller
@@ -0,0 +1,300 @@
+# resilience.py
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+from tools.common.errors import (
+    CircuitOpenError,
+    ConnectionFailedError,
+    Deadline,
+    DeadlineExceeded,
+    ProviderError,
+    RateLimitError,
+    TransientError,
+    error_for_status,
+    parse_retry_after,
+)
+from tools.common.logging import default_logger
+
+T = TypeVar("T")
+
+
+def _typed_error(provider: str, e: Exception) -> Optional[ProviderError]:
+    # The HTTP libraries are looked up, not imported: an error from a library that
+    # nobody loaded cannot happen, and importing httpx would cost every CLI startup.
+    requests = sys.modules.get("requests")
+    httpx = sys.modules.get("httpx")
+    urllib3 = sys.modules.get("urllib3")
+    download = sys.modules.get("tools.common.download")
+    if requests is not None and isinstance(e, requests.HTTPError):
+        if e.response is None:
+            return TransientError(provider, str(e))
+        return error_for_status(
+            provider, e.response.status_code, str(e), parse_retry_after(e.response.headers.get("Retry-After"))
+        )
+    message = f"{type(e).__name__}: {e}"
+    if requests is not None and isinstance(e, requests.ConnectionError):
+        # Without adapter retries, urllib3 only wraps failures to connect in
+        # MaxRetryError; errors after the request went out are raised as they are.
+        reason = e.args[0] if e.args else None
+        if isinstance(e, requests.ConnectTimeout) or (
+                urllib3 is not None and isinstance(reason, urllib3.exceptions.MaxRetryError)):
+            return ConnectionFailedError(provider, message)
+    if httpx is not None and isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return ConnectionFailedError(provider, message)
+    if isinstance(e, ConnectionRefusedError):
+        return ConnectionFailedError(provider, message)
+    if ((requests is not None and isinstance(e, requests.RequestException))
+            or (httpx is not None and isinstance(e, httpx.TransportError))
+            or (download is not None and isinstance(e, download.IncompleteDownloadError))
+            or isinstance(e, ConnectionError)):
+        return TransientError(provider, message)
+    return None
+
+
+@contextmanager
+def network_errors(provider: str) -> Iterator[None]:
+    """
+    Re-raise failures of HTTP calls inside the block as typed errors: connections
+    that could not be opened as ConnectionFailedError, other connection failures,
+    network timeouts and cut-off downloads as TransientError, and HTTP error
+    statuses by their code.
+    """
+    try:
+        yield
+    except Exception as e:
+        error = _typed_error(provider, e)
+        if error is None:
+            raise
+        raise error from e
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a provider that keeps failing.
+
+    Closed, every request goes through. After ``failure_threshold`` consecutive
+    failures the breaker opens and requests fail at once with CircuitOpenError, so
+    callers can give their capacity to healthy providers. After ``reset_seconds``
+    one trial request is let through (half-open); its success closes the breaker,
+    its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, provider: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.logger = default_logger
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allows(self) -> bool:
+        """Whether a request would be let through now, without claiming the trial slot."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            return time.monotonic() - self.opened_at >= self.reset_seconds and not self._trial_in_flight
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited >= self.reset_seconds and not self._trial_in_flight:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = True
+                return
+            retry_after = max(0.0, self.reset_seconds - waited)
+        raise CircuitOpenError(self.provider, f"circuit open after {self.failures} failures", retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                self.logger.info(f"{self.provider} recovered, closing circuit")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a call that says nothing about the provider's health, e.g. one that hit a local bug."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.logger.error(
+                        f"{self.provider} failed {self.failures} times in a row, "
+                        f"failing fast for {self.reset_seconds:.0f}s"
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, object]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(provider: str) -> CircuitBreaker:
+    """
+    Return the process-wide breaker for ``provider``, created on first use with
+    CIRCUIT_FAILURE_THRESHOLD and CIRCUIT_RESET_SECONDS.
+    """
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                reset_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+            )
+        return _breakers[provider]
+
+
+def breaker_stats() -> Dict[str, Dict[str, object]]:
+    """State of every breaker created so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.provider: breaker.as_dict() for breaker in breakers}
+
+
+def _retry_delay(provider: str,
+                 error: TransientError,
+                 attempt: int,
+                 deadline: Deadline,
+                 stage: str,
+                 max_attempts: int,
+                 base_delay: float,
+                 max_delay: float,
+                 breaker: Optional[CircuitBreaker],
+                 retry_if: Optional[Callable[[TransientError], bool]]) -> Optional[float]:
+    """
+    Report a transient failure to the breaker and return how long to wait before
+    the next attempt, or None if it must not be retried.
+    """
+    if breaker is not None:
+        # A 429 means the provider is up, just busy.
+        if isinstance(error, RateLimitError):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    if attempt == max_attempts - 1 or (retry_if is not None and not retry_if(error)):
+        return None
+    delay = error.retry_after if error.retry_after is not None else base_delay * 2 ** attempt
+    delay = min(max_delay, delay) * random.uniform(0.8, 1.2)
+    if delay >= deadline.remaining():
+        raise DeadlineExceeded(provider, f"no time left to retry {stage} after: {error}", stage) from error
+    default_logger.debug(f"{stage} on {provider} failed ({error}), retrying in {delay:.1f}s")
+    return delay
+
+
+def retry_call(provider: str,
+               call: Callable[[], T],
+               deadline: Optional[Deadline] = None,
+               stage: str = "request",
+               max_attempts: int = 3,
+               base_delay: float = 0.5,
+               max_delay: float = 10.0,
+               breaker: Optional[CircuitBreaker] = None,
+               retry_if: Optional[Callable[[TransientError], bool]] = None) -> T:
+    """
+    Call ``call`` and retry it on TransientError, with jittered exponential backoff
+    (or the provider's Retry-After), at most ``max_attempts`` times and never past
+    ``deadline``. Other errors are raised at once, as are transient errors for which
+    ``retry_if`` returns False, e.g. ``never_processed`` for calls that must not run
+    twice.
+
+    With a breaker, each attempt first asks it for permission and then reports the
+    outcome, so an unhealthy provider fails fast with CircuitOpenError. Only
+    transient failures other than 429s count against the provider.
+    """
+    deadline = deadline or Deadline(None)
+    for attempt in range(max_attempts):
+        deadline.check(provider, stage)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = call()
+        except TransientError as e:
+            delay = _retry_delay(
+                provider, e, attempt, deadline, stage, max_attempts, base_delay, max_delay, breaker, retry_if
+            )
+            if delay is None:
+                raise
+            time.sleep(delay)
+        except ProviderError:
+            if breaker is not None:
+                # The provider answered; a rejected request says nothing about its health.
+                breaker.record_success()
+            raise
+        except BaseException:
+            if breaker is not None:
+                # Not the provider's doing, so only give up a half-open trial slot.
+                breaker.release()
+            raise
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+async def async_retry_call(provider: str,
+                           call: Callable[[], Awaitable[T]],
+                           deadline: Optional[Deadline] = None,
+                           stage: str = "request",
+                           max_attempts: int = 3,
+                           base_delay: float = 0.5,
+                           max_delay: float = 10.0,
+                           breaker: Optional[CircuitBreaker] = None,
+                           retry_if: Optional[Callable[[TransientError], bool]] = None) -> T:
+    """
+    asyncio counterpart of :func:`retry_call`: awaits ``call()`` and sleeps on the
+    event loop between attempts. A cancelled call gives up a half-open trial slot.
+    """
+    # Imported here so that the synchronous CLIs do not pay for asyncio at startup.
+    import asyncio
+
+    deadline = deadline or Deadline(None)
+    for attempt in range(max_attempts):
+        deadline.check(provider, stage)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await call()
+        except TransientError as e:
+            delay = _retry_delay(
+                provider, e, attempt, deadline, stage, max_attempts, base_delay, max_delay, breaker, retry_if
+            )
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+        except ProviderError:
+            if breaker is not None:
+                breaker.record_success()
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,176 @@
+# result_cache.py
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from tools.common.logging import default_logger
+
+# ioctl request number for FICLONE (reflink a whole file) on Linux.
+_FICLONE = 0x40049409
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """
+    Materialize ``source`` at ``destination`` without copying bytes where possible:
+    a hardlink first, then a reflink, and a plain copy as the last resort. The
+    destination is replaced atomically.
+    """
+    directory = os.path.dirname(destination) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".link-")
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            try:
+                with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ResultCache:
+    """
+    Content-addressed, size-bounded disk cache for generated media.
+
+    Keys are SHA-256 hashes of the input file contents plus the normalized request
+    payload. Entries are stored as ``<cache_dir>/<key[:2]>/<key>`` and handed out by
+    hardlink/reflink, so a hit costs no copy. Hits refresh an entry's mtime, and once
+    the cache grows past ``max_bytes`` the least recently used entries are evicted.
+
+    Because hits are hardlinks, callers must not modify returned files in place.
+    """
+
+    def __init__(self, cache_dir: str = "~/.cache/tools/results", max_bytes: int = 10 * 1024 ** 3):
+        self.logger = default_logger
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """Build a cache from TOOLS_CACHE_DIR/TOOLS_CACHE_MAX_BYTES, or None if unset."""
+        cache_dir = os.getenv("TOOLS_CACHE_DIR")
+        if not cache_dir:
+            return None
+        return cls(cache_dir, int(os.getenv("TOOLS_CACHE_MAX_BYTES", str(10 * 1024 ** 3))))
+
+    @staticmethod
+    def key(payload: Dict[str, Any], file_paths: Iterable[str] = ()) -> str:
+        """
+        Cache key for a request.
+
+        :param payload: Request parameters; serialized with sorted keys so that field
+            order does not matter.
+        :param file_paths: Input files whose content (not path) is part of the key.
+        """
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"))
+        for path in file_paths:
+            digest.update(hash_file(path).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.startswith(".link-"):
+                    yield os.path.join(root, name)
+
+    def get(self, key: str, output_path: str) -> bool:
+        """Link the cached result for ``key`` to ``output_path``. Returns False on a miss."""
+        path = self._path(key)
+        try:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            link_or_copy(path, output_path)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        self.logger.debug(f"Result cache hit for {key[:12]}, linked to {output_path}")
+        return True
+
+    def put(self, key: str, source_path: str) -> None:
+        """Store the file at ``source_path`` as the result for ``key``."""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        link_or_copy(source_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path)
+        self._evict()
+
+    def get_text(self, key: str) -> Optional[str]:
+        """Return a cached text result such as a caption, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put_text(self, key: str, text: str) -> None:
+        """Store a text result for ``key``."""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".link-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda path: os.stat(path).st_mtime)
+            for path in entries:
+                if self._size <= self.max_bytes:
+                    break
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+                self.logger.debug(f"Result cache evicted {os.path.basename(path)[:12]}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._size}
@@ -0,0 +1,359 @@
+# staging.py
+import mimetypes
+import os
+import secrets
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from tools.common.logging import default_logger
+from tools.common.result_cache import hash_file, link_or_copy
+
+CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS staged (
+    namespace TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, content_hash)
+);
+"""
+
+
+class MultipartStream:
+    """
+    ``multipart/form-data`` body that reads files from disk in fixed-size chunks
+    while it is sent, instead of building the whole body in memory as ``requests``
+    does for ``files=``. Its length is known up front, so it goes out with a
+    Content-Length rather than chunked.
+
+    A stream can be sent once; build a new one for each attempt.
+
+        body = MultipartStream({"prompt": prompt}, {"image": image_path})
+        session.post(url, data=body, headers={"Content-Type": body.content_type})
+    """
+
+    def __init__(self, fields: Optional[Dict[str, str]] = None, files: Optional[Dict[str, str]] = None):
+        """
+        :param fields: Plain form fields.
+        :param files: Form field name to path of the file to send in it.
+        """
+        self.boundary = secrets.token_hex(16)
+        self._parts: List[Tuple[bytes, Optional[str]]] = []
+        for name, value in (fields or {}).items():
+            header = (
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            ).encode("utf-8")
+            self._parts.append((header, None))
+        for name, path in (files or {}).items():
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            header = (
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{os.path.basename(path)}"\r\nContent-Type: {content_type}\r\n\r\n'
+            ).encode("utf-8")
+            self._parts.append((header, path))
+        self._closing = f"--{self.boundary}--\r\n".encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        length = len(self._closing)
+        for header, path in self._parts:
+            length += len(header)
+            if path is not None:
+                length += os.path.getsize(path) + 2
+        return length
+
+    def __iter__(self) -> Iterator[bytes]:
+        for header, path in self._parts:
+            yield header
+            if path is not None:
+                with open(path, "rb") as f:
+                    while True:
+                        chunk = f.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        yield chunk
+                yield b"\r\n"
+        yield self._closing
+
+
+class StagingIndex:
+    """
+    Content hash to staged copy: the URL an image was published under, or a
+    provider's handle for an upload. Entries may expire, as provider uploads do.
+
+    Backed by SQLite, so a file path shares the index between processes and keeps
+    it across restarts; the default is in memory.
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        self.db_path = os.path.expanduser(db_path) if db_path != ":memory:" else db_path
+        if self.db_path != ":memory:" and os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, namespace: str, content_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM staged WHERE namespace = ? AND content_hash = ?",
+                (namespace, content_hash),
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0]
+
+    def put(self, namespace: str, content_hash: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO staged (namespace, content_hash, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, content_hash, value, expires_at),
+            )
+
+    def discard(self, namespace: str, content_hash: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM staged WHERE namespace = ? AND content_hash = ?", (namespace, content_hash)
+            )
+
+
+class LocalFileStore:
+    """
+    Static file server standing in for object storage: staged files are linked
+    into ``root_dir`` under their content hash and served from ``public_url``,
+    which providers that fetch inputs by URL (PiAPI) must be able to reach.
+
+    Anything with a ``put(path, content_hash) -> url`` method, e.g. a wrapper around
+    an S3 bucket, can replace it in InputStager.
+    """
+
+    def __init__(self,
+                 root_dir: str,
+                 public_url: str,
+                 host: str = "0.0.0.0",
+                 port: int = 8766):
+        """
+        :param root_dir: Directory the staged files are kept in.
+        :param public_url: Base URL under which providers can reach this server.
+        :param host: Interface to bind.
+        :param port: Port to bind; 0 picks a free one.
+        """
+        self.logger = default_logger
+        self.root_dir = os.path.expanduser(root_dir)
+        self.public_url = public_url.rstrip("/")
+        self.host = host
+        os.makedirs(self.root_dir, exist_ok=True)
+        # Bound by ``start``; processes sharing ``root_dir`` with one that serves it
+        # only add files.
+        self._port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1] if self._server is not None else self._port
+
+    def start(self) -> "LocalFileStore":
+        if self._thread is None:
+            self._server = ThreadingHTTPServer((self.host, self._port), self._handler_class())
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(target=self._server.serve_forever, name="staging", daemon=True)
+            self._thread.start()
+            self.logger.debug(f"Staged files served on port {self.port}")
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def put(self, path: str, content_hash: str) -> str:
+        """Publish ``path`` and return its URL."""
+        name = content_hash + os.path.splitext(path)[1].lower()
+        staged = os.path.join(self.root_dir, name)
+        if not os.path.exists(staged):
+            partial = f"{staged}.{uuid.uuid4().hex}.part"
+            link_or_copy(path, partial)
+            os.replace(partial, staged)
+        return f"{self.public_url}/staged/{name}"
+
+    def _handler_class(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, with_body: bool) -> None:
+                name = self.path.split("?", 1)[0][len("/staged/"):]
+                if not self.path.startswith("/staged/") or not name or "/" in name or name.startswith("."):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                path = os.path.join(store.root_dir, name)
+                if not os.path.isfile(path):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+                self.send_header("Content-Length", str(os.path.getsize(path)))
+                self.end_headers()
+                if with_body:
+                    with open(path, "rb") as f:
+                        shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+            def do_GET(self):
+                self._send(with_body=True)
+
+            def do_HEAD(self):
+                self._send(with_body=False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class InputStager:
+    """
+    Uploads each input image once and hands out the staged copy afterwards.
+
+    Images are identified by content hash, and the hash of a file is remembered
+    while its size and mtime stay the same, so retries, hedges and repeat prompts
+    on the same image cost neither a re-hash nor a re-upload. The ``max_entries``
+    most recently used files are remembered.
+    """
+
+    def __init__(self, store=None, index: Optional[StagingIndex] = None, max_entries: int = 10000):
+        """
+        :param store: Where images are published for providers that fetch them by
+            URL, e.g. a LocalFileStore; without one, ``url_for`` cannot stage files.
+        :param index: Content hash to staged copy; in memory by default.
+        :param max_entries: File hashes and per-image upload locks kept, each.
+        """
+        self.logger = default_logger
+        self.store = store
+        self.index = index or StagingIndex()
+        self.max_entries = max_entries
+        self.uploads = 0
+        self.reused = 0
+        self._hashes: "OrderedDict[Tuple[str, int, float], str]" = OrderedDict()
+        self._locks: "OrderedDict[Tuple[str, str], threading.Lock]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "InputStager":
+        """
+        Build a stager from STAGING_PUBLIC_URL (serve staged files on STAGING_PORT
+        from STAGING_DIR) and STAGING_INDEX (SQLite path of the index). With
+        STAGING_SERVE=0 files are only added to STAGING_DIR, for processes whose
+        parent already serves it.
+        """
+        store = None
+        public_url = os.getenv("STAGING_PUBLIC_URL")
+        if public_url:
+            store = LocalFileStore(
+                os.getenv("STAGING_DIR", "~/.cache/tools/staged"), public_url,
+                port=int(os.getenv("STAGING_PORT", "8766")),
+            )
+            if os.getenv("STAGING_SERVE", "1") != "0":
+                store.start()
+        index_path = os.getenv("STAGING_INDEX")
+        return cls(store, StagingIndex(index_path) if index_path else None)
+
+    def content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            content_hash = self._hashes.get(key)
+            if content_hash is not None:
+                self._hashes.move_to_end(key)
+                return content_hash
+        content_hash = hash_file(path)
+        with self._lock:
+            self._hashes[key] = content_hash
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+        return content_hash
+
+    def _upload_lock(self, namespace: str, content_hash: str) -> threading.Lock:
+        key = (namespace, content_hash)
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            self._locks.move_to_end(key)
+            while len(self._locks) > self.max_entries:
+                oldest, oldest_lock = next(iter(self._locks.items()))
+                if oldest_lock.locked():
+                    # An upload is still running under it; forgetting its lock
+                    # would let a second caller upload the same image.
+                    break
+                del self._locks[oldest]
+            return lock
+
+    def stage(self,
+              namespace: str,
+              path: str,
+              upload: Callable[[str], str],
+              ttl: Optional[float] = None) -> str:
+        """
+        Return the staged copy of ``path`` in ``namespace``, calling ``upload(path)``
+        to create it the first time; concurrent callers for the same image wait for
+        one upload.
+
+        :param namespace: What the staged value is, e.g. "url" or a provider name.
+        :param path: Local file to stage.
+        :param upload: Uploads the file and returns its URL or handle.
+        :param ttl: Seconds the staged copy stays usable, for uploads that expire.
+        """
+        content_hash = self.content_hash(path)
+        with self._upload_lock(namespace, content_hash):
+            value = self.index.get(namespace, content_hash)
+            if value is not None:
+                self.reused += 1
+                return value
+            value = upload(path)
+            self.uploads += 1
+            self.index.put(namespace, content_hash, value, ttl)
+            self.logger.debug(f"Staged {path} for {namespace}: {value}")
+            return value
+
+    def forget(self, namespace: str, path: str) -> None:
+        """Drop the staged copy of ``path``, e.g. after the provider rejected it as expired."""
+        self.index.discard(namespace, self.content_hash(path))
+
+    def url_for(self, path: str) -> str:
+        """A URL from which providers can fetch ``path``."""
+        if path.startswith(("http://", "https://")):
+            return path
+        if self.store is None:
+            raise ValueError(f"Cannot publish {path}: set STAGING_PUBLIC_URL to serve local files by URL")
+        return self.stage("url", path, lambda p: self.store.put(p, self.content_hash(p)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"uploads": self.uploads, "reused": self.reused}
+
+
+_default_stager: Optional[InputStager] = None
+_default_stager_lock = threading.Lock()
+
+
+def default_stager() -> InputStager:
+    """Return the process-wide InputStager, built from the environment on first use."""
+    global _default_stager
+    with _default_stager_lock:
+        if _default_stager is None:
+            _default_stager = InputStager.from_env()
+        return _default_stager
@@ -0,0 +1,89 @@
+# transport.py
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tools.common.logging import default_logger
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class HTTPTransport:
+    """
+    Thread-safe, pooled HTTP transport shared by the provider clients.
+
+    Wraps one ``requests.Session`` whose adapter opens at most ``pool_maxsize``
+    connections per host and keeps them alive for reuse; a request that finds them
+    all busy waits for one to be returned. Also applies a default (connect, read)
+    timeout and exposes connection reuse counters from the underlying urllib3 pools.
+    """
+
+    def __init__(self,
+                 pool_connections: int = 16,
+                 pool_maxsize: int = 32,
+                 timeout: Timeout = (10, 60)):
+        """
+        :param pool_connections: Number of per-host pools to keep.
+        :param pool_maxsize: Maximum connections per host, busy or idle.
+        :param timeout: Default (connect, read) timeout in seconds.
+        """
+        self.logger = default_logger
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True
+        )
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Per-host request and connection counts.
+
+        ``connections`` is how many TCP/TLS connections were opened, so
+        ``requests - connections`` requests reused a pooled connection.
+        """
+        pools = self._adapter.poolmanager.pools
+        stats = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            stats[host] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+        return stats
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_transport: Optional[HTTPTransport] = None
+_default_transport_lock = threading.Lock()
+
+
+def default_transport() -> HTTPTransport:
+    """Return the process-wide HTTPTransport, creating it on first use."""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HTTPTransport()
+        return _default_transport
@@ -0,0 +1,44 @@
+# video.py
+import os
+import subprocess
+import tempfile
+from typing import List
+
+
+def extract_last_frame(video_path: str, output_path: str, quality: int = 2) -> None:
+    """
+    Save the final frame of a video as an image.
+
+    ``-sseof`` seeks from the end of the file, so ffmpeg only decodes the last
+    second or so rather than the whole clip.
+    """
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-sseof", "-1", "-i", video_path,
+         "-update", "1", "-q:v", str(quality), output_path],
+        check=True, capture_output=True,
+    )
+
+
+def concat_videos(video_paths: List[str], output_path: str) -> None:
+    """
+    Join videos end to end into one MP4 by stream copy, without re-encoding.
+
+    The inputs must share codec, resolution and frame rate, as clips from the same
+    provider and model do.
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in video_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        list_path = f.name
+    try:
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            check=True, capture_output=True,
+        )
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,291 @@
+# webhook.py
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+from tools.common.logging import default_logger
+from tools.common.poller import Poller, TaskStatus, default_poller
+
+# Parses a verified callback body into (task_id, status).
+WebhookParser = Callable[[Dict[str, Any]], Tuple[str, TaskStatus]]
+# Checks a callback's headers and raw body against a shared secret.
+WebhookVerifier = Callable[[Mapping[str, str], bytes, str], bool]
+
+
+def verify_shared_secret(headers: Mapping[str, str], body: bytes, secret: str) -> bool:
+    """
+    PiAPI echoes the ``webhook_config.secret`` of the task in the ``x-webhook-secret`` header.
+    """
+    return hmac.compare_digest(headers.get("x-webhook-secret", ""), secret)
+
+
+def verify_standard_webhook(headers: Mapping[str, str],
+                            body: bytes,
+                            secret: str,
+                            tolerance: float = 300) -> bool:
+    """
+    Verify a Standard Webhooks signature as sent by Replicate.
+
+    The signed content is ``<webhook-id>.<webhook-timestamp>.<body>``, keyed with the
+    base64 part of a ``whsec_...`` secret; ``webhook-signature`` holds one or more
+    space-separated ``v1,<base64 digest>`` entries.
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not (webhook_id and timestamp and signatures):
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+        key = base64.b64decode(secret.split("_", 1)[-1])
+    except ValueError:
+        return False
+    signed = f"{webhook_id}.{timestamp}.".encode("utf-8") + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode("utf-8")
+    return any(
+        hmac.compare_digest(entry.split(",", 1)[-1], expected) for entry in signatures.split()
+    )
+
+
+def load_or_create_secret(path: str) -> str:
+    """
+    Read the secret kept at ``path``, creating it on first use. Every process and
+    restart on the machine then signs and verifies callbacks with the same secret.
+    """
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process may have just created it; wait until it is written.
+        for _ in range(50):
+            with open(path) as f:
+                secret = f.read().strip()
+            if secret:
+                return secret
+            time.sleep(0.1)
+        raise ValueError(f"Webhook secret file {path} is empty")
+    secret = secrets.token_urlsafe(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(secret)
+    return secret
+
+
+class _Registration:
+    def __init__(self, parse: WebhookParser, secret: str, verify: WebhookVerifier):
+        self.parse = parse
+        self.secret = secret
+        self.verify = verify
+
+
+class WebhookReceiver:
+    """
+    Embedded HTTP server that receives provider completion callbacks.
+
+    Each provider registers a verifier and a parser under ``/webhook/<provider>``.
+    Verified callbacks are handed to the Poller, which resolves the waiting job at
+    once and stops polling providers that push.
+    """
+
+    def __init__(self,
+                 public_url: str,
+                 host: str = "0.0.0.0",
+                 port: int = 8765,
+                 poller: Optional[Poller] = None,
+                 shared_secret: Optional[str] = None):
+        """
+        :param public_url: Base URL under which providers can reach this server.
+        :param host: Interface to bind.
+        :param port: Port to bind; 0 picks a free one.
+        :param poller: Poller to notify; defaults to the process-wide one.
+        :param shared_secret: Secret for providers that let the caller choose one per
+            task, such as PiAPI. It must outlive the process, since callbacks of
+            tasks submitted before a restart, or by another worker, carry it;
+            WEBHOOK_SECRET, or one kept in WEBHOOK_SECRET_FILE, by default.
+        """
+        self.logger = default_logger
+        self.public_url = public_url.rstrip("/")
+        self.poller = poller or default_poller()
+        self._registrations: Dict[str, _Registration] = {}
+        self.shared_secret = shared_secret or os.getenv("WEBHOOK_SECRET") or load_or_create_secret(
+            os.getenv("WEBHOOK_SECRET_FILE", "~/.cache/tools/webhook_secret")
+        )
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["WebhookReceiver"]:
+        """Build a receiver from WEBHOOK_PUBLIC_URL/WEBHOOK_HOST/WEBHOOK_PORT, or None if unset."""
+        public_url = os.getenv("WEBHOOK_PUBLIC_URL")
+        if not public_url:
+            return None
+        return cls(public_url, host=os.getenv("WEBHOOK_HOST", "0.0.0.0"), port=int(os.getenv("WEBHOOK_PORT", "8765")))
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def endpoint(self, provider: str) -> str:
+        """Callback URL to hand to ``provider``."""
+        return f"{self.public_url}/webhook/{provider}"
+
+    def register(self, provider: str, parse: WebhookParser, secret: str, verify: WebhookVerifier) -> None:
+        """Accept callbacks for ``provider`` and stop polling it except as a safety net."""
+        self._registrations[provider] = _Registration(parse, secret, verify)
+        self.poller.set_push_enabled(provider)
+
+    def start(self) -> "WebhookReceiver":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True)
+            self._thread.start()
+            self.logger.debug(f"Webhook receiver listening on port {self.port}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _deliver(self, provider: str, headers: Mapping[str, str], body: bytes) -> int:
+        """Verify and dispatch one callback; returns the HTTP status to answer with."""
+        registration = self._registrations.get(provider)
+        if registration is None:
+            return 404
+        if not registration.verify(headers, body, registration.secret):
+            self.logger.error(f"Rejected {provider} webhook with an invalid signature")
+            return 401
+        try:
+            task_id, status = registration.parse(json.loads(body))
+        except Exception as e:
+            self.logger.error(f"Failed to parse {provider} webhook, error: {e}")
+            return 400
+        self.logger.debug(f"Webhook from {provider}: task {task_id} is {status.state.value}")
+        self.poller.notify(provider, task_id, status)
+        return 204
+
+    def _handler_class(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                prefix = "/webhook/"
+                if not self.path.startswith(prefix):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                headers = {key.lower(): value for key, value in self.headers.items()}
+                self.send_response(receiver._deliver(self.path[len(prefix):], headers, body))
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class WebhookRelay:
+    """
+    One public callback endpoint for a pool of worker processes.
+
+    Each worker runs its own WebhookReceiver on a local port, since only the process
+    watching a task can resolve it, and hands providers ``<public_url>/worker/<n>``
+    as its base URL. The relay forwards ``/worker/<n>/webhook/<provider>`` to worker
+    n's receiver unchanged, so signatures are still checked by the worker.
+    """
+
+    def __init__(self, ports: Sequence[int], host: str = "0.0.0.0", port: int = 8765, timeout: float = 10):
+        """
+        :param ports: Local receiver port of each worker, 0 until it has started;
+            e.g. a shared multiprocessing array the workers fill in.
+        :param host: Interface to bind.
+        :param port: Port to bind; 0 picks a free one.
+        :param timeout: Seconds to wait for a worker to answer.
+        """
+        self.logger = default_logger
+        self.ports = ports
+        self.timeout = timeout
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "WebhookRelay":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="webhook-relay", daemon=True)
+            self._thread.start()
+            self.logger.debug(f"Webhook relay listening on port {self.port}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _forward(self, path: str, headers: Mapping[str, str], body: bytes) -> int:
+        """Forward one callback; returns the HTTP status to answer with."""
+        parts = path.split("/", 3)
+        if len(parts) < 4 or parts[1] != "worker" or not parts[2].isdigit() or not parts[3].startswith("webhook/"):
+            return 404
+        index = int(parts[2])
+        if index >= len(self.ports) or not self.ports[index]:
+            # The worker is not up (yet); providers retry, and the poller is the safety net.
+            return 503
+        connection = http.client.HTTPConnection("127.0.0.1", self.ports[index], timeout=self.timeout)
+        try:
+            connection.request("POST", f"/{parts[3]}", body, {**headers, "content-length": str(len(body))})
+            return connection.getresponse().status
+        except OSError as e:
+            self.logger.error(f"Failed to relay webhook to worker {index}, error: {e}")
+            return 502
+        finally:
+            connection.close()
+
+    def _handler_class(self):
+        relay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                headers = {
+                    key.lower(): value for key, value in self.headers.items()
+                    if key.lower() not in ("host", "content-length", "connection")
+                }
+                self.send_response(relay._forward(self.path, headers, body))
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+_default_receiver: Optional[WebhookReceiver] = None
+_default_receiver_lock = threading.Lock()
+
+
+def default_webhook_receiver() -> Optional[WebhookReceiver]:
+    """
+    Return the process-wide receiver, started on first use, or None when
+    WEBHOOK_PUBLIC_URL is not configured.
+    """
+    global _default_receiver
+    with _default_receiver_lock:
+        if _default_receiver is None:
+            _default_receiver = WebhookReceiver.from_env()
+            if _default_receiver is not None:
+                _default_receiver.start()
+        return _default_receiver
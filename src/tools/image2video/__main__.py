@@ -0,0 +1,4 @@
+from tools.image2video.batch import main
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,85 @@
-from datetime import date
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import gradio as gr
+from tools.common.job_store import JobStore
+from tools.common.result_cache import ResultCache
 from tools.image2video.image2video_converter import Image2VideoConverter
-from tools.image2video.image2video_models import Image2VideoModelType
+from tools.image2video.image2video_models import ConversionStage, Image2VideoModelType
 
-def convert_image_to_video(image_path: str, prompt: str, model_type: str):
+# Conversions that may run at once; the rest wait in the Gradio queue.
+CONCURRENCY = int(os.getenv("IMAGE2VIDEO_CONCURRENCY", "16"))
+# Requests allowed to wait in the queue before new ones are turned away.
+MAX_QUEUE_SIZE = int(os.getenv("IMAGE2VIDEO_MAX_QUEUE", "256"))
+# Seconds between status refreshes shown to the user.
+STATUS_INTERVAL = 1.0
+
+# One converter for the whole app, so its clients and their connection pools
+# live as long as the process instead of a single click.
+image2video_converter = Image2VideoConverter(
+    cache=ResultCache.from_env(), job_store=JobStore.from_env()
+)
+# Conversions block on the provider for minutes, so they run here rather than on
+# the event loop; the handler below only awaits them.
+conversion_executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="image2video")
+
+
+def new_output_path() -> str:
+    """Return an output path no other job in this or another process will use."""
+    time_str = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    return f"output/video-{time_str}-{uuid.uuid4().hex[:8]}.mp4"
+
+
+async def convert_image_to_video(image_path: str, prompt: str, model_type: str):
     """
-    Generator function that converts an image to a video using the provided prompt and model type.
-    
+    Async generator that converts an image to a video using the provided prompt and model type.
+
     Yields:
-      - A "Processing..." status message and no video immediately.
-      - After conversion, an empty status message and the path to the generated video.
-    
+      - The current stage of the job (queued, running, downloading...) with the
+        elapsed time, refreshed every second while the job runs.
+      - After conversion, a final status message and the path to the generated video.
+
     Parameters:
       image_path (str): The file path of the uploaded image.
       prompt (str): The text prompt for video conversion.
       model_type (str): The selected image2video model type.
     """
-    # Immediately update the status to "Processing..."
-    yield "Processing...", None
+    if not image_path:
+        yield "Please upload an image first.", None
+        return
 
+    output_video_path = new_output_path()
+    os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
+    # Written by the conversion thread, read here; a single assignment is atomic.
+    stage = {"current": ConversionStage.QUEUED}
+    started = time.monotonic()
+
+    def on_status(new_stage: ConversionStage) -> None:
+        stage["current"] = new_stage
+
+    future = asyncio.wrap_future(conversion_executor.submit(
+        image2video_converter.convert, image_path, prompt, output_video_path, model_type, on_status
+    ))
     try:
-        # Create an instance of ImageToVideoConverter
-        image2video_converter = Image2VideoConverter()
-        
-        # Define an output path for the generated video.
-        time_str = date.today().strftime("%Y-%m-%d-%H-%M-%S")
-        output_video_path = f"output/video-{time_str}.mp4"
-        
-        # Run the conversion using the provided prompt and model type.
-        # (Ensure that ImageToVideoConverter.convert is updated to accept model_type if needed.)
-        image2video_converter.convert(image_path, prompt, output_video_path, model_type)
-        
-        # Once complete, yield an empty status and the video file path.
-        yield "", output_video_path
+        while not future.done():
+            yield f"{stage['current'].value.capitalize()}... ({time.monotonic() - started:.0f}s)", None
+            await asyncio.wait({future}, timeout=STATUS_INTERVAL)
+        result = future.result()
     except Exception as error:
         # If an error occurs, yield the error message and no video.
         yield f"Error during conversion: {error}", None
+        return
+
+    if result.error is not None:
+        yield f"Error during conversion: {type(result.error).__name__}: {result.error}", None
+    elif os.path.exists(output_video_path):
+        yield f"Done in {time.monotonic() - started:.0f}s", output_video_path
+    else:
+        yield "Conversion failed, please try again or choose another model.", None
 
 # Build the Gradio interface using Blocks with the Origin theme (light theme)
 with gr.Blocks(theme=gr.themes.Origin()) as demo:
@@ -77,12 +120,15 @@ with gr.Blocks(theme=gr.themes.Origin()) as demo:
             )
     
     # Wire the run button to the convert_image_to_video generator function.
+    # The handler only awaits the conversion, so it may serve as many users at once
+    # as there are conversion threads.
     run_conversion_button.click(
         fn=convert_image_to_video,
         inputs=[uploaded_image, prompt_input, model_type_dropdown],
         outputs=[status_message, video_player],
-        show_progress=True
+        show_progress="minimal",
+        concurrency_limit=CONCURRENCY,
     )
 
 # Launch the Gradio app
-demo.launch()
+demo.queue(max_size=MAX_QUEUE_SIZE).launch()
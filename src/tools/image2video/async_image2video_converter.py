@@ -0,0 +1,160 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from tools.api.piapi.async_piapi_client import AsyncPiAPIClient
+from tools.api.replicate.async_replicate_client import AsyncReplicateClient
+from tools.api.stabilityai.async_stability_ai_client import AsyncStabilityAIClient
+from tools.common.errors import Deadline, DeadlineExceeded, PermanentError, ProviderError, never_processed
+from tools.common.logging import default_logger
+from tools.common.poller import TaskState
+from tools.common.resilience import async_retry_call, circuit_breaker
+from tools.image2video.image2video_models import ConversionResult, Image2VideoModelType
+
+
+class AsyncImage2VideoConverter:
+    """
+    asyncio-native counterpart of Image2VideoConverter.
+
+    Every provider gets its own semaphore, so hundreds of conversions can be
+    awaited together while each provider only sees ``max_concurrency`` of them
+    at a time.
+    """
+
+    def __init__(self,
+                 max_concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 16,
+                 job_timeout: Optional[float] = 900):
+        self.logger = default_logger
+        # Seconds a conversion may take from waiting for a slot to download; None for no limit.
+        self.job_timeout = job_timeout
+        max_concurrency = max_concurrency or {}
+        self.http_client = httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=64),
+        )
+        self.clients = {
+            Image2VideoModelType.PIAPI.value: AsyncPiAPIClient(self.http_client),
+            Image2VideoModelType.REPLICATE.value: AsyncReplicateClient(self.http_client),
+            Image2VideoModelType.STABILITY.value: AsyncStabilityAIClient(self.http_client),
+        }
+        self.semaphores = {
+            model: asyncio.Semaphore(max_concurrency.get(model, default_concurrency))
+            for model in self.clients
+        }
+
+    async def __aenter__(self) -> "AsyncImage2VideoConverter":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+    async def convert(self,
+                      image_path: str,
+                      prompt: str,
+                      output_video_path: str,
+                      model: str,
+                      deadline: Optional[Deadline] = None) -> ConversionResult:
+        """
+        Converts an image to a video with the given model, waiting for a free slot
+        in that provider's concurrency limit first.
+
+        Parameters:
+            image_path (str): Path to the input image file.
+            prompt (str): Prompt to guide video generation.
+            output_video_path (str): Path where the generated video will be saved.
+            model (str): One of the Image2VideoModelType values.
+            deadline (Deadline): When the job must be done by; ``job_timeout`` seconds
+                from now by default. Waiting for a slot, submit retries and polling
+                stop at the deadline, and a task still running then is cancelled.
+
+        Returns:
+            ConversionResult: The provider used and, if no video was made, why. Provider
+            failures are typed as with Image2VideoConverter.convert.
+        """
+        if model is None:
+            self.logger.error("Image2Video Model is not specified")
+            return ConversionResult(output_video_path, error=ValueError("Image2Video Model is not specified"))
+
+        client = self.clients.get(model)
+        if client is None:
+            self.logger.error(f"Unsupported model: {model}")
+            return ConversionResult(output_video_path, model, PermanentError(model, "unsupported model"))
+
+        deadline = deadline or Deadline(self.job_timeout)
+        # A video left at the output path by an earlier run must not pass for this one.
+        try:
+            os.remove(output_video_path)
+        except FileNotFoundError:
+            pass
+        try:
+            await self._acquire(model, deadline)
+            try:
+                self.logger.debug(f"Generating video using {model} model")
+                await self._run_job(model, client, image_path, prompt, output_video_path, deadline)
+            finally:
+                self.semaphores[model].release()
+        except Exception as e:
+            self.logger.error(f"Failed to generate video from image {image_path} with {model}, error: {e}")
+            return ConversionResult(output_video_path, model, e)
+        if not os.path.exists(output_video_path):
+            return ConversionResult(output_video_path, model, ProviderError(model, "no video produced"))
+        return ConversionResult(output_video_path, model)
+
+    async def _acquire(self, model: str, deadline: Deadline) -> None:
+        """Wait for a slot in ``model``'s concurrency limit until the deadline."""
+        try:
+            await asyncio.wait_for(self.semaphores[model].acquire(), deadline.remaining(None))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(model, "no free slot before the deadline", "queue") from None
+
+    async def _run_job(self,
+                       model: str,
+                       client,
+                       image_path: str,
+                       prompt: str,
+                       output_video_path: str,
+                       deadline: Deadline) -> None:
+        """
+        Submit within the provider's circuit breaker, retrying only failures the
+        provider cannot have acted on, then wait for the task and download its video.
+        """
+        task_id = await async_retry_call(
+            model, lambda: client.submit_image2video(image_path, prompt), deadline, "submit", 5,
+            breaker=circuit_breaker(model), retry_if=never_processed,
+        )
+        try:
+            status = await client.watch_image2video(task_id, timeout=deadline.remaining(600))
+        except BaseException:
+            # Out of time, cancelled, or the task can no longer be checked: nobody
+            # will collect the video, so stop paying for it.
+            await client.cancel(task_id)
+            raise
+        if status.state != TaskState.SUCCEEDED:
+            raise PermanentError(model, f"task {task_id} did not succeed, status: {status.error}")
+        # The video finished in time and is paid for, so it is fetched even if the
+        # deadline passes while downloading.
+        await async_retry_call(
+            model,
+            lambda: client.download_image2video(task_id, status, output_video_path),
+            stage="download",
+            max_attempts=2,
+            breaker=circuit_breaker(model),
+        )
+
+    async def convert_many(self, jobs: Iterable[Tuple[str, str, str, str]]) -> List[ConversionResult]:
+        """
+        Run many conversions concurrently.
+
+        Parameters:
+            jobs: Iterable of (image_path, prompt, output_video_path, model) tuples.
+
+        Returns:
+            List[ConversionResult]: One result per job, in the order of ``jobs``.
+        """
+        return await asyncio.gather(*(self.convert(*job) for job in jobs))
@@ -0,0 +1,220 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import click
+
+from tools.common.job_store import JobStore
+from tools.common.logging import default_logger, log_context
+from tools.common.resilience import breaker_stats
+from tools.common.result_cache import ResultCache
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image2video_models import Image2VideoModelType
+from tools.image2video.provider_registry import model_names, validate_model
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+
+
+def _row_id(row: Dict[str, Any]) -> str:
+    """Stable identifier for a manifest row, used to match it against earlier results."""
+    if row.get("id"):
+        return str(row["id"])
+    key = json.dumps([row["image"], row.get("prompt", ""), row["model"]])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def load_rows(source: str, prompt: str, model: str) -> List[Dict[str, Any]]:
+    """
+    Load conversion rows from a directory of images or a JSONL/CSV manifest.
+
+    Manifest rows need an ``image`` column; ``prompt``, ``model`` and ``id`` are
+    optional and fall back to the command-line defaults. Relative image paths are
+    relative to the manifest's directory.
+    """
+    if os.path.isdir(source):
+        rows = [
+            {"image": os.path.join(source, name)}
+            for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        ]
+    elif source.endswith(".jsonl"):
+        with open(source) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    elif source.endswith(".csv"):
+        with open(source, newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        raise click.BadParameter(f"Unsupported input: {source}, expected a directory, .jsonl or .csv")
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    for row in rows:
+        row["prompt"] = row.get("prompt") or prompt
+        row["model"] = row.get("model") or model
+        # The ID is taken from the path as written, so it does not change with the
+        # directory the batch is run from.
+        row["id"] = _row_id(row)
+        image = row["image"]
+        if not os.path.isdir(source) and not image.startswith(("http://", "https://")) and not os.path.isabs(image):
+            row["image"] = os.path.join(base_dir, image)
+    return rows
+
+
+def load_completed(results_path: str) -> Dict[str, Dict[str, Any]]:
+    """Read an existing results manifest and return the rows that already succeeded."""
+    completed = {}
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run; the row is simply retried.
+                continue
+            if result.get("status") == "succeeded":
+                completed[result["id"]] = result
+    return completed
+
+
+class BatchRunner:
+    """
+    Runs manifest rows through Image2VideoConverter on a pool of worker threads and
+    appends one JSON line per finished row to the results manifest.
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 results_path: str,
+                 workers: int = 4,
+                 cache: Optional[ResultCache] = None,
+                 job_store: Optional[JobStore] = None,
+                 converter: Optional[Image2VideoConverter] = None):
+        self.logger = default_logger
+        self.output_dir = output_dir
+        self.results_path = results_path
+        self.workers = workers
+        # Clients are thread-safe and share the pooled transport, so one converter serves all workers.
+        self.converter = converter or Image2VideoConverter(cache=cache, job_store=job_store)
+        self._write_lock = threading.Lock()
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        with self._write_lock:
+            with open(self.results_path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+
+    def _run_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        stem = os.path.splitext(os.path.basename(row["image"]))[0]
+        output_path = os.path.join(self.output_dir, f"{stem}-{row['id']}.mp4")
+        start = time.monotonic()
+        error = None
+        try:
+            with log_context(row_id=row["id"]):
+                error = self.converter.convert(row["image"], row["prompt"], output_path, row["model"]).error
+        except Exception as e:
+            error = e
+        succeeded = error is None and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        result = {
+            **row,
+            "output": output_path if succeeded else None,
+            "status": "succeeded" if succeeded else "failed",
+            "error": str(error) if error is not None else None,
+            "error_type": type(error).__name__ if error is not None else None,
+            "elapsed": round(time.monotonic() - start, 3),
+        }
+        self._record(result)
+        return result
+
+    def run(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Convert every row that has no successful entry in the results manifest yet.
+
+        Returns:
+            Dict[str, int]: Counts of skipped, succeeded and failed rows.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        results_dir = os.path.dirname(self.results_path)
+        if results_dir:
+            os.makedirs(results_dir, exist_ok=True)
+
+        completed = load_completed(self.results_path)
+        pending = [row for row in rows if row["id"] not in completed]
+        counts = {"skipped": len(rows) - len(pending), "succeeded": 0, "failed": 0}
+        self.logger.info(
+            f"Batch: {len(rows)} rows, {counts['skipped']} already done, {len(pending)} to run"
+        )
+
+        # Caption every blank-prompt row up front, concurrently, so conversions find
+        # their prompts ready instead of captioning one at a time as workers free up.
+        for row in pending:
+            if not (row["prompt"] or "").strip():
+                try:
+                    self.converter.captioner.submit(row["image"])
+                except OSError as e:
+                    self.logger.error(f"Cannot caption {row['image']}, error: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run_row, row) for row in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                counts[result["status"]] += 1
+                self.logger.info(
+                    f"Batch: {result['id']} {result['status']} in {result['elapsed']}s "
+                    f"({counts['succeeded'] + counts['failed']}/{len(pending)})"
+                )
+        return counts
+
+
+@click.command()
+@click.argument("source", type=click.Path(exists=True))
+@click.option("--output_dir", "-o", default="output/batch", show_default=True, help="Directory for generated videos.")
+@click.option("--results", "-r", "results_path", default=None, help="Results manifest (JSONL). Defaults to <output_dir>/results.jsonl.")
+@click.option("--workers", "-w", default=4, show_default=True, type=int, help="Number of concurrent conversions.")
+@click.option("--prompt", "-p", default="", help="Prompt for rows that do not specify one.")
+@click.option(
+    "--model", "-m",
+    default=Image2VideoModelType.REPLICATE.value,
+    show_default=True,
+    callback=validate_model,
+    help=f"Model for rows that do not specify one: {', '.join(m.value for m in Image2VideoModelType)}"
+    " or a provider installed as a plugin.",
+)
+@click.option("--cache_dir", default=None, help="Reuse earlier results for identical inputs from this cache directory.")
+@click.option("--job_db", default=None, help="SQLite job store; unfinished provider jobs are reattached on restart.")
+def main(source: str, output_dir: str, results_path: str, workers: int, prompt: str, model: str, cache_dir: str, job_db: str):
+    """
+    Convert a directory of images or a JSONL/CSV manifest of (image, prompt, model)
+    rows to videos. Re-running with the same results manifest resumes the batch.
+    """
+    results_path = results_path or os.path.join(output_dir, "results.jsonl")
+    rows = load_rows(source, prompt, model)
+    unknown = sorted({row["model"] for row in rows} - set(model_names()))
+    if unknown:
+        raise click.UsageError(f"Unknown models in {source}: {', '.join(unknown)}")
+    cache = ResultCache(cache_dir) if cache_dir else ResultCache.from_env()
+    job_store = JobStore(job_db) if job_db else JobStore.from_env()
+    runner = BatchRunner(output_dir, results_path, workers, cache, job_store)
+    counts = runner.run(rows)
+    if runner.converter.hedger.stats.conversions:
+        counts["hedging"] = runner.converter.hedger.stats.as_dict()
+    routing = runner.converter.router.stats()
+    if routing:
+        counts["routing"] = routing
+    if cache is not None:
+        counts["cache"] = cache.stats()
+    stages = runner.converter.metrics.summary()
+    if stages:
+        counts["stages"] = stages
+    breakers = breaker_stats()
+    if breakers:
+        counts["breakers"] = breakers
+    click.echo(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tools.common.errors import (
+    Deadline,
+    PermanentError,
+    ProviderError,
+    RateLimitError,
+    never_processed,
+)
+from tools.common.job_store import JobState, JobStore
+from tools.common.logging import default_logger
+from tools.common.poller import TaskState
+from tools.common.resilience import circuit_breaker, retry_call
+from tools.image2video.image2video_models import Image2VideoModelType
+from tools.image2video.provider_router import ProviderRouter
+
+
+class HedgePolicy:
+    """
+    How a "Fastest" conversion spreads over providers.
+
+    Parameters:
+        providers: Providers in order of preference; the first is the primary and
+            each later one is a hedge.
+        hedge_after: Seconds to wait for the current submissions before hedging.
+        hedge_percentile: If set, hedge once the primary has taken longer than this
+            percentile (0-100) of its recent completion times instead; ``hedge_after``
+            is used until ``min_samples`` completions have been seen.
+        max_hedges: Maximum number of extra submissions per conversion.
+        costs: Price of one video per provider, used to report the hedging overhead.
+    """
+
+    def __init__(self,
+                 providers: Optional[List[str]] = None,
+                 hedge_after: float = 180,
+                 hedge_percentile: Optional[float] = 90,
+                 min_samples: int = 20,
+                 max_hedges: int = 1,
+                 costs: Optional[Dict[str, float]] = None):
+        self.providers = providers or [
+            Image2VideoModelType.REPLICATE.value,
+            Image2VideoModelType.PIAPI.value,
+        ]
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.costs = costs or {}
+
+
+class HedgeStats:
+    """
+    Running totals of what hedging did and cost.
+    """
+
+    def __init__(self):
+        self.conversions = 0
+        self.submissions = 0
+        self.hedges = 0
+        self.cancelled = 0
+        self.extra_cost = 0.0
+        self.wins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "conversions": self.conversions,
+                "submissions": self.submissions,
+                "hedges": self.hedges,
+                "cancelled": self.cancelled,
+                "extra_cost": round(self.extra_cost, 4),
+                "wins": dict(self.wins),
+            }
+
+
+class HedgedSubmitter:
+    """
+    Races providers for one conversion: submits to the primary, hedges to the next
+    provider if no video has arrived after the hedge delay (or as soon as a
+    submission fails), downloads the first video that completes and cancels the
+    other submissions.
+
+    Submissions and downloads go through the same rate limits, concurrency slots,
+    retries and circuit breakers as single-provider jobs.
+    """
+
+    # Completion times kept per provider for the percentile-based hedge delay.
+    HISTORY = 200
+
+    def __init__(self,
+                 clients: Callable[[str], object],
+                 prepare: Callable[[str, str], str],
+                 policy: Optional[HedgePolicy] = None,
+                 job_store: Optional[JobStore] = None,
+                 router: Optional[ProviderRouter] = None,
+                 accepts: Optional[Callable[[str, str], bool]] = None):
+        """
+        :param clients: Returns the client for a provider name.
+        :param prepare: Returns the preprocessed image path for (image_path, provider).
+        :param policy: Hedging policy; defaults to HedgePolicy().
+        :param job_store: If given, every submission is recorded so that an
+            interrupted conversion is reattached to instead of paid for again.
+        :param router: Rate limits and concurrency caps shared with other jobs;
+            defaults to a ProviderRouter of its own.
+        :param accepts: Whether a provider can take an image, given (provider,
+            image_path); providers that cannot are not raced.
+        """
+        self.logger = default_logger
+        self.clients = clients
+        self.prepare = prepare
+        self.policy = policy or HedgePolicy()
+        self.job_store = job_store
+        self.router = router or ProviderRouter()
+        self.accepts = accepts or (lambda provider, image_path: True)
+        self.stats = HedgeStats()
+        self._durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _hedge_delay(self, provider: str) -> float:
+        with self._lock:
+            durations = sorted(self._durations.get(provider, []))
+        if self.policy.hedge_percentile is None or len(durations) < self.policy.min_samples:
+            return self.policy.hedge_after
+        index = min(len(durations) - 1, int(len(durations) * self.policy.hedge_percentile / 100))
+        return durations[index]
+
+    def _record_duration(self, provider: str, duration: float) -> None:
+        with self._lock:
+            durations = self._durations.setdefault(provider, [])
+            durations.append(duration)
+            del durations[:-self.HISTORY]
+
+    def _create_job(self, provider: str, image_path: str, prompt: str, output_video_path: str) -> Optional[str]:
+        if self.job_store is None:
+            return None
+        return self.job_store.create(provider, image_path, prompt, os.path.abspath(output_video_path))
+
+    def _finish_job(self, job_id: Optional[str], state: JobState, error: Optional[str] = None) -> None:
+        if job_id is not None:
+            self.job_store.finish(job_id, state, error)
+
+    @staticmethod
+    def _release(status) -> None:
+        # A finished status may hold an open response, e.g. Stability's video
+        # stream; one that is not downloaded must be closed.
+        close = getattr(status.payload, "close", None)
+        if callable(close):
+            close()
+
+    def _release_when_done(self, future: Future) -> None:
+        def release(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                self._release(future.result())
+
+        future.add_done_callback(release)
+
+    def _submit(self, provider: str, client, image_path: str, prompt: str, deadline: Deadline) -> str:
+        def attempt() -> str:
+            self.router.acquire_token(provider)
+            try:
+                return client.submit_image2video(image_path, prompt)
+            except RateLimitError as e:
+                self.router.rate_limited(provider, e.retry_after)
+                raise
+
+        # As in Image2VideoConverter._submit, only retry what cannot have created a task.
+        return retry_call(provider, attempt, deadline, "submit", max_attempts=3,
+                          breaker=circuit_breaker(provider), retry_if=never_processed)
+
+    def convert(self,
+                image_path: str,
+                prompt: str,
+                output_video_path: str,
+                deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[Exception]]:
+        """
+        Convert an image with the fastest provider. Providers that do not accept the
+        image or whose circuit breaker is open are skipped, hedges only go to providers with a free concurrency
+        slot, and no submission is watched past ``deadline``.
+
+        Returns:
+            Tuple[Optional[str], Optional[Exception]]: The provider whose video was
+            used (None if all failed) and the error, if no video was made.
+        """
+        deadline = deadline or Deadline(None)
+        pending = [p for p in self.policy.providers if self.accepts(p, image_path) and circuit_breaker(p).allows()]
+        running: Dict[Future, tuple] = {}
+        submitted: List[str] = []
+        hedges = 0
+        hedge_due = False
+        last_submit = (None, 0.0)
+        winner = None
+        error: Optional[Exception] = None
+
+        while winner is None:
+            # Submit to the next provider when nothing is in flight (first submission
+            # or failover) or when the hedge delay has passed.
+            if pending and (not running or (hedge_due and hedges < self.policy.max_hedges)):
+                provider = pending.pop(0)
+                if running:
+                    hedges += 1
+                    self.logger.debug(f"Hedging conversion of {image_path} to {provider}")
+                hedge_due = False
+                job_id = None
+                # The slot is held until the submission is decided. A hedge does not
+                # wait for one: the submissions already running may finish first.
+                slot = ExitStack()
+                try:
+                    slot.enter_context(self.router.slot(provider, timeout=0 if running else deadline.remaining(None)))
+                    client = self.clients(provider)
+                    if client is None:
+                        raise PermanentError(provider, "unsupported model")
+                    prepared_path = self.prepare(image_path, provider)
+                    job_id = self._create_job(provider, prepared_path, prompt, output_video_path)
+                    task_id = self._submit(provider, client, prepared_path, prompt, deadline)
+                    if job_id is not None:
+                        self.job_store.set_submitted(job_id, task_id)
+                    watch = client.watch_image2video(task_id, timeout=deadline.remaining(600))
+                    running[watch] = (provider, task_id, time.monotonic(), job_id, slot)
+                    submitted.append(provider)
+                    last_submit = (provider, time.monotonic())
+                except Exception as e:
+                    self.logger.error(f"Failed to submit to {provider}, error: {e}")
+                    self._finish_job(job_id, JobState.FAILED, str(e))
+                    slot.close()
+                    error = e
+                continue
+            if not running:
+                break
+
+            timeout = None
+            if pending and hedges < self.policy.max_hedges:
+                provider, submitted_at = last_submit
+                timeout = max(0.0, submitted_at + self._hedge_delay(provider) - time.monotonic())
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedge_due = True
+                continue
+
+            for future in done:
+                provider, task_id, started, job_id, slot = running.pop(future)
+                try:
+                    status = future.result()
+                except Exception as e:
+                    self.logger.error(f"{provider} task {task_id} did not finish, error: {e}")
+                    self.clients(provider).cancel(task_id)
+                    self._finish_job(job_id, JobState.FAILED, str(e))
+                    slot.close()
+                    error = e
+                    continue
+                self.router.observe(provider, status)
+                if status.state != TaskState.SUCCEEDED:
+                    self.logger.error(f"{provider} task {task_id} failed: {status.error}")
+                    self._finish_job(job_id, JobState.FAILED, str(status.error))
+                    slot.close()
+                    error = PermanentError(provider, f"task {task_id} did not succeed, status: {status.error}")
+                elif winner is None:
+                    self._record_duration(provider, time.monotonic() - started)
+                    winner = (provider, task_id, status, job_id, slot)
+                else:
+                    self._finish_job(job_id, JobState.FAILED, "another provider finished first")
+                    self._release(status)
+                    slot.close()
+
+        for future, (provider, task_id, _, job_id, slot) in running.items():
+            # Providers that cannot cancel finish the task anyway.
+            self._release_when_done(future)
+            self.clients(provider).cancel(task_id)
+            self._finish_job(job_id, JobState.FAILED, "cancelled, another provider finished first")
+            slot.close()
+
+        with self.stats._lock:
+            self.stats.conversions += 1
+            self.stats.submissions += len(submitted)
+            self.stats.hedges += hedges
+            self.stats.cancelled += len(running)
+            if winner is not None:
+                self.stats.wins[winner[0]] = self.stats.wins.get(winner[0], 0) + 1
+                self.stats.extra_cost += (
+                    sum(self.policy.costs.get(p, 0.0) for p in submitted)
+                    - self.policy.costs.get(winner[0], 0.0)
+                )
+
+        if winner is None:
+            self.logger.error(f"All providers failed to convert {image_path}")
+            if error is None:
+                error = ProviderError(Image2VideoModelType.FASTEST.value, f"no provider available for {image_path}")
+            return None, error
+
+        provider, task_id, status, job_id, slot = winner
+        with slot:
+            try:
+                # The video is paid for, so it is fetched even if the deadline passes.
+                retry_call(
+                    provider,
+                    lambda: self.clients(provider).download_image2video(task_id, status, output_video_path),
+                    stage="download",
+                    max_attempts=2,
+                    breaker=circuit_breaker(provider),
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to download {provider} task {task_id}, error: {e}")
+                self._finish_job(job_id, JobState.FAILED, str(e))
+                return provider, e
+        self._finish_job(job_id, JobState.SUCCEEDED)
+        return provider, None
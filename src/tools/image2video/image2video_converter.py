@@ -1,39 +1,468 @@
-from tools.common.logging import default_logger
-from tools.api.piapi.piapi_client import PiAPIClient
-from tools.api.replicate.replicate_client import ReplicateClient
-from tools.api.stabilityai.stability_ai_client import StabilityAIClient
-from tools.image2video.image2video_models import Image2VideoModelType
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from tools.common.errors import (
+    CircuitOpenError,
+    Deadline,
+    DeadlineExceeded,
+    PermanentError,
+    ProviderError,
+    RateLimitError,
+    never_processed,
+)
+from tools.common.job_store import Job, JobState, JobStore
+from tools.common.logging import default_logger, log_context
+from tools.common.metrics import Metrics, Span, default_metrics
+from tools.common.poller import TaskState
+from tools.common.resilience import circuit_breaker, retry_call
+from tools.common.result_cache import ResultCache
+from tools.common.staging import default_stager
+from tools.image2video.hedged_submission import HedgePolicy, HedgedSubmitter
+from tools.image2video.image2video_models import ConversionResult, ConversionStage, Image2VideoModelType
+from tools.image2video.image_preprocessor import ImagePreprocessor
+from tools.image2video.prompt_captioner import PromptCaptioner
+from tools.image2video.provider_registry import ProviderRegistry
+from tools.image2video.provider_router import ProviderRouter
+
+if TYPE_CHECKING:
+    from tools.common.transport import HTTPTransport
 
 class Image2VideoConverter:
-    def __init__(self):
+    # Seconds between checks on a job another process is still running for the same output.
+    REATTACH_POLL_SECONDS = 2.0
+
+    def __init__(self,
+                 transport: Optional["HTTPTransport"] = None,
+                 cache: Optional[ResultCache] = None,
+                 job_store: Optional[JobStore] = None,
+                 preprocessor: Optional[ImagePreprocessor] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 router: Optional[ProviderRouter] = None,
+                 auto_models: Optional[List[str]] = None,
+                 metrics: Optional[Metrics] = None,
+                 captioner: Optional[PromptCaptioner] = None,
+                 job_timeout: Optional[float] = 900):
         self.logger = default_logger
-        self.piapi_client = PiAPIClient()
-        self.replicate_client = ReplicateClient()
-        self.stabilityai_client = StabilityAIClient()
+        # Seconds a conversion may take from submission to download; None for no limit.
+        self.job_timeout = job_timeout
+        self._transport = transport
+        self.cache = cache
+        self.job_store = job_store
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        self.router = router or ProviderRouter()
+        self.metrics = metrics or default_metrics()
+        # Providers "Auto" may route to, in order of preference for ties.
+        self.auto_models = auto_models or [
+            Image2VideoModelType.REPLICATE.value,
+            Image2VideoModelType.PIAPI.value,
+            Image2VideoModelType.STABILITY.value,
+        ]
+        # Clients are imported and constructed the first time a job needs them.
+        self.providers = ProviderRegistry(self._client_options)
+        # Prompts left blank are written by captioning the start image.
+        self.captioner = captioner or PromptCaptioner(self._caption_image)
+        self.hedger = HedgedSubmitter(
+            self._client, self.preprocessor.prepare, hedge_policy, self.job_store, self.router, self.accepts
+        )
+        if self.job_store is not None:
+            threading.Thread(target=self.resume_jobs, name="resume-jobs", daemon=True).start()
+
+    @property
+    def transport(self) -> "HTTPTransport":
+        # All clients share one pooled transport so connections are reused across jobs.
+        if self._transport is None:
+            from tools.common.transport import default_transport
+            self._transport = default_transport()
+        return self._transport
+
+    def _client_options(self, model: str) -> Dict[str, Any]:
+        options = {"transport": self.transport}
+        if model == Image2VideoModelType.REPLICATE.value:
+            options["cache"] = self.cache
+        return options
+
+    def _client(self, model: str):
+        return self.providers.get(model)
+
+    def _caption_image(self, image_path: str) -> str:
+        return self._client(Image2VideoModelType.REPLICATE.value).image2text(image_path)
 
-    def convert(self, image_path: str, prompt: str, output_video_path: str, model: str) -> None:
+    def _prompt(self, image_path: str, prompt: str, trace: Optional[Dict[str, Any]] = None) -> str:
+        """``prompt``, or a caption of the image if it is blank."""
+        if prompt and prompt.strip():
+            return prompt
+        # Captioning started when the job arrived; this only waits for what is left.
+        with self.metrics.span("caption", **(trace or {})):
+            return self.captioner.caption(image_path)
+
+    def resume_jobs(self) -> None:
+        """
+        Reattach to jobs left unfinished by processes that died, and finish them.
+        Runs in the background when the converter is created with a JobStore.
+        """
+        jobs = self.job_store.claim_orphans()
+        if jobs:
+            self.logger.info(f"Reattaching to {len(jobs)} unfinished jobs")
+        by_output: Dict[str, List[Job]] = {}
+        for job in jobs:
+            by_output.setdefault(job.output_path, []).append(job)
+        for group in by_output.values():
+            job = self._adopt(group)
+            if job is not None:
+                threading.Thread(target=self._resume_job, args=(job,), daemon=True).start()
+
+    def _adopt(self, jobs: List[Job]) -> Optional[Job]:
+        """
+        Of claimed, unfinished jobs for one output, return the one to reattach to and
+        close the others.
+        """
+        keep = None
+        for job in jobs:
+            if job.state == JobState.CREATED:
+                # The process died before the provider acknowledged the job, so
+                # there is nothing to reattach to.
+                self.job_store.finish(job.id, JobState.FAILED, "interrupted before submission was acknowledged")
+            elif keep is None:
+                keep = job
+            else:
+                # Hedged submissions of an interrupted "Fastest" job; one video is enough.
+                self._client(job.model).cancel(job.provider_job_id)
+                self.job_store.finish(job.id, JobState.FAILED, f"superseded by job {keep.id}")
+        return keep
+
+    @staticmethod
+    def _discard_output(output_video_path: str) -> None:
+        # A video left at the output path by an earlier run must not pass for the
+        # one being made; success is judged by the file being there.
+        try:
+            os.remove(output_video_path)
+        except FileNotFoundError:
+            pass
+
+    def _resume_job(self, job: Job, deadline: Optional[Deadline] = None) -> Optional[Exception]:
+        trace = {"provider": job.model, "model": job.model, "job_id": job.id}
+        error = None
+        with log_context(job_id=job.id, provider=job.model):
+            self.logger.debug(f"Resuming {job.model} job {job.provider_job_id}")
+            try:
+                self._discard_output(job.output_path)
+                deadline = deadline or Deadline(None)
+                with self.router.slot(job.model, timeout=deadline.remaining(None)):
+                    self._wait_and_download(
+                        job.model, self._client(job.model), job.provider_job_id, job.output_path,
+                        trace=trace, deadline=deadline,
+                    )
+            except Exception as e:
+                error = e
+                self.logger.error(f"Failed to resume job {job.id}, error: {e}")
+            self._finish_job(job.id, job.output_path, str(error) if error is not None else None)
+        return error
+
+    def reattach(self, output_video_path: str, deadline: Optional[Deadline] = None) -> Optional[ConversionResult]:
+        """
+        Finish an unfinished job for ``output_video_path`` left by an interrupted run,
+        without submitting a new one. Returns None if there is no such job, or it
+        ended without a video.
+        """
+        outcome = self._reattach(os.path.abspath(output_video_path), deadline or Deadline(self.job_timeout))
+        if outcome is None:
+            return None
+        provider, error = outcome
+        if error is None and not os.path.exists(output_video_path):
+            error = ProviderError(provider, "no video produced")
+        return ConversionResult(output_video_path, provider, error)
+
+    def _reattach(self, output_video_path: str, deadline: Deadline) -> Optional[Tuple[str, Optional[Exception]]]:
+        """
+        Finish an unfinished job that already works towards ``output_video_path``
+        instead of paying for a new one: take it over if its process died, or wait
+        for it while another process (or ``resume_jobs``) still runs it.
+
+        Returns the provider and error of that job, or None if there was none or it
+        ended without a video, in which case a new job should be submitted.
+        """
+        if self.job_store is None:
+            return None
+        waited = None
+        while True:
+            jobs = self.job_store.unfinished_for(output_video_path)
+            if not jobs:
+                break
+            claimed = [job for job in map(self.job_store.claim, [job.id for job in jobs]) if job is not None]
+            job = self._adopt(claimed)
+            if job is not None:
+                self.logger.info(f"Reattaching to {job.model} job {job.provider_job_id} for {output_video_path}")
+                return job.model, self._resume_job(job, deadline)
+            if len(claimed) == len(jobs):
+                break
+            waited = jobs[-1]
+            if deadline.expired:
+                return waited.model, DeadlineExceeded(
+                    waited.model, f"job {waited.id} for {output_video_path} is still running", "reattach"
+                )
+            time.sleep(min(self.REATTACH_POLL_SECONDS, deadline.remaining()))
+        if waited is not None:
+            job = self.job_store.get(waited.id)
+            if job.state == JobState.SUCCEEDED and os.path.exists(output_video_path):
+                return job.model, None
+        return None
+
+    def convert(self,
+                image_path: str,
+                prompt: str,
+                output_video_path: str,
+                model: str,
+                on_status: Optional[Callable[[ConversionStage], None]] = None,
+                deadline: Optional[Deadline] = None) -> ConversionResult:
         """
         Converts an image to a video by first extracting a caption (or prompt) from the image,
         then generating a video based on that caption.
         
         Parameters:
             image_path (str): Path to the input image file.
+            prompt (str): Prompt to guide video generation.
             output_video_path (str): Path where the generated video will be saved.
+            model (str): One of the Image2VideoModelType values.
+            on_status (Callable): Optional callback receiving each ConversionStage the
+                job goes through, e.g. to show live progress in a UI.
+            deadline (Deadline): When the job must be done by; ``job_timeout`` seconds
+                from now by default. Waiting for a slot, submit retries and polling
+                stop at the deadline, and a task still running then is cancelled. A
+                video that finished in time is downloaded even if the deadline passes.
+
+        Returns:
+            ConversionResult: The provider used and, if no video was made, why. Provider
+            failures are typed: DeadlineExceeded, CircuitOpenError when every provider
+            is failing fast, PermanentError when retrying would not help, or
+            TransientError when retries ran out.
+
+        With a ResultCache, a previous result for the same image content, prompt and
+        model is linked to ``output_video_path`` instead of generating again.
+
+        With a JobStore, an unfinished job for ``output_video_path`` left by an
+        interrupted run is reattached to, or waited for, instead of paying again.
+
+        A blank prompt is replaced by a caption of the image. Captioning starts right
+        away and runs alongside the cache lookup and preprocessing.
         """
         # Generate the video using the image and the extracted caption
         if model is None:
             self.logger.error("Image2Video Model is not specified")
-            return
-        
+            return ConversionResult(output_video_path, error=ValueError("Image2Video Model is not specified"))
+        deadline = deadline or Deadline(self.job_timeout)
+
+        def report(stage: ConversionStage) -> None:
+            if on_status is not None:
+                on_status(stage)
+
+        report(ConversionStage.QUEUED)
+
+        cache_key = None
+        try:
+            if not (prompt and prompt.strip()):
+                self.captioner.submit(image_path)
+            if self.cache is not None:
+                cache_key = self.cache.key(
+                    {"task": "image2video", "model": model, "prompt": (prompt or "").strip()},
+                    [image_path],
+                )
+        except OSError as e:
+            self.logger.error(f"Failed to read image {image_path}, error: {e}")
+            return ConversionResult(output_video_path, model, PermanentError(model, f"cannot read image: {e}"))
+        if cache_key is not None and self.cache.get(cache_key, output_video_path):
+            report(ConversionStage.DONE)
+            return ConversionResult(output_video_path, model, cached=True)
+
+        # A job for this output may survive from a run that was interrupted.
+        provider, error = (
+            self._reattach(os.path.abspath(output_video_path), deadline)
+            or self._generate(image_path, prompt, output_video_path, model, report, deadline)
+        )
+
+        if error is None and not os.path.exists(output_video_path):
+            error = ProviderError(provider, "no video produced")
+        if error is not None:
+            return ConversionResult(output_video_path, provider, error)
+        if cache_key is not None:
+            self.cache.put(cache_key, output_video_path)
+        report(ConversionStage.DONE)
+        return ConversionResult(output_video_path, provider)
+
+    def accepts(self, model: str, image_path: str) -> bool:
+        """
+        Whether the provider ``model`` can take ``image_path``. PiAPI fetches the
+        start image itself, so a local file needs a staging store to publish it
+        under a URL.
+        """
         if model == Image2VideoModelType.PIAPI.value:
-            self.logger.debug(f"Generating video using PiAPI model")
-            self.piapi_client.image2video(image_path, prompt, output_video_path)
-        elif model == Image2VideoModelType.REPLICATE.value:
-            self.logger.debug(f"Generating video using Replicate model")
-            self.replicate_client.image2video(image_path, prompt, output_video_path)
-        elif model == Image2VideoModelType.STABILITY.value:
-            self.logger.debug(f"Generating video using StabilityAI model")
-            self.stabilityai_client.image2video(image_path, output_video_path)
-        else:
+            return image_path.startswith(("http://", "https://")) or default_stager().store is not None
+        return True
+
+    def _generate(self,
+                  image_path: str,
+                  prompt: str,
+                  output_video_path: str,
+                  model: str,
+                  report: Callable[[ConversionStage], None],
+                  deadline: Deadline) -> Tuple[str, Optional[Exception]]:
+        """Run the job on the provider ``model`` resolves to; returns it and the error, if any."""
+        self._discard_output(output_video_path)
+        if model == Image2VideoModelType.FASTEST.value:
+            report(ConversionStage.RUNNING)
+            try:
+                prompt = self._prompt(image_path, prompt)
+            except Exception as e:
+                self.logger.error(f"Failed to caption image {image_path}, error: {e}")
+                return model, e
+            provider, error = self.hedger.convert(image_path, prompt, output_video_path, deadline)
+            return provider or model, error
+
+        requested_model = model
+        if model == Image2VideoModelType.AUTO.value:
+            candidates = [m for m in self.auto_models if self.accepts(m, image_path)]
+            if not candidates:
+                self.logger.error(f"No provider accepts image: {image_path}")
+                return model, PermanentError(model, f"no provider accepts image {image_path}")
+            # Providers that keep failing are left out until their breaker lets a trial through.
+            healthy = [m for m in candidates if circuit_breaker(m).allows()]
+            if not healthy:
+                self.logger.error(f"Every provider for {image_path} is failing, not submitting")
+                return model, CircuitOpenError(model, f"circuit open for {', '.join(candidates)}")
+            model = self.router.choose(healthy)
+
+        client = self._client(model)
+        if client is None:
             self.logger.error(f"Unsupported model: {model}")
-            return
+            return model, PermanentError(model, "unsupported model")
+
+        # Spans are tagged with the provider that ran the job and the model asked for,
+        # so that e.g. "Auto" jobs can be told apart from ones pinned to a provider.
+        trace = {"provider": model, "model": requested_model, "job_id": uuid.uuid4().hex}
+        with log_context(job_id=trace["job_id"], provider=model):
+            return model, self._run_job(image_path, prompt, output_video_path, model, client, report, trace, deadline)
+
+    def _run_job(self,
+                 image_path: str,
+                 prompt: str,
+                 output_video_path: str,
+                 model: str,
+                 client,
+                 report: Callable[[ConversionStage], None],
+                 trace: Dict[str, Any],
+                 deadline: Deadline) -> Optional[Exception]:
+        job_id = None
+        error = None
+        try:
+            with self.metrics.span("preprocess", **trace) as span:
+                prepared_path = self.preprocessor.prepare(image_path, model)
+                if os.path.exists(prepared_path):
+                    span.add(bytes=os.path.getsize(prepared_path))
+            prompt = self._prompt(image_path, prompt, trace)
+            image_path = prepared_path
+            self.logger.debug(f"Generating video using {model} model")
+            if self.job_store is not None:
+                job_id = self.job_store.create(
+                    model, image_path, prompt, os.path.abspath(output_video_path), trace["job_id"]
+                )
+
+            deadline.check(model, "queue")
+            with self.router.slot(model, timeout=deadline.remaining(None)):
+                report(ConversionStage.SUBMITTING)
+                with self.metrics.span("upload", **trace) as span:
+                    task_id = self._submit(model, client, image_path, prompt, span, deadline)
+                if job_id is not None:
+                    self.job_store.set_submitted(job_id, task_id)
+                self._wait_and_download(model, client, task_id, output_video_path, report, trace, deadline)
+        except Exception as e:
+            error = e
+            self.logger.error(f"Failed to generate video from image {image_path} with {model}, error: {e}")
+
+        if job_id is not None:
+            self._finish_job(job_id, output_video_path, str(error) if error is not None else None)
+        return error
+
+    def _submit(self,
+                model: str,
+                client,
+                image_path: str,
+                prompt: str,
+                span: Span,
+                deadline: Optional[Deadline] = None,
+                max_attempts: int = 5) -> str:
+        """
+        Submit within the provider's rate limit and circuit breaker, retrying with
+        backoff (as the provider asks on 429s) until the deadline. Only failures the
+        provider cannot have acted on are retried: a timed-out submission may still
+        have created a paid task, and rejected requests would fail again.
+        """
+        def attempt() -> str:
+            self.router.acquire_token(model)
+            span.add(requests=1)
+            if os.path.exists(image_path):
+                span.add(bytes=os.path.getsize(image_path))
+            try:
+                return client.submit_image2video(image_path, prompt)
+            except RateLimitError as e:
+                self.router.rate_limited(model, e.retry_after)
+                raise
+
+        return retry_call(model, attempt, deadline, "submit", max_attempts,
+                          breaker=circuit_breaker(model), retry_if=never_processed)
+
+    def _wait_and_download(self,
+                           model: str,
+                           client,
+                           task_id: str,
+                           output_video_path: str,
+                           report: Optional[Callable[[ConversionStage], None]] = None,
+                           trace: Optional[Dict[str, Any]] = None,
+                           deadline: Optional[Deadline] = None) -> None:
+        trace = trace or {"provider": model, "model": model, "job_id": None}
+        deadline = deadline or Deadline(None)
+        on_update = None
+        if report is not None:
+            report(ConversionStage.PENDING)
+
+            def on_update(status):
+                if status.state == TaskState.RUNNING:
+                    report(ConversionStage.RUNNING)
+
+        try:
+            status = client.watch_image2video(task_id, timeout=deadline.remaining(600), on_update=on_update).result()
+        except Exception:
+            # Out of time, or the task can no longer be checked: nobody will collect
+            # the video, so stop paying for it.
+            client.cancel(task_id)
+            raise
+        self.router.observe(model, status)
+        if status.elapsed is not None:
+            queue_seconds = status.queue_seconds or 0.0
+            self.metrics.record("queue_wait", queue_seconds, **trace)
+            self.metrics.record("generation", status.elapsed - queue_seconds, **trace)
+        if status.state != TaskState.SUCCEEDED:
+            raise PermanentError(model, f"task {task_id} did not succeed, status: {status.error}")
+        if report is not None:
+            report(ConversionStage.DOWNLOADING)
+        with self.metrics.span("download", **trace) as span:
+            # The video finished in time and is paid for, so it is fetched even if
+            # the deadline passes while downloading.
+            retry_call(
+                model,
+                lambda: client.download_image2video(task_id, status, output_video_path),
+                stage="download",
+                max_attempts=2,
+                breaker=circuit_breaker(model),
+            )
+            span.add(requests=1)
+            if os.path.exists(output_video_path):
+                span.add(bytes=os.path.getsize(output_video_path))
+
+    def _finish_job(self, job_id: str, output_video_path: str, error: Optional[str]) -> None:
+        """Record the outcome of a job in the job store."""
+        if error is None and os.path.exists(output_video_path):
+            self.job_store.finish(job_id, JobState.SUCCEEDED)
+        else:
+            self.job_store.finish(job_id, JobState.FAILED, error or "no video produced")
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Any, Dict, Optional
 
 class Image2VideoModelType(str, Enum):
     """
@@ -7,4 +8,61 @@ class Image2VideoModelType(str, Enum):
     PIAPI = "PiAPI"
     REPLICATE = "Replicate"
     STABILITY = "Stability"
-    
+
+    # Not providers: race several providers and keep the first video, or route
+    # each job to the provider expected to finish it soonest.
+    FASTEST = "Fastest"
+    AUTO = "Auto"
+
+
+class ConversionStage(str, Enum):
+    """
+    Progress of one conversion, as reported to ``Image2VideoConverter.convert``'s
+    ``on_status`` callback.
+    """
+    QUEUED = "queued"
+    SUBMITTING = "submitting"
+    PENDING = "waiting at provider"
+    RUNNING = "running"
+    DOWNLOADING = "downloading"
+    DONE = "done"
+
+
+class ConversionResult:
+    """
+    Outcome of ``Image2VideoConverter.convert``.
+
+    Parameters:
+        output_path: Where the video was to be saved.
+        provider: Provider that made the video, or the last one tried.
+        error: Why no video was made; a ProviderError subclass such as
+            DeadlineExceeded, CircuitOpenError or PermanentError for provider
+            failures. None on success.
+        cached: Whether the video came from the result cache.
+    """
+
+    def __init__(self,
+                 output_path: str,
+                 provider: Optional[str] = None,
+                 error: Optional[Exception] = None,
+                 cached: bool = False):
+        self.output_path = output_path
+        self.provider = provider
+        self.error = error
+        self.cached = cached
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "output": self.output_path if self.succeeded else None,
+            "provider": self.provider,
+            "error": str(self.error) if self.error is not None else None,
+            "error_type": type(self.error).__name__ if self.error is not None else None,
+            "cached": self.cached,
+        }
+
+    def __repr__(self) -> str:
+        return f"ConversionResult(provider={self.provider!r}, error={self.error!r})"
@@ -0,0 +1,145 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from tools.common.logging import default_logger
+from tools.common.result_cache import ResultCache
+from tools.image2video.image2video_models import Image2VideoModelType
+
+EXIF_ORIENTATION = 0x0112
+
+class ImageSpec:
+    """
+    What a provider accepts as a start image.
+
+    Parameters:
+        sizes: Exact (width, height) pairs the provider requires; the image is
+            cropped and resized to the one with the nearest aspect ratio.
+        max_side: Otherwise, the longest side the image is downscaled to, keeping
+            its aspect ratio.
+        quality: JPEG quality used when re-encoding.
+    """
+
+    def __init__(self, sizes: Optional[List[Tuple[int, int]]] = None, max_side: int = 1280, quality: int = 90):
+        self.sizes = sizes
+        self.max_side = max_side
+        self.quality = quality
+
+    def target_size(self, width: int, height: int) -> Tuple[int, int]:
+        if self.sizes:
+            aspect = width / height
+            return min(self.sizes, key=lambda size: abs(size[0] / size[1] - aspect))
+        scale = min(1.0, self.max_side / max(width, height))
+        return round(width * scale), round(height * scale)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"sizes": self.sizes, "max_side": self.max_side, "quality": self.quality}
+
+
+PROVIDER_SPECS: Dict[str, ImageSpec] = {
+    # Stable Video rejects anything but these three resolutions.
+    Image2VideoModelType.STABILITY.value: ImageSpec(sizes=[(1024, 576), (576, 1024), (768, 768)]),
+    # Kling follows the start image's aspect ratio; larger inputs only cost upload time.
+    Image2VideoModelType.PIAPI.value: ImageSpec(max_side=1280),
+    Image2VideoModelType.REPLICATE.value: ImageSpec(max_side=1280),
+}
+
+
+class ImagePreprocessor:
+    """
+    Fits start images to what each provider accepts before they are uploaded.
+
+    Images are EXIF-rotated, cropped/resized to the provider's nearest supported
+    resolution or downscaled, and re-encoded as JPEG. Results are cached on disk by
+    source content hash, provider and spec, so resubmitting an image costs one hash,
+    and once the cache grows past ``max_bytes`` the least recently used variants
+    are evicted. Images that already fit are passed through untouched.
+    """
+
+    def __init__(self,
+                 cache_dir: str = "~/.cache/tools/preprocessed",
+                 specs: Optional[Dict[str, ImageSpec]] = None,
+                 max_bytes: int = 1024 ** 3):
+        self.logger = default_logger
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.specs = specs or PROVIDER_SPECS
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    def _entries(self) -> List[str]:
+        return [
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".jpg")
+        ]
+
+    def prepare(self, image_path: str, model: str) -> str:
+        """
+        Return the path of a variant of ``image_path`` suitable for ``model``.
+
+        Remote URLs and models without a spec are returned unchanged.
+        """
+        spec = self.specs.get(model)
+        if spec is None or image_path.startswith(("http://", "https://")):
+            return image_path
+
+        with Image.open(image_path) as image:
+            # Opening only reads the header, so this check is cheap. A rotated image
+            # is never passed through: providers ignore the EXIF orientation, and its
+            # stored size is not the size it is shown at.
+            accepted_formats = ("JPEG", "PNG") if spec.sizes else ("JPEG",)
+            upright = image.getexif().get(EXIF_ORIENTATION, 1) == 1
+            if upright and image.size == spec.target_size(*image.size) and image.format in accepted_formats:
+                return image_path
+
+            # Changing a provider's spec, e.g. its JPEG quality, must not hand out
+            # variants made for the old one.
+            key = ResultCache.key({"model": model, **spec.as_dict()}, [image_path])
+            cached_path = os.path.join(self.cache_dir, f"{key}.jpg")
+            try:
+                os.utime(cached_path)
+                return cached_path
+            except FileNotFoundError:
+                pass
+
+            image = ImageOps.exif_transpose(image)
+            target = spec.target_size(*image.size)
+            if spec.sizes:
+                image = ImageOps.fit(image, target, Image.Resampling.LANCZOS)
+            else:
+                image = image.resize(target, Image.Resampling.LANCZOS)
+            if image.mode != "RGB":
+                # JPEG has no alpha channel; flatten transparency onto white.
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+
+            tmp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, "JPEG", quality=spec.quality, optimize=True)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                if not os.path.exists(cached_path):
+                    self._size += size
+                os.replace(tmp_path, cached_path)
+
+        self.logger.debug(f"Preprocessed {image_path} for {model}: {os.path.getsize(image_path)} -> {size} bytes")
+        self._evict(keep=cached_path)
+        return cached_path
+
+    def _evict(self, keep: str) -> None:
+        """Remove the least recently used variants, other than ``keep``, until the cache fits."""
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            for path in sorted(self._entries(), key=lambda path: os.stat(path).st_mtime):
+                if self._size <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+                self.logger.debug(f"Preprocessed image cache evicted {os.path.basename(path)[:12]}")
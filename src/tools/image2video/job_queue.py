@@ -0,0 +1,288 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from tools.common.logging import default_logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    image_path TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    stage TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS queue_state ON queue (state, priority, created_at);
+CREATE INDEX IF NOT EXISTS queue_tenant ON queue (tenant, state);
+"""
+
+
+class QueueState(str, Enum):
+    """
+    Lifecycle of a queued conversion.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINAL_STATES = (QueueState.SUCCEEDED, QueueState.FAILED, QueueState.CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue, or the tenant's share of it, is full."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueuedJob:
+    """
+    One row of the queue table.
+    """
+
+    def __init__(self, row: sqlite3.Row):
+        self.id = row["id"]
+        self.tenant = row["tenant"]
+        self.priority = row["priority"]
+        self.image_path = row["image_path"]
+        self.prompt = row["prompt"]
+        self.model = row["model"]
+        self.output_path = row["output_path"]
+        self.state = QueueState(row["state"])
+        self.stage = row["stage"]
+        self.error = row["error"]
+        self.attempts = row["attempts"]
+        self.created_at = row["created_at"]
+        self.started_at = row["started_at"]
+        self.finished_at = row["finished_at"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "tenant": self.tenant,
+            "priority": self.priority,
+            "model": self.model,
+            "state": self.state.value,
+            "stage": self.stage,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def __repr__(self) -> str:
+        return f"QueuedJob(id={self.id!r}, tenant={self.tenant!r}, state={self.state.value!r})"
+
+
+class JobQueue:
+    """
+    SQLite-backed priority queue of conversions, shared by every process and node
+    that points at the same database file.
+
+    Workers lease jobs and renew the lease while they run them; a job whose lease
+    expired belonged to a worker that died and is handed out again, up to
+    ``max_attempts`` times. Leasing favours the tenant with the fewest running
+    jobs, then the highest priority, then the oldest job, so one tenant's burst
+    cannot starve the others. Submissions beyond ``max_queued`` jobs, or
+    ``max_queued_per_tenant`` for one tenant, are refused with QueueFullError.
+    """
+
+    def __init__(self,
+                 db_path: str = "~/.cache/tools/queue.db",
+                 lease_seconds: float = 60,
+                 max_attempts: int = 3,
+                 max_queued: int = 10000,
+                 max_queued_per_tenant: Optional[int] = None):
+        self.logger = default_logger
+        self.db_path = os.path.expanduser(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self,
+               image_path: str,
+               prompt: str,
+               model: str,
+               output_path: str,
+               tenant: str = "default",
+               priority: int = 0,
+               job_id: Optional[str] = None) -> str:
+        """Queue a conversion and return its ID; higher ``priority`` runs first."""
+        job_id = job_id or uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = conn.execute(
+                "SELECT COUNT(*) FROM queue WHERE state = ?", (QueueState.QUEUED.value,)
+            ).fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Queue is full ({queued} jobs waiting)")
+            if self.max_queued_per_tenant is not None:
+                tenant_queued = conn.execute(
+                    "SELECT COUNT(*) FROM queue WHERE state = ? AND tenant = ?", (QueueState.QUEUED.value, tenant)
+                ).fetchone()[0]
+                if tenant_queued >= self.max_queued_per_tenant:
+                    raise QueueFullError(f"Tenant {tenant} has {tenant_queued} jobs waiting")
+            conn.execute(
+                "INSERT INTO queue (id, tenant, priority, image_path, prompt, model, output_path, state, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tenant, priority, image_path, prompt or "", model, output_path,
+                 QueueState.QUEUED.value, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def lease(self, owner: Optional[str] = None) -> Optional[QueuedJob]:
+        """
+        Take the next job for ``owner`` (this queue's owner by default), or None if
+        nothing is waiting. Runs in an immediate transaction, so two workers never
+        lease the same job.
+        """
+        owner = owner or self.owner
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs of workers that stopped renewing their lease go back to the queue,
+            # or fail once they have been tried too often.
+            conn.execute(
+                "UPDATE queue SET state = ?, error = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL"
+                " WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (QueueState.FAILED.value, "worker lost", now, QueueState.RUNNING.value, now, self.max_attempts),
+            )
+            conn.execute(
+                "UPDATE queue SET state = ?, stage = NULL, lease_owner = NULL, lease_expires = NULL"
+                " WHERE state = ? AND lease_expires < ?",
+                (QueueState.QUEUED.value, QueueState.RUNNING.value, now),
+            )
+            row = conn.execute(
+                "SELECT q.* FROM queue q"
+                " LEFT JOIN (SELECT tenant, COUNT(*) AS running FROM queue WHERE state = ? GROUP BY tenant) r"
+                " ON r.tenant = q.tenant"
+                " WHERE q.state = ?"
+                " ORDER BY COALESCE(r.running, 0), q.priority DESC, q.created_at LIMIT 1",
+                (QueueState.RUNNING.value, QueueState.QUEUED.value),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE queue SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                    " started_at = ? WHERE id = ?",
+                    (QueueState.RUNNING.value, owner, now + self.lease_seconds, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def renew(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """
+        Extend the lease of a running job. Returns False if the job was cancelled
+        or its lease was lost to another worker.
+        """
+        cursor = self._connection().execute(
+            "UPDATE queue SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, job_id, QueueState.RUNNING.value, owner or self.owner),
+        )
+        return cursor.rowcount > 0
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        """Record how far a running job has got, for status requests."""
+        self._connection().execute(
+            "UPDATE queue SET stage = ? WHERE id = ? AND state = ?", (stage, job_id, QueueState.RUNNING.value)
+        )
+
+    def finish(self, job_id: str, state: QueueState, error: Optional[str] = None, owner: Optional[str] = None) -> bool:
+        """
+        Record the outcome of a leased job. Returns False, changing nothing, if the
+        job was cancelled or re-leased in the meantime.
+        """
+        cursor = self._connection().execute(
+            "UPDATE queue SET state = ?, error = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL"
+            " WHERE id = ? AND state = ? AND lease_owner = ?",
+            (state.value, error, time.time(), job_id, QueueState.RUNNING.value, owner or self.owner),
+        )
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. A running job's worker notices when it next
+        renews its lease and discards the result. Returns False for unknown or
+        finished jobs.
+        """
+        cursor = self._connection().execute(
+            "UPDATE queue SET state = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL"
+            " WHERE id = ? AND state IN (?, ?)",
+            (QueueState.CANCELLED.value, time.time(), job_id, QueueState.QUEUED.value, QueueState.RUNNING.value),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        row = self._connection().execute("SELECT * FROM queue WHERE id = ?", (job_id,)).fetchone()
+        return QueuedJob(row) if row else None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs that would be leased before ``job_id``, ignoring fairness."""
+        job = self.get(job_id)
+        if job is None or job.state != QueueState.QUEUED:
+            return None
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM queue WHERE state = ? AND (priority > ? OR (priority = ? AND created_at < ?))",
+            (QueueState.QUEUED.value, job.priority, job.priority, job.created_at),
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Job counts per state, and queued/running counts per tenant."""
+        conn = self._connection()
+        states = {state.value: 0 for state in QueueState}
+        for state, count in conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state"):
+            states[state] = count
+        tenants: Dict[str, Dict[str, int]] = {}
+        for tenant, state, count in conn.execute(
+            "SELECT tenant, state, COUNT(*) FROM queue WHERE state IN (?, ?) GROUP BY tenant, state",
+            (QueueState.QUEUED.value, QueueState.RUNNING.value),
+        ):
+            tenants.setdefault(tenant, {QueueState.QUEUED.value: 0, QueueState.RUNNING.value: 0})[state] = count
+        return {"states": states, "tenants": tenants}
@@ -0,0 +1,529 @@
+import base64
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import click
+
+from tools.common.logging import default_logger, log_context
+from tools.image2video.image2video_models import ConversionResult, Image2VideoModelType
+from tools.image2video.job_queue import FINAL_STATES, JobQueue, QueuedJob, QueueFullError, QueueState
+from tools.image2video.provider_registry import model_names, validate_model
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class QueueWorker:
+    """
+    Runs queued jobs through one Image2VideoConverter on ``concurrency`` threads.
+
+    Each thread leases a job, converts it and records the outcome; a heartbeat
+    renews the leases of running jobs and notices jobs cancelled meanwhile. Their
+    provider jobs, as recorded in the converter's JobStore, are cancelled so that
+    the conversion ends early and stops costing money, and their results are
+    discarded. Setting the stop event drains the worker: no new jobs are leased
+    and ``run`` returns once the running ones are done.
+
+    Every lease of a job writes its own attempt file, moved to the job's output
+    only when it succeeded, so a worker that lost its lease never touches the
+    result of the one that took over. A re-leased job first reattaches, through
+    the converter's JobStore, to provider jobs of earlier attempts that are still
+    running, rather than paying for a new one.
+    """
+
+    def __init__(self, queue: JobQueue, converter, concurrency: int = 8, poll_interval: float = 1.0):
+        self.logger = default_logger
+        self.queue = queue
+        self.converter = converter
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._running: Dict[str, QueuedJob] = {}
+        self._cancelled: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def run(self, stop: threading.Event) -> None:
+        threads = [
+            threading.Thread(target=self._loop, args=(stop,), name=f"queue-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_leases, args=(done,), name="queue-heartbeat", daemon=True)
+        heartbeat.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+
+    def _loop(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                job = self.queue.lease()
+            except Exception as e:
+                self.logger.error(f"Failed to lease a job, error: {e}")
+                job = None
+            if job is None:
+                stop.wait(self.poll_interval)
+                continue
+            self._run_job(job)
+
+    def _renew_leases(self, done: threading.Event) -> None:
+        while not done.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                running = dict(self._running)
+            for job_id, job in running.items():
+                try:
+                    if not self.queue.renew(job_id):
+                        with self._lock:
+                            self._cancelled.add(job_id)
+                        current = self.queue.get(job_id)
+                        # A job whose lease was lost is still wanted: the worker that
+                        # took it over reattaches to its provider jobs.
+                        if current is not None and current.state == QueueState.CANCELLED:
+                            self._cancel_provider_jobs(job)
+                except Exception as e:
+                    self.logger.error(f"Failed to renew lease of job {job_id}, error: {e}")
+
+    def _cancel_provider_jobs(self, job: QueuedJob) -> None:
+        """
+        Cancel the provider jobs a cancelled job has submitted so far. Runs on every
+        heartbeat until the conversion returns, so a submission that raced the
+        cancellation is caught on the next one.
+        """
+        job_store = getattr(self.converter, "job_store", None)
+        if job_store is None:
+            return
+        for provider_job in job_store.unfinished_for(os.path.abspath(self.attempt_path(job, job.attempts))):
+            if provider_job.provider_job_id is None:
+                continue
+            client = self.converter.providers.get(provider_job.model)
+            if client is not None:
+                self.logger.info(
+                    f"Job {job.id} was cancelled, cancelling {provider_job.model} job {provider_job.provider_job_id}"
+                )
+                client.cancel(provider_job.provider_job_id)
+
+    @staticmethod
+    def attempt_path(job: QueuedJob, attempt: int) -> str:
+        """Where lease number ``attempt`` of ``job`` writes its video."""
+        root, extension = os.path.splitext(job.output_path)
+        return f"{root}.attempt-{attempt}{extension}"
+
+    def _convert(self, job: QueuedJob) -> Tuple[str, Any]:
+        """Convert ``job``, or finish an earlier attempt's provider job; returns the attempt file and result."""
+        reattach = getattr(self.converter, "reattach", None)
+        for attempt in range(1, job.attempts):
+            previous = self.attempt_path(job, attempt)
+            if os.path.exists(previous):
+                # Videos are moved into place whole, so an attempt file is complete.
+                return previous, ConversionResult(previous, job.model)
+            result = reattach(previous) if reattach is not None else None
+            if result is not None:
+                self.logger.info(f"Job {job.id} reattached to the provider job of attempt {attempt}")
+                return self.attempt_path(job, attempt), result
+        path = self.attempt_path(job, job.attempts)
+        result = self.converter.convert(
+            job.image_path, job.prompt, path, job.model,
+            on_status=lambda stage: self.queue.set_stage(job.id, stage.value),
+        )
+        return path, result
+
+    def _run_job(self, job: QueuedJob) -> None:
+        with self._lock:
+            self._running[job.id] = job
+        error = None
+        path = self.attempt_path(job, job.attempts)
+        with log_context(queue_job_id=job.id, tenant=job.tenant):
+            self.logger.info(f"Running job {job.id} for {job.tenant} with {job.model}, attempt {job.attempts}")
+            try:
+                path, result = self._convert(job)
+                if result.error is not None:
+                    error = f"{type(result.error).__name__}: {result.error}"
+            except Exception as e:
+                error = str(e)
+                self.logger.error(f"Job {job.id} failed, error: {e}")
+            with self._lock:
+                self._running.pop(job.id, None)
+                cancelled = job.id in self._cancelled
+                self._cancelled.discard(job.id)
+
+            succeeded = error is None and os.path.exists(path)
+            if succeeded and not cancelled:
+                # In place before the job reads as succeeded, so its result is never
+                # missing. Should the lease have been lost meanwhile, this is still a
+                # complete video of the same job, replaced atomically by whichever
+                # attempt finishes last.
+                os.replace(path, job.output_path)
+            taken_over = False
+            if cancelled or not self.queue.finish(
+                job.id,
+                QueueState.SUCCEEDED if succeeded else QueueState.FAILED,
+                None if succeeded else error or "no video produced",
+            ):
+                current = self.queue.get(job.id)
+                if current is not None and current.state == QueueState.CANCELLED:
+                    self.logger.info(f"Job {job.id} was cancelled, discarding its result")
+                    if os.path.exists(job.output_path):
+                        os.remove(job.output_path)
+                else:
+                    # The attempt file is left for the worker that took the job over.
+                    self.logger.info(f"Job {job.id} was taken over by another worker")
+                    taken_over = True
+            if not taken_over and os.path.exists(path):
+                os.remove(path)
+
+
+def worker_environment(index: int) -> Dict[str, str]:
+    """
+    Environment overrides for worker process ``index``, so that the listeners every
+    process would start do not all bind the same port: metrics are served on
+    METRICS_PORT + index, staged files by the parent only, and webhooks on a free
+    local port that the parent's WebhookRelay forwards to.
+    """
+    env = {}
+    if os.getenv("METRICS_PORT"):
+        env["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + index)
+    if os.getenv("STAGING_PUBLIC_URL"):
+        env["STAGING_SERVE"] = "0"
+    if os.getenv("WEBHOOK_PUBLIC_URL"):
+        env["WEBHOOK_PUBLIC_URL"] = f"{os.environ['WEBHOOK_PUBLIC_URL'].rstrip('/')}/worker/{index}"
+        env["WEBHOOK_HOST"] = "127.0.0.1"
+        env["WEBHOOK_PORT"] = "0"
+    return env
+
+
+def run_worker(db_path: str,
+               queue_options: Dict[str, Any],
+               concurrency: int,
+               stop,
+               index: int = 0,
+               webhook_ports=None) -> None:
+    """
+    Entry point of worker process ``index``: serve the queue until ``stop`` is set.
+    The port of its webhook receiver, if any, is published in ``webhook_ports``.
+    """
+    # The parent handles SIGINT and drains; workers stop when told to.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.update(worker_environment(index))
+    from tools.common.job_store import JobStore
+    from tools.common.result_cache import ResultCache
+    from tools.common.webhook import default_webhook_receiver
+    from tools.image2video.image2video_converter import Image2VideoConverter
+
+    queue = JobQueue(db_path, **queue_options)
+    # Provider jobs are recorded next to the queue, so a job re-leased after its
+    # worker died is reattached to instead of paid for again.
+    job_store = JobStore.from_env() or JobStore(os.path.join(os.path.dirname(queue.db_path), "jobs.db"))
+    converter = Image2VideoConverter(cache=ResultCache.from_env(), job_store=job_store)
+    receiver = default_webhook_receiver()
+    if receiver is not None and webhook_ports is not None:
+        webhook_ports[index] = receiver.port
+    QueueWorker(queue, converter, concurrency).run(stop)
+
+
+class JobServer:
+    """
+    HTTP/JSON front end of a JobQueue plus a pool of worker processes.
+
+        POST   /jobs              {"image" or "image_base64", "filename", "prompt", "model", "priority", "tenant"}
+        GET    /jobs/<id>         status, stage and queue position
+        GET    /jobs/<id>/result  the video, once the job succeeded
+        DELETE /jobs/<id>         cancel
+        GET    /health            queue counts, workers alive, draining
+
+    ``image`` is an http(s) URL or the name of a file in ``<data_dir>/inputs``; any
+    other image is uploaded inline as ``image_base64``. The tenant may also be sent
+    in an ``X-Tenant`` header. Submissions are refused
+    with 429 and Retry-After when the queue is full, and with 503 while draining.
+    Several nodes can share one queue by pointing at the same database file; their
+    data directories must then be shared too, so any node can read inputs and
+    serve results.
+    """
+
+    def __init__(self,
+                 queue: JobQueue,
+                 data_dir: str = "output/server",
+                 host: str = "127.0.0.1",
+                 port: int = 8080,
+                 workers: int = 2,
+                 concurrency: int = 8,
+                 default_model: str = Image2VideoModelType.REPLICATE.value):
+        """
+        :param queue: Queue the jobs are kept in.
+        :param data_dir: Directory for uploaded images and generated videos.
+        :param host: Interface to bind.
+        :param port: Port to bind; 0 picks a free one.
+        :param workers: Worker processes to start; 0 runs the API only.
+        :param concurrency: Jobs each worker process runs at once.
+        :param default_model: Model for jobs that do not name one.
+        """
+        self.logger = default_logger
+        self.queue = queue
+        self.data_dir = data_dir
+        self.workers = workers
+        self.concurrency = concurrency
+        self.default_model = default_model
+        self.models = model_names()
+        self.draining = False
+        os.makedirs(os.path.join(data_dir, "inputs"), exist_ok=True)
+        os.makedirs(os.path.join(data_dir, "outputs"), exist_ok=True)
+        # Spawned rather than forked, so workers do not inherit this process's threads.
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+        # Filled in by the workers with the local ports of their webhook receivers.
+        self._webhook_ports = self._context.Array("i", max(workers, 1), lock=False)
+        self._relay = None
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "JobServer":
+        queue_options = {
+            "lease_seconds": self.queue.lease_seconds,
+            "max_attempts": self.queue.max_attempts,
+            "max_queued": self.queue.max_queued,
+            "max_queued_per_tenant": self.queue.max_queued_per_tenant,
+        }
+        if self.workers:
+            self._start_shared_listeners()
+        for index in range(self.workers):
+            process = self._context.Process(
+                target=run_worker,
+                args=(self.queue.db_path, queue_options, self.concurrency, self._stop, index, self._webhook_ports),
+                name=f"job-worker-{index}",
+            )
+            process.start()
+            self._processes.append(process)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="job-server", daemon=True)
+            self._thread.start()
+        self.logger.info(f"Job server listening on port {self.port} with {self.workers} worker processes")
+        return self
+
+    def _start_shared_listeners(self) -> None:
+        """Listeners on fixed ports run once, here, instead of in every worker."""
+        if os.getenv("STAGING_PUBLIC_URL"):
+            from tools.common.staging import default_stager
+            default_stager()
+        if os.getenv("WEBHOOK_PUBLIC_URL") and self._relay is None:
+            from tools.common.webhook import WebhookRelay
+            self._relay = WebhookRelay(self._webhook_ports, port=int(os.getenv("WEBHOOK_PORT", "8765"))).start()
+
+    def drain(self, timeout: float = 900) -> None:
+        """
+        Stop accepting jobs, let the workers finish the ones they are running, then
+        stop. Workers still busy after ``timeout`` seconds are terminated; their
+        leases expire and the jobs are picked up by another node.
+        """
+        self.draining = True
+        self._stop.set()
+        self.logger.info(f"Draining: waiting up to {timeout:.0f}s for running jobs")
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.error(f"Worker {process.name} did not finish in time, terminating it")
+                process.terminate()
+                process.join()
+        if self._relay is not None:
+            self._relay.stop()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self, drain_timeout: float = 900) -> None:
+        """Run until SIGTERM or SIGINT, then drain."""
+        stopping = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stopping.set())
+        self.start()
+        stopping.wait()
+        self.drain(drain_timeout)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "workers_alive": sum(process.is_alive() for process in self._processes),
+            **self.queue.stats(),
+        }
+
+    def _input_path(self, name: str) -> str:
+        """
+        Resolve an image path from a request inside ``<data_dir>/inputs``. Anything
+        else on this machine is off limits: workers would read, upload or publish it.
+        """
+        inputs = os.path.realpath(os.path.join(self.data_dir, "inputs"))
+        path = os.path.realpath(os.path.join(inputs, name))
+        if os.path.commonpath([inputs, path]) != inputs:
+            raise ValueError(f"image must be a URL or a file in {inputs}: {name}")
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            raise ValueError(f"image must be one of {', '.join(IMAGE_EXTENSIONS)}: {name}")
+        if not os.path.isfile(path):
+            raise ValueError(f"image not found: {name}")
+        return path
+
+    def submit(self, body: Dict[str, Any], tenant: str) -> Dict[str, Any]:
+        """Queue a job from a request body; raises ValueError for invalid requests."""
+        model = str(body.get("model") or self.default_model)
+        if model not in self.models:
+            raise ValueError(f"unknown model {model!r}, expected one of {', '.join(self.models)}")
+        job_id = uuid.uuid4().hex
+        image = body.get("image")
+        uploaded = None
+        if body.get("image_base64"):
+            extension = os.path.splitext(str(body.get("filename") or "image.jpg"))[1].lower()
+            if extension not in IMAGE_EXTENSIONS:
+                raise ValueError(f"filename must end in one of {', '.join(IMAGE_EXTENSIONS)}")
+            data = base64.b64decode(body["image_base64"], validate=True)
+            image = uploaded = os.path.abspath(os.path.join(self.data_dir, "inputs", f"{job_id}{extension}"))
+            with open(image, "wb") as f:
+                f.write(data)
+        elif not image or not isinstance(image, str):
+            raise ValueError("image or image_base64 is required")
+        elif not image.startswith(("http://", "https://")):
+            image = self._input_path(image)
+        output_path = os.path.abspath(os.path.join(self.data_dir, "outputs", f"{job_id}.mp4"))
+        try:
+            self.queue.submit(
+                image,
+                str(body.get("prompt") or ""),
+                model,
+                output_path,
+                tenant=tenant,
+                priority=int(body.get("priority") or 0),
+                job_id=job_id,
+            )
+        except Exception:
+            # The job was refused, e.g. with QueueFullError, so nothing will read its image.
+            if uploaded is not None:
+                os.remove(uploaded)
+            raise
+        return {"id": job_id, "state": QueueState.QUEUED.value}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _job_path(self) -> List[str]:
+                return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+            def do_POST(self):
+                parts = self._job_path()
+                if parts == ["jobs"]:
+                    return self._submit()
+                if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                    return self._cancel(parts[1])
+                self._json(404, {"error": "not found"})
+
+            def do_DELETE(self):
+                parts = self._job_path()
+                if len(parts) == 2 and parts[0] == "jobs":
+                    return self._cancel(parts[1])
+                self._json(404, {"error": "not found"})
+
+            def do_GET(self):
+                parts = self._job_path()
+                if parts == ["health"]:
+                    return self._json(200, server.health())
+                if len(parts) >= 2 and parts[0] == "jobs":
+                    job = server.queue.get(parts[1])
+                    if job is None:
+                        return self._json(404, {"error": "job not found"})
+                    if len(parts) == 2:
+                        return self._json(200, {**job.as_dict(), "position": server.queue.position(job.id)})
+                    if parts[2:] == ["result"]:
+                        return self._result(job)
+                self._json(404, {"error": "not found"})
+
+            def _submit(self) -> None:
+                if server.draining:
+                    return self._json(503, {"error": "draining"}, {"Retry-After": "30"})
+                length = int(self.headers.get("Content-Length", 0))
+                if length > MAX_BODY_BYTES:
+                    return self._json(413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"})
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    tenant = self.headers.get("X-Tenant") or body.get("tenant") or "default"
+                    job = server.submit(body, str(tenant))
+                except QueueFullError as e:
+                    return self._json(429, {"error": str(e)}, {"Retry-After": str(int(e.retry_after))})
+                except (ValueError, TypeError, AttributeError) as e:
+                    return self._json(400, {"error": str(e)})
+                self._json(202, job, {"Location": f"/jobs/{job['id']}"})
+
+            def _cancel(self, job_id: str) -> None:
+                if server.queue.get(job_id) is None:
+                    return self._json(404, {"error": "job not found"})
+                self._json(200, {"id": job_id, "cancelled": server.queue.cancel(job_id)})
+
+            def _result(self, job: QueuedJob) -> None:
+                if job.state not in FINAL_STATES:
+                    return self._json(409, {"error": "job not finished", "state": job.state.value},
+                                      {"Retry-After": "5"})
+                if job.state != QueueState.SUCCEEDED or not os.path.exists(job.output_path):
+                    return self._json(410, {"error": job.error or "no result", "state": job.state.value})
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(os.path.getsize(job.output_path)))
+                self.end_headers()
+                with open(job.output_path, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@click.command()
+@click.option("--db", default="~/.cache/tools/queue.db", show_default=True,
+              help="SQLite queue; nodes sharing this file share the queue.")
+@click.option("--data_dir", default="output/server", show_default=True, help="Uploaded images and generated videos.")
+@click.option("--host", default="127.0.0.1", show_default=True, help="Interface to bind.")
+@click.option("--port", default=8080, show_default=True, type=int, help="Port to bind.")
+@click.option("--workers", "-w", default=2, show_default=True, type=int,
+              help="Worker processes; 0 serves the API only.")
+@click.option("--concurrency", "-c", default=8, show_default=True, type=int, help="Jobs per worker process.")
+@click.option("--max_queued", default=10000, show_default=True, type=int,
+              help="Queued jobs beyond which submissions get 429.")
+@click.option("--max_queued_per_tenant", default=None, type=int, help="Queued jobs one tenant may have.")
+@click.option("--lease_seconds", default=60.0, show_default=True, type=float,
+              help="Seconds before a silent worker's job is handed to another.")
+@click.option("--drain_timeout", default=900.0, show_default=True, type=float,
+              help="Seconds to wait for running jobs on shutdown.")
+@click.option("--model", "-m", default=Image2VideoModelType.REPLICATE.value, show_default=True,
+              callback=validate_model, help="Model for jobs that do not name one.")
+def main(db: str, data_dir: str, host: str, port: int, workers: int, concurrency: int, max_queued: int,
+         max_queued_per_tenant: Optional[int], lease_seconds: float, drain_timeout: float, model: str):
+    """
+    Serve image-to-video jobs over HTTP/JSON from a shared queue and a pool of worker processes.
+    """
+    queue = JobQueue(db, lease_seconds=lease_seconds, max_queued=max_queued,
+                     max_queued_per_tenant=max_queued_per_tenant)
+    JobServer(queue, data_dir, host, port, workers, concurrency, model).serve_forever(drain_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import click
+
+from tools.common.logging import default_logger, log_context
+from tools.common.video import concat_videos, extract_last_frame
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image2video_models import ConversionStage, Image2VideoModelType
+from tools.image2video.provider_registry import validate_provider
+
+
+class Storyboard:
+    """
+    One long video: a start image and the prompt of each clip, in order.
+
+    Parameters:
+        image_path: Start image of the first clip.
+        prompts: One prompt per clip; blank prompts are captioned from the clip's
+            start frame.
+        output_path: Where the joined video is saved.
+        model: A provider, not "Fastest" or "Auto". Every clip uses the same
+            provider so the clips can be joined without re-encoding.
+    """
+
+    # Let every clip pick its provider, so their formats may differ.
+    ROUTED_MODELS = (Image2VideoModelType.AUTO.value, Image2VideoModelType.FASTEST.value)
+
+    def __init__(self, image_path: str, prompts: List[str], output_path: str, model: str):
+        if model in self.ROUTED_MODELS:
+            raise ValueError(f"Storyboard for {output_path} needs a single provider, not {model}")
+        self.image_path = image_path
+        self.prompts = prompts
+        self.output_path = output_path
+        self.model = model
+
+
+class LongVideoGenerator:
+    """
+    Makes videos longer than one provider clip by chaining clips: the last frame of
+    each clip is the start image of the next, and the clips are joined by stream
+    copy at the end.
+
+    Clips of one storyboard depend on each other and run one after another, each
+    submitted as soon as the previous one's last frame is out. Independent
+    storyboards run in parallel.
+    """
+
+    def __init__(self,
+                 converter: Optional[Image2VideoConverter] = None,
+                 work_dir: Optional[str] = None,
+                 max_workers: int = 4):
+        """
+        :param converter: Converter that generates each clip; with a ResultCache,
+            re-running a storyboard reuses the clips that already succeeded.
+        :param work_dir: Directory for clips and frames; a temporary one by default.
+        :param max_workers: Storyboards generated at once by ``generate_many``.
+        """
+        self.logger = default_logger
+        self.converter = converter or Image2VideoConverter()
+        self.work_dir = work_dir
+        self.max_workers = max_workers
+
+    def generate(self,
+                 storyboard: Storyboard,
+                 on_status: Optional[Callable[[int, ConversionStage], None]] = None) -> bool:
+        """
+        Generate every clip of ``storyboard`` and join them into its output video.
+
+        Parameters:
+            storyboard (Storyboard): What to generate.
+            on_status (Callable): Optional callback receiving the clip index and each
+                ConversionStage that clip goes through.
+
+        Returns:
+            bool: True if the joined video was written.
+        """
+        if not storyboard.prompts:
+            self.logger.error(f"Storyboard for {storyboard.output_path} has no prompts")
+            return False
+        work_dir = tempfile.mkdtemp(prefix="long-video-", dir=self.work_dir)
+        try:
+            with log_context(storyboard=os.path.basename(storyboard.output_path)):
+                clips = self._generate_clips(storyboard, work_dir, on_status)
+                if clips is None:
+                    return False
+                started = time.monotonic()
+                concat_videos(clips, storyboard.output_path)
+                self.logger.debug(
+                    f"Joined {len(clips)} clips into {storyboard.output_path} "
+                    f"in {time.monotonic() - started:.2f}s"
+                )
+                return True
+        except Exception as e:
+            self.logger.error(f"Failed to generate long video {storyboard.output_path}, error: {e}")
+            return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _generate_clips(self,
+                        storyboard: Storyboard,
+                        work_dir: str,
+                        on_status: Optional[Callable[[int, ConversionStage], None]]) -> Optional[List[str]]:
+        clips = []
+        start_image = storyboard.image_path
+        for index, prompt in enumerate(storyboard.prompts):
+            if index and not self.converter.accepts(storyboard.model, start_image):
+                self.logger.error(f"{storyboard.model} needs STAGING_PUBLIC_URL to start a clip from a local frame")
+                return None
+            clip_path = os.path.join(work_dir, f"clip-{index:03d}.mp4")
+            report = None
+            if on_status is not None:
+                report = lambda stage, index=index: on_status(index, stage)
+            result = self.converter.convert(start_image, prompt, clip_path, storyboard.model, report)
+            if result.error is not None:
+                self.logger.error(
+                    f"Clip {index + 1} of {len(storyboard.prompts)} was not generated, error: {result.error}"
+                )
+                return None
+            clips.append(clip_path)
+            if index < len(storyboard.prompts) - 1:
+                start_image = os.path.join(work_dir, f"frame-{index:03d}.jpg")
+                extract_last_frame(clip_path, start_image)
+        return clips
+
+    def generate_many(self, storyboards: List[Storyboard]) -> Dict[str, bool]:
+        """
+        Generate independent storyboards in parallel.
+
+        Returns:
+            Dict[str, bool]: Whether each output path was written.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="long-video") as executor:
+            results = executor.map(self.generate, storyboards)
+            return {storyboard.output_path: result for storyboard, result in zip(storyboards, results)}
+
+
+def load_storyboards(path: str, model: str) -> List[Storyboard]:
+    """
+    Read storyboards from a JSONL file of {"image", "prompts", "output", "model"}
+    rows; ``model`` is optional and falls back to the command-line default. Raises
+    ValueError for a row whose model is "Fastest" or "Auto".
+    """
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [Storyboard(row["image"], row["prompts"], row["output"], row.get("model") or model) for row in rows]
+
+
+@click.command()
+@click.option("--image", "-i", default=None, type=click.Path(exists=True), help="Start image of the first clip.")
+@click.option("--prompt", "-p", "prompts", multiple=True,
+              help="Prompt of the next clip; repeat once per clip.")
+@click.option("--clips", "-n", default=None, type=int,
+              help="Number of clips when one prompt is given for all of them.")
+@click.option("--output", "-o", default="output/long-video.mp4", show_default=True, help="Joined video.")
+@click.option("--storyboards", "-s", default=None, type=click.Path(exists=True),
+              help="JSONL of storyboards to generate in parallel instead of --image/--prompt.")
+@click.option("--model", "-m", default=Image2VideoModelType.REPLICATE.value, show_default=True,
+              callback=validate_provider, help="Provider for every clip.")
+@click.option("--workers", "-w", default=4, show_default=True, type=int, help="Storyboards generated at once.")
+def main(image: Optional[str], prompts: List[str], clips: Optional[int], output: str,
+         storyboards: Optional[str], model: str, workers: int):
+    """
+    Generate videos longer than one clip by chaining clips from each clip's last frame.
+    """
+    if storyboards:
+        try:
+            boards = load_storyboards(storyboards, model)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+    elif image:
+        prompts = list(prompts) or [""]
+        if clips and len(prompts) == 1:
+            prompts = prompts * clips
+        boards = [Storyboard(image, prompts, output, model)]
+    else:
+        raise click.UsageError("Pass --image or --storyboards")
+    generator = LongVideoGenerator(max_workers=workers)
+    click.echo(json.dumps(generator.generate_many(boards)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Tuple
+
+from tools.common.logging import default_logger
+from tools.common.result_cache import hash_file
+
+
+def _is_url(image_path: str) -> bool:
+    return image_path.startswith(("http://", "https://"))
+
+
+class PromptCaptioner:
+    """
+    Writes prompts for jobs submitted without one by captioning the start image.
+
+    Captions are generated on a small thread pool, so a job can start captioning
+    as soon as it arrives and collect the result only when it is ready to submit,
+    after preprocessing. They are memoized by image content hash (or URL), and an
+    image that is already being captioned is not captioned twice. The
+    ``max_entries`` most recently used images are remembered.
+    """
+
+    def __init__(self, caption: Callable[[str], str], max_workers: int = 4, max_entries: int = 10000):
+        """
+        :param caption: Returns a caption for an image path or URL, or "" on failure,
+            e.g. ``ReplicateClient.image2text``.
+        :param max_workers: Images captioned concurrently.
+        :param max_entries: Captions kept, by path and by content each.
+        """
+        self.logger = default_logger
+        self._caption = caption
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="caption")
+        self._by_path: "OrderedDict[Tuple[str, int, float], Future]" = OrderedDict()
+        self._by_hash: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, entries: OrderedDict, key, future: Future) -> None:
+        # Called with the lock held.
+        entries[key] = future
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def submit(self, image_path: str) -> Future:
+        """Start captioning ``image_path`` if needed; the Future resolves to the caption."""
+        key = (image_path, 0, 0.0)
+        if not _is_url(image_path):
+            stat = os.stat(image_path)
+            key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            future = self._by_path.get(key)
+            if future is None:
+                future = self._executor.submit(self._run, image_path, key)
+            self._remember(self._by_path, key, future)
+            return future
+
+    def caption(self, image_path: str) -> str:
+        """Caption for ``image_path``, waiting for it if it is still being generated."""
+        return self.submit(image_path).result()
+
+    def caption_many(self, image_paths: Iterable[str]) -> Dict[str, str]:
+        """Caption many images concurrently and return each path's caption."""
+        futures = {image_path: self.submit(image_path) for image_path in image_paths}
+        return {image_path: future.result() for image_path, future in futures.items()}
+
+    def _run(self, image_path: str, path_key: Tuple[str, int, float]) -> str:
+        content_hash = image_path if _is_url(image_path) else hash_file(image_path)
+        with self._lock:
+            future = self._by_hash.get(content_hash)
+            owner = future is None
+            if owner:
+                future = Future()
+            self._remember(self._by_hash, content_hash, future)
+
+        if owner:
+            caption = ""
+            try:
+                caption = (self._caption(image_path) or "").strip()
+            except Exception as e:
+                self.logger.error(f"Failed to caption image: {image_path}, error: {e}")
+            if caption:
+                self.logger.debug(f"Generated prompt for {image_path}: {caption}")
+            future.set_result(caption)
+        else:
+            caption = future.result()
+
+        if not caption:
+            # Let a later job try again rather than remembering the failure.
+            with self._lock:
+                if self._by_hash.get(content_hash) is future:
+                    del self._by_hash[content_hash]
+                self._by_path.pop(path_key, None)
+        return caption
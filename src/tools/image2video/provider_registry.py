@@ -0,0 +1,131 @@
+import importlib
+import threading
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import click
+
+from tools.common.logging import default_logger
+from tools.image2video.image2video_models import Image2VideoModelType
+
+# Entry point group third-party packages register their providers under.
+ENTRY_POINT_GROUP = "tools.image2video.providers"
+
+# Built-in providers as "module:attribute" references, so that neither the client
+# modules nor their SDKs are imported until a provider is first used.
+BUILTIN_PROVIDERS: Dict[str, str] = {
+    Image2VideoModelType.PIAPI.value: "tools.api.piapi.piapi_client:PiAPIClient",
+    Image2VideoModelType.REPLICATE.value: "tools.api.replicate.replicate_client:ReplicateClient",
+    Image2VideoModelType.STABILITY.value: "tools.api.stabilityai.stability_ai_client:StabilityAIClient",
+}
+
+
+def load_reference(reference: str) -> Any:
+    """Import and return the object named by a "module:attribute" reference."""
+    module_name, _, attribute = reference.partition(":")
+    obj = importlib.import_module(module_name)
+    for name in attribute.split(".") if attribute else []:
+        obj = getattr(obj, name)
+    return obj
+
+
+class ProviderRegistry:
+    """
+    Image2video provider clients keyed by model type, imported and constructed on
+    first use.
+
+    Besides the built-in providers, other packages can add their own by declaring an
+    entry point in the ``tools.image2video.providers`` group, e.g. in pyproject.toml:
+
+        [project.entry-points."tools.image2video.providers"]
+        MyProvider = "my_package.client:MyClient"
+
+    A provider factory is called with the keyword arguments ``options`` returns for
+    its name (at least ``transport``) and must return a client with the same
+    interface as the built-in ones: ``submit_image2video``, ``watch_image2video``,
+    ``download_image2video`` and ``cancel``.
+    """
+
+    def __init__(self, options: Optional[Callable[[str], Dict[str, Any]]] = None):
+        """
+        :param options: Returns the constructor keyword arguments for a provider name.
+        """
+        self.logger = default_logger
+        self.options = options or (lambda name: {})
+        self._factories: Dict[str, Union[str, Callable[..., Any]]] = dict(BUILTIN_PROVIDERS)
+        self._clients: Dict[str, Any] = {}
+        self._entry_points_loaded = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Union[str, Callable[..., Any]]) -> None:
+        """Register a provider under ``name``, as a factory or a "module:attribute" reference."""
+        with self._lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+
+    def _load_entry_points(self) -> None:
+        # Scanning installed distributions is not free, so only do it when a name
+        # is not one of the providers we already know.
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+            self._factories.setdefault(entry_point.name, entry_point.value)
+
+    def names(self) -> List[str]:
+        """Names of every available provider, including those from entry points."""
+        with self._lock:
+            self._load_entry_points()
+            return list(self._factories)
+
+    def loaded(self) -> List[str]:
+        """Names of the providers whose clients have been constructed."""
+        with self._lock:
+            return list(self._clients)
+
+    def get(self, name: str) -> Optional[Any]:
+        """
+        Return the client for ``name``, importing and constructing it on first use.
+        Returns None if no such provider exists or it could not be loaded.
+        """
+        with self._lock:
+            if name in self._clients:
+                return self._clients[name]
+            if name not in self._factories:
+                self._load_entry_points()
+            factory = self._factories.get(name)
+            if factory is None:
+                return None
+            try:
+                if isinstance(factory, str):
+                    factory = load_reference(factory)
+                client = factory(**self.options(name))
+            except Exception as e:
+                self.logger.error(f"Failed to load provider {name}, error: {e}")
+                return None
+            self._clients[name] = client
+            return client
+
+
+def model_names(registry: Optional[ProviderRegistry] = None) -> List[str]:
+    """
+    Every model ``Image2VideoConverter.convert`` accepts: the providers, including
+    plugins, plus "Fastest" and "Auto".
+    """
+    names = (registry or ProviderRegistry()).names()
+    return names + [m.value for m in (Image2VideoModelType.FASTEST, Image2VideoModelType.AUTO) if m.value not in names]
+
+
+def validate_model(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[str]:
+    """Click callback rejecting a ``--model`` that is neither a provider nor "Fastest"/"Auto"."""
+    if value is not None and value not in model_names():
+        raise click.BadParameter(f"{value!r} is not one of {', '.join(model_names())}")
+    return value
+
+
+def validate_provider(ctx: click.Context, param: click.Parameter, value: Optional[str]) -> Optional[str]:
+    """Click callback rejecting a ``--model`` that is not a single provider, e.g. "Fastest" or "Auto"."""
+    names = ProviderRegistry().names()
+    if value is not None and value not in names:
+        raise click.BadParameter(f"{value!r} is not one of {', '.join(names)}")
+    return value
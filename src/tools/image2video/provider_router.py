@@ -0,0 +1,220 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+from tools.common.errors import DeadlineExceeded
+from tools.common.logging import default_logger
+from tools.common.poller import TaskStatus
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. ``acquire`` blocks until a token is available;
+    ``defer`` empties the bucket and blocks everyone for a while, e.g. after a 429.
+    A rate of zero or less turns the rate limit off; ``defer`` still applies.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: Tokens added per second, or 0 for no limit.
+        :param burst: Maximum number of tokens the bucket holds, at least 1.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate <= 0:
+            self._tokens = float(self.burst)
+        else:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token would be available, without taking one."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._tokens >= 1:
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def defer(self, seconds: float) -> None:
+        with self._lock:
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class ProviderLimits:
+    """
+    Quota for one provider.
+
+    Parameters:
+        rate: Submissions per second, or 0 for no limit.
+        burst: Submissions allowed back to back.
+        max_concurrency: Jobs allowed in flight at the provider at once.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5, max_concurrency: int = 16):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+
+
+class _ProviderState:
+    def __init__(self, limits: ProviderLimits, initial_generation: float):
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.slots = threading.BoundedSemaphore(limits.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.queue_wait = 0.0
+        self.generation = initial_generation
+        self.rate_limits = 0
+        self.rate_limited_at = 0.0
+
+
+class ProviderRouter:
+    """
+    Rate limits, caps and scores providers.
+
+    Every submission takes a concurrency slot and a token from the provider's
+    bucket. 429s push the bucket back by the provider's Retry-After, or, without
+    one, by a pause that doubles with each 429 in a row. Completed jobs
+    update moving averages of queue wait and generation time, from which
+    ``choose`` picks the provider expected to finish a new job soonest.
+    """
+
+    # Pause after a 429 without Retry-After, doubled per 429 in a row up to the
+    # maximum; a 429 more than RATE_LIMIT_RESET_SECONDS after the last starts over.
+    MIN_RATE_LIMIT_PAUSE = 0.5
+    MAX_RATE_LIMIT_PAUSE = 30.0
+    RATE_LIMIT_RESET_SECONDS = 60.0
+
+    def __init__(self,
+                 limits: Optional[Dict[str, ProviderLimits]] = None,
+                 alpha: float = 0.2,
+                 initial_generation: float = 120.0):
+        self.logger = default_logger
+        self.alpha = alpha
+        self.initial_generation = initial_generation
+        self._limits = limits or {}
+        self._states: Dict[str, _ProviderState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, provider: str) -> _ProviderState:
+        with self._lock:
+            if provider not in self._states:
+                limits = self._limits.get(provider, ProviderLimits())
+                self._states[provider] = _ProviderState(limits, self.initial_generation)
+            return self._states[provider]
+
+    @contextmanager
+    def slot(self, provider: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold one of the provider's concurrency slots for the life of a job. Raises
+        DeadlineExceeded if none frees up within ``timeout`` seconds.
+        """
+        state = self._state(provider)
+        # Count the job while it waits so ``choose`` sees the local queue, not just
+        # the jobs that already hold a slot.
+        with self._lock:
+            state.waiting += 1
+        acquired = False
+        try:
+            acquired = state.slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                state.waiting -= 1
+                if acquired:
+                    state.in_flight += 1
+        if not acquired:
+            raise DeadlineExceeded(provider, f"no free slot within {timeout:.0f}s", "queue")
+        try:
+            yield
+        finally:
+            with self._lock:
+                state.in_flight -= 1
+            state.slots.release()
+
+    def acquire_token(self, provider: str) -> None:
+        """Block until the provider's rate limit allows another submission."""
+        self._state(provider).bucket.acquire()
+
+    def rate_limited(self, provider: str, retry_after: Optional[float]) -> None:
+        """Pause submissions to ``provider`` after it answered 429."""
+        state = self._state(provider)
+        with self._lock:
+            now = time.monotonic()
+            if now - state.rate_limited_at > self.RATE_LIMIT_RESET_SECONDS:
+                state.rate_limits = 0
+            state.rate_limits += 1
+            state.rate_limited_at = now
+            streak = state.rate_limits
+        seconds = retry_after
+        if seconds is None:
+            seconds = min(self.MAX_RATE_LIMIT_PAUSE, self.MIN_RATE_LIMIT_PAUSE * 2 ** (streak - 1))
+        self.logger.debug(f"{provider} is rate limiting us, pausing submissions for {seconds}s")
+        state.bucket.defer(seconds)
+
+    def observe(self, provider: str, status: TaskStatus) -> None:
+        """Fold a finished job's queue wait and generation time into the averages."""
+        if status.elapsed is None:
+            return
+        state = self._state(provider)
+        queue_wait = status.queue_seconds or 0.0
+        with self._lock:
+            state.queue_wait += self.alpha * (queue_wait - state.queue_wait)
+            state.generation += self.alpha * ((status.elapsed - queue_wait) - state.generation)
+
+    def expected_seconds(self, provider: str) -> float:
+        """Expected time for a job submitted now to finish at ``provider``."""
+        state = self._state(provider)
+        with self._lock:
+            per_job = state.queue_wait + state.generation
+            # Jobs beyond the concurrency cap wait locally for a slot to free up.
+            queued = state.in_flight + state.waiting
+            backlog = max(0, queued + 1 - state.limits.max_concurrency)
+            local_wait = backlog / state.limits.max_concurrency * per_job
+        return state.bucket.delay() + local_wait + per_job
+
+    def choose(self, providers: Iterable[str]) -> str:
+        """Pick the provider expected to finish soonest; ties go to the earlier one."""
+        providers = list(providers)
+        estimates = {provider: self.expected_seconds(provider) for provider in providers}
+        chosen = min(providers, key=lambda provider: estimates[provider])
+        self.logger.debug(f"Routing to {chosen}, estimates: {estimates}")
+        return chosen
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            states = dict(self._states)
+        return {
+            provider: {
+                "in_flight": state.in_flight,
+                "waiting": state.waiting,
+                "queue_wait": round(state.queue_wait, 2),
+                "generation": round(state.generation, 2),
+            }
+            for provider, state in states.items()
+        }
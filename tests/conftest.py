@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from tools.benchmark.fake_providers import FakeBehavior, FakeProviderServer
+from tools.common.poller import AdaptiveBackoff, set_backoff
+
+
+def fast_behavior(**overrides) -> FakeBehavior:
+    """Tasks that finish within a fraction of a second, with small videos."""
+    options = dict(queue_seconds=(0.0, 0.0), generation_seconds=(0.2, 0.2), video_bytes=1000, request_latency=0.0)
+    options.update(overrides)
+    return FakeBehavior(**options)
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = FakeProviderServer(fast_behavior()).start()
+    for key, value in server.env().items():
+        monkeypatch.setenv(key, value)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fast_polling():
+    """Poll the test providers every few hundredths of a second."""
+    for provider in ("PiAPI", "Replicate", "Stability", "test"):
+        set_backoff(provider, AdaptiveBackoff(min_interval=0.02, max_interval=0.05, initial_estimate=0.1, jitter=0.0))
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def wait_for():
+    """Wait until a condition holds, failing the test after a few seconds."""
+    return _wait_for
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from tools.benchmark.fake_providers import FakeBehavior, FakeProviderServer
+
+from tools.common.errors import CircuitOpenError, Deadline, DeadlineExceeded, PermanentError
+from tools.common.resilience import circuit_breaker
+from tools.image2video.async_image2video_converter import AsyncImage2VideoConverter
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = str(tmp_path / "start.jpg")
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(path, "JPEG")
+    return path
+
+
+def _convert_many(jobs):
+    async def run():
+        async with AsyncImage2VideoConverter() as converter:
+            return await converter.convert_many(jobs)
+
+    return asyncio.run(run())
+
+
+def _convert(*args, **kwargs):
+    async def run():
+        async with AsyncImage2VideoConverter(**kwargs) as converter:
+            return await converter.convert(*args)
+
+    return asyncio.run(run())
+
+
+def _jobs(fake_server, image, tmp_path):
+    return [
+        (fake_server.image_url(), "a cat", str(tmp_path / "piapi.mp4"), "PiAPI"),
+        (image, "a cat", str(tmp_path / "replicate.mp4"), "Replicate"),
+        (image, "a cat", str(tmp_path / "stability.mp4"), "Stability"),
+    ]
+
+
+def test_convert_many_returns_a_result_per_job(fake_server, image, tmp_path, fast_polling):
+    jobs = _jobs(fake_server, image, tmp_path)
+    results = _convert_many(jobs)
+    assert [result.provider for result in results] == ["PiAPI", "Replicate", "Stability"]
+    assert all(result.succeeded for result in results), results
+    for result in results:
+        with open(result.output_path, "rb") as f:
+            assert len(f.read()) == fake_server.behavior.video_bytes
+    # Uploads, status checks and downloads all went to the same server through one pool.
+    assert fake_server.stats()["requests"]["Replicate files"] == 1
+
+
+def test_failed_jobs_are_reported(fake_server, image, tmp_path, fast_polling):
+    fake_server.behavior.failure_rate = 1.0
+    results = _convert_many(_jobs(fake_server, image, tmp_path) + [(image, "a cat", str(tmp_path / "x.mp4"), "Nope")])
+    assert [result.succeeded for result in results] == [False] * 4
+    assert isinstance(results[-1].error, PermanentError)
+
+
+def test_rate_limited_submissions_are_retried(monkeypatch, image, tmp_path, fast_polling):
+    server = FakeProviderServer(FakeBehavior(
+        queue_seconds=(0.0, 0.0), generation_seconds=(0.2, 0.2), video_bytes=1000, request_latency=0.0,
+        rate_limit_rate=0.3, retry_after=0.05, seed=1,
+    )).start()
+    try:
+        for key, value in server.env().items():
+            monkeypatch.setenv(key, value)
+        results = _convert_many([(image, "a cat", str(tmp_path / f"{i}.mp4"), "Replicate") for i in range(6)])
+        assert all(result.succeeded for result in results), results
+        assert server.stats()["rate_limited"] > 0
+    finally:
+        server.stop()
+
+
+def test_task_still_running_at_the_deadline_is_cancelled(fake_server, image, tmp_path, fast_polling):
+    fake_server.behavior.generation_seconds = (30.0, 30.0)
+    result = _convert(image, "a cat", str(tmp_path / "out.mp4"), "Replicate", Deadline(0.5))
+    assert isinstance(result.error, DeadlineExceeded)
+    assert [task.state() for task in fake_server._tasks.values()] == ["canceled"]
+
+
+def test_waiting_for_a_slot_stops_at_the_deadline(fake_server, image, tmp_path, fast_polling):
+    fake_server.behavior.generation_seconds = (30.0, 30.0)
+
+    async def run():
+        async with AsyncImage2VideoConverter(max_concurrency={"Replicate": 1}) as converter:
+            return await converter.convert_many([
+                (image, "a cat", str(tmp_path / f"{i}.mp4"), "Replicate", Deadline(0.5)) for i in range(2)
+            ])
+
+    results = asyncio.run(run())
+    assert all(isinstance(result.error, DeadlineExceeded) for result in results)
+    assert sorted(result.error.stage for result in results) == ["poll", "queue"]
+
+
+def test_open_circuit_fails_fast_without_submitting(fake_server, image, tmp_path, fast_polling):
+    breaker = circuit_breaker("Replicate")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    try:
+        result = _convert(image, "a cat", str(tmp_path / "out.mp4"), "Replicate")
+    finally:
+        breaker.record_success()
+    assert isinstance(result.error, CircuitOpenError)
+    assert "Replicate POST" not in fake_server.stats()["requests"]
@@ -0,0 +1,59 @@
+from tools.common.audio import merge_transcripts, plan_chunks
+
+
+def test_plan_chunks_cuts_in_silences():
+    chunks = plan_chunks(1500, [(590, 596), (1150, 1152)])
+    assert chunks == [(0.0, 598.0), (593.0, 1156.0), (1151.0, 1500)]
+
+
+def test_plan_chunks_cuts_at_target_without_silence():
+    assert plan_chunks(100, [], chunk_seconds=30) == [(0.0, 35.0), (30.0, 65.0), (60.0, 95.0), (90.0, 100)]
+
+
+def test_plan_chunks_short_audio_is_one_chunk():
+    assert plan_chunks(20, [(5, 6)], chunk_seconds=30) == [(0.0, 20)]
+
+
+def test_plan_chunks_never_cuts_at_chunk_start():
+    # The silence at 0.5s is the best cut for the first chunk and must not be
+    # picked again for the next one, which starts there.
+    chunks = plan_chunks(100, [(0, 1)], chunk_seconds=30)
+    assert chunks == [(0.0, 5.5), (0.5, 35.5), (30.5, 65.5), (60.5, 95.5), (90.5, 100)]
+    assert all(start < next_start for (start, _), (next_start, _) in zip(chunks, chunks[1:]))
+
+
+def test_merge_transcripts_offsets_timestamps():
+    results = [
+        ((0.0, 35.0), {"chunks": [{"timestamp": (0.0, 10.0), "text": " hello there"}]}),
+        ((30.0, 60.0), {"chunks": [{"timestamp": (5.0, 10.0), "text": " a bold one"}]}),
+    ]
+    assert merge_transcripts(results, overlap_seconds=5) == {
+        "text": "hello there a bold one",
+        "chunks": [{"timestamp": [0.0, 10.0], "text": "hello there"}, {"timestamp": [35.0, 40.0], "text": "a bold one"}],
+    }
+
+
+def test_merge_transcripts_drops_words_repeated_at_the_seam():
+    results = [
+        ((0.0, 35.0), {"chunks": [{"timestamp": (28.0, 33.0), "text": "general Kenobi."}]}),
+        ((30.0, 60.0), {"chunks": [{"timestamp": (1.0, 6.0), "text": "kenobi you are"}]}),
+    ]
+    merged = merge_transcripts(results, overlap_seconds=5)
+    assert merged["text"] == "general Kenobi. you are"
+    assert merged["chunks"][1]["timestamp"] == [31.0, 36.0]
+
+
+def test_merge_transcripts_drops_segments_already_covered():
+    results = [
+        ((0.0, 35.0), {"chunks": [{"timestamp": (28.0, 33.0), "text": "general kenobi"}]}),
+        ((30.0, 60.0), {"chunks": [{"timestamp": (0.0, 3.0), "text": "kenobi"}]}),
+    ]
+    assert merge_transcripts(results, overlap_seconds=5)["text"] == "general kenobi"
+
+
+def test_merge_transcripts_keeps_repeats_within_a_chunk():
+    results = [((0.0, 35.0), {"chunks": [
+        {"timestamp": (0.0, 1.0), "text": "no"},
+        {"timestamp": (1.0, 3.0), "text": "no no, that is wrong"},
+    ]})]
+    assert merge_transcripts(results, overlap_seconds=5)["text"] == "no no no, that is wrong"
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+import requests
+
+from tools.common.download import IncompleteDownloadError, async_download_file, download_file
+
+
+def _finished_task(server) -> str:
+    task = server._create("PiAPI")
+    task.finishes = task.starts
+    return task.id
+
+
+def _video_url(server, task_id: str) -> str:
+    return f"{server.url}/videos/{task_id}.mp4"
+
+
+def test_download_writes_the_whole_video(fake_server, tmp_path):
+    task_id = _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+    assert download_file(_video_url(fake_server, task_id), output) == 1000
+    assert open(output, "rb").read() == fake_server.video(task_id)
+    assert not os.path.exists(output + ".part")
+
+
+def test_download_resumes_after_cut_connections(fake_server, tmp_path):
+    fake_server.behavior.cut_after = 400
+    task_id = _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+    assert download_file(_video_url(fake_server, task_id), output) == 1000
+    assert open(output, "rb").read() == fake_server.video(task_id)
+    # 400 bytes per response: the first request and two ranged ones.
+    assert fake_server.stats()["requests"]["video"] == 3
+
+
+def test_async_download_resumes_after_cut_connections(fake_server, tmp_path):
+    fake_server.behavior.cut_after = 400
+    task_id = _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+
+    async def download():
+        async with httpx.AsyncClient() as client:
+            return await async_download_file(client, _video_url(fake_server, task_id), output)
+
+    assert asyncio.run(download()) == 1000
+    assert open(output, "rb").read() == fake_server.video(task_id)
+
+
+def test_failed_download_leaves_no_output_and_resumes_on_next_call(fake_server, tmp_path):
+    fake_server.behavior.cut_after = 400
+    task_id = _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+    with pytest.raises((requests.RequestException, IncompleteDownloadError)):
+        download_file(_video_url(fake_server, task_id), output, max_attempts=1)
+    assert not os.path.exists(output)
+    assert os.path.getsize(output + ".part") == 400
+
+    fake_server.behavior.cut_after = None
+    download_file(_video_url(fake_server, task_id), output, max_attempts=1)
+    assert open(output, "rb").read() == fake_server.video(task_id)
+
+
+def test_partial_of_another_url_is_discarded(fake_server, tmp_path):
+    other, task_id = _finished_task(fake_server), _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+    with open(output + ".part", "wb") as f:
+        f.write(fake_server.video(other)[:400])
+    with open(output + ".part.json", "w") as f:
+        json.dump({"url": _video_url(fake_server, other), "validator": None}, f)
+
+    download_file(_video_url(fake_server, task_id), output)
+    assert open(output, "rb").read() == fake_server.video(task_id)
+
+
+def test_changed_video_is_downloaded_whole_again(fake_server, tmp_path):
+    fake_server.behavior.cut_after = 400
+    task_id = _finished_task(fake_server)
+    output = str(tmp_path / "video.mp4")
+    with pytest.raises((requests.RequestException, IncompleteDownloadError)):
+        download_file(_video_url(fake_server, task_id), output, max_attempts=1)
+
+    # The ETag no longer matches If-Range, so the server answers with the new video.
+    fake_server.regenerate(task_id)
+    fake_server.behavior.cut_after = None
+    download_file(_video_url(fake_server, task_id), output, max_attempts=1)
+    assert open(output, "rb").read() == fake_server.video(task_id)
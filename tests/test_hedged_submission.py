@@ -0,0 +1,57 @@
+import pytest
+from PIL import Image
+
+from tools.image2video.hedged_submission import HedgePolicy, HedgedSubmitter
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image_preprocessor import ImagePreprocessor
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = str(tmp_path / "start.jpg")
+    Image.new("RGB", (1024, 576), (128, 128, 128)).save(path, "JPEG")
+    return path
+
+
+def _converter(tmp_path, policy):
+    return Image2VideoConverter(
+        hedge_policy=policy, preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed"))
+    )
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(fake_server, image, tmp_path, fast_polling):
+    fake_server.behavior.generation_seconds = (0.5, 0.5)
+    converter = _converter(tmp_path, HedgePolicy(["Stability", "Replicate"], hedge_after=0.1, hedge_percentile=None))
+    result = converter.convert(image, "a cat", str(tmp_path / "out.mp4"), "Fastest")
+    assert result.succeeded, result.error
+    # Both tasks take as long, so the one submitted first wins.
+    assert result.provider == "Stability"
+    stats = converter.hedger.stats.as_dict()
+    assert (stats["submissions"], stats["hedges"], stats["cancelled"]) == (2, 1, 1)
+    assert [task.state() for task in fake_server._tasks.values() if task.provider == "Replicate"] == ["canceled"]
+
+
+def test_fast_primary_is_not_hedged(fake_server, image, tmp_path, fast_polling):
+    converter = _converter(tmp_path, HedgePolicy(["Replicate", "Stability"], hedge_after=30, hedge_percentile=None))
+    result = converter.convert(image, "a cat", str(tmp_path / "out.mp4"), "Fastest")
+    assert result.succeeded, result.error
+    assert result.provider == "Replicate"
+    assert converter.hedger.stats.as_dict()["hedges"] == 0
+    assert "Stability POST" not in fake_server.stats()["requests"]
+
+
+def test_failed_submission_fails_over_to_the_next_provider(fake_server, image, tmp_path, fast_polling):
+    converter = _converter(tmp_path, HedgePolicy(["Nope", "Replicate"], hedge_after=30, hedge_percentile=None))
+    result = converter.convert(image, "a cat", str(tmp_path / "out.mp4"), "Fastest")
+    assert result.succeeded, result.error
+    assert result.provider == "Replicate"
+
+
+def test_hedge_delay_follows_the_percentile_once_there_are_enough_samples():
+    submitter = HedgedSubmitter(lambda provider: None, lambda image_path, provider: image_path,
+                                HedgePolicy(hedge_after=180, hedge_percentile=90, min_samples=10))
+    for duration in range(1, 10):
+        submitter._record_duration("a", duration)
+    assert submitter._hedge_delay("a") == 180
+    submitter._record_duration("a", 10)
+    assert submitter._hedge_delay("a") == 10
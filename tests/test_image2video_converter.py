@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from tools.common.errors import PermanentError
+from tools.common.result_cache import ResultCache
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image2video_models import ConversionStage
+from tools.image2video.image_preprocessor import ImagePreprocessor
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = str(tmp_path / "start.jpg")
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(path, "JPEG")
+    return path
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return Image2VideoConverter(preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed")))
+
+
+def _start_image(provider, fake_server, image):
+    # PiAPI fetches the start image itself, so it is given a URL.
+    return fake_server.image_url() if provider == "PiAPI" else image
+
+
+@pytest.mark.parametrize("provider", ["PiAPI", "Replicate", "Stability"])
+def test_convert_downloads_the_video(provider, fake_server, image, converter, tmp_path, fast_polling):
+    stages = []
+    output = str(tmp_path / "out.mp4")
+    result = converter.convert(_start_image(provider, fake_server, image), "a cat", output, provider, stages.append)
+    assert result.succeeded, result.error
+    assert result.provider == provider
+    with open(output, "rb") as f:
+        assert len(f.read()) == fake_server.behavior.video_bytes
+    assert stages[0] == ConversionStage.QUEUED
+    assert stages[-2:] == [ConversionStage.DOWNLOADING, ConversionStage.DONE]
+
+
+@pytest.mark.parametrize("provider", ["PiAPI", "Replicate", "Stability"])
+def test_failed_generation_fails_the_job_promptly(provider, fake_server, image, converter, tmp_path, fast_polling):
+    fake_server.behavior.failure_rate = 1.0
+    started = time.monotonic()
+    result = converter.convert(_start_image(provider, fake_server, image), "a cat", str(tmp_path / "out.mp4"), provider)
+    assert isinstance(result.error, PermanentError), result.error
+    assert time.monotonic() - started < 5
+    # A failed task is not submitted again.
+    assert sum(count for route, count in fake_server.stats()["requests"].items() if route.endswith("POST")) == 1
+
+
+def test_cached_result_is_reused_without_generating(fake_server, image, tmp_path, fast_polling):
+    cache = ResultCache(str(tmp_path / "cache"))
+    converter = Image2VideoConverter(
+        cache=cache, preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed"))
+    )
+    assert converter.convert(image, "a cat", str(tmp_path / "first.mp4"), "Stability").succeeded
+    result = converter.convert(image, "a cat", str(tmp_path / "second.mp4"), "Stability")
+    assert result.cached
+    assert os.path.getsize(tmp_path / "second.mp4") == fake_server.behavior.video_bytes
+    assert fake_server.stats()["requests"]["Stability POST"] == 1
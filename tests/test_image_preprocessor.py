@@ -0,0 +1,61 @@
+import os
+
+from PIL import Image
+
+from tools.image2video.image_preprocessor import EXIF_ORIENTATION, ImagePreprocessor, ImageSpec
+
+
+def _image(path, size, fmt="JPEG", orientation=None, color=(128, 128, 128)):
+    image = Image.new("RGB", size, color)
+    exif = image.getexif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    image.save(path, fmt, exif=exif)
+    return str(path)
+
+
+def test_images_that_fit_pass_through(tmp_path):
+    preprocessor = ImagePreprocessor(str(tmp_path / "cache"))
+    image = _image(tmp_path / "in.jpg", (1024, 576))
+    assert preprocessor.prepare(image, "Stability") == image
+    assert preprocessor.prepare("https://example.com/in.png", "Stability") == "https://example.com/in.png"
+    assert preprocessor.prepare(image, "unknown") == image
+
+
+def test_images_are_fitted_to_the_provider_spec(tmp_path):
+    preprocessor = ImagePreprocessor(str(tmp_path / "cache"))
+    wide = _image(tmp_path / "wide.png", (2000, 1000), "PNG")
+    with Image.open(preprocessor.prepare(wide, "Stability")) as prepared:
+        assert (prepared.format, prepared.size) == ("JPEG", (1024, 576))
+    with Image.open(preprocessor.prepare(wide, "Replicate")) as prepared:
+        assert prepared.size == (1280, 640)
+
+
+def test_exif_rotation_is_applied(tmp_path):
+    preprocessor = ImagePreprocessor(str(tmp_path / "cache"))
+    # Stored landscape, shown portrait.
+    rotated = _image(tmp_path / "rotated.jpg", (640, 480), orientation=6)
+    with Image.open(preprocessor.prepare(rotated, "Replicate")) as prepared:
+        assert prepared.size == (480, 640)
+        assert prepared.getexif().get(EXIF_ORIENTATION, 1) == 1
+
+
+def test_variants_are_cached_per_spec(tmp_path):
+    image = _image(tmp_path / "in.png", (2000, 1000), "PNG")
+    cache_dir = str(tmp_path / "cache")
+    first = ImagePreprocessor(cache_dir).prepare(image, "Replicate")
+    assert ImagePreprocessor(cache_dir).prepare(image, "Replicate") == first
+    lower = ImagePreprocessor(cache_dir, {"Replicate": ImageSpec(max_side=1280, quality=50)})
+    assert lower.prepare(image, "Replicate") != first
+
+
+def test_least_recently_used_variants_are_evicted(tmp_path):
+    images = [_image(tmp_path / f"{n}.png", (2000, 1000), "PNG", color=(n, n, n)) for n in range(3)]
+    preprocessor = ImagePreprocessor(str(tmp_path / "cache"))
+    first = preprocessor.prepare(images[0], "Replicate")
+    preprocessor.max_bytes = os.path.getsize(first) * 5 // 2
+    second = preprocessor.prepare(images[1], "Replicate")
+    os.utime(second, (0, 0))
+    third = preprocessor.prepare(images[2], "Replicate")
+    assert os.path.exists(first) and os.path.exists(third)
+    assert not os.path.exists(second)
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from tools.image2video.job_queue import JobQueue, QueueFullError, QueueState
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.db"), lease_seconds=60)
+
+
+def _submit(queue: JobQueue, tenant: str = "default", priority: int = 0) -> str:
+    job_id = queue.submit("start.jpg", "a cat", "fake", "out.mp4", tenant=tenant, priority=priority)
+    # created_at orders jobs of equal priority.
+    time.sleep(0.002)
+    return job_id
+
+
+def test_lease_takes_oldest_job_of_highest_priority(queue):
+    first = _submit(queue)
+    urgent = _submit(queue, priority=5)
+    second = _submit(queue)
+    assert [queue.lease().id for _ in range(3)] == [urgent, first, second]
+    assert queue.lease() is None
+
+
+def test_lease_is_fair_between_tenants(queue):
+    burst = [_submit(queue, tenant="a") for _ in range(3)]
+    other = _submit(queue, tenant="b")
+    assert queue.lease().id == burst[0]
+    # Tenant a already runs a job, so b's later job goes first.
+    assert queue.lease().id == other
+    assert queue.lease().id == burst[1]
+    assert queue.position(burst[2]) == 0
+
+
+def test_leased_job_is_running_and_counted(queue):
+    job_id = _submit(queue)
+    job = queue.lease()
+    assert job.id == job_id
+    assert job.state == QueueState.RUNNING
+    assert job.attempts == 1
+    assert queue.position(job_id) is None
+
+
+def test_finish_records_outcome_once(queue):
+    job_id = _submit(queue)
+    queue.lease()
+    assert queue.finish(job_id, QueueState.SUCCEEDED)
+    assert queue.get(job_id).state == QueueState.SUCCEEDED
+    assert not queue.finish(job_id, QueueState.FAILED, "late")
+
+
+def test_expired_lease_is_handed_out_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.05, max_attempts=2)
+    job_id = _submit(queue)
+    assert queue.lease(owner="lost").id == job_id
+    time.sleep(0.1)
+    job = queue.lease(owner="second")
+    assert job.id == job_id
+    assert job.attempts == 2
+    # The first worker's lease is gone; its result is not recorded.
+    assert not queue.renew(job_id, owner="lost")
+    assert not queue.finish(job_id, QueueState.SUCCEEDED, owner="lost")
+
+    time.sleep(0.1)
+    assert queue.lease() is None
+    job = queue.get(job_id)
+    assert job.state == QueueState.FAILED
+    assert job.error == "worker lost"
+
+
+def test_renewed_lease_is_kept(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.2)
+    job_id = _submit(queue)
+    queue.lease()
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.renew(job_id)
+    assert queue.lease() is None
+
+
+def test_cancelled_job_loses_its_lease(queue):
+    job_id = _submit(queue)
+    queue.lease()
+    assert queue.cancel(job_id)
+    assert not queue.renew(job_id)
+    assert not queue.finish(job_id, QueueState.SUCCEEDED)
+    assert queue.get(job_id).state == QueueState.CANCELLED
+    assert not queue.cancel(job_id)
+
+
+def test_full_queue_refuses_submissions(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), max_queued=3, max_queued_per_tenant=2)
+    _submit(queue, tenant="a")
+    _submit(queue, tenant="a")
+    with pytest.raises(QueueFullError):
+        _submit(queue, tenant="a")
+    _submit(queue, tenant="b")
+    with pytest.raises(QueueFullError):
+        _submit(queue, tenant="c")
+    # Leased jobs no longer count against the limit.
+    queue.lease()
+    _submit(queue, tenant="c")
+
+
+def test_two_queues_on_one_database_never_lease_the_same_job(tmp_path):
+    queues = [JobQueue(str(tmp_path / "queue.db")) for _ in range(2)]
+    job_ids = {_submit(queues[0]) for _ in range(4)}
+    leased = [queues[index % 2].lease().id for index in range(4)]
+    assert sorted(leased) == sorted(job_ids)
+    assert queues[1].lease() is None
@@ -0,0 +1,115 @@
+import base64
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+from PIL import Image
+
+from tools.common.job_store import JobStore
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image_preprocessor import ImagePreprocessor
+from tools.image2video.job_queue import JobQueue, QueueState
+from tools.image2video.job_server import JobServer, QueueWorker
+
+
+def _image_base64() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _request(server: JobServer, method: str, path: str, body=None):
+    """Send a request and return its status, headers and body."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(f"http://127.0.0.1:{server.port}{path}", data=data, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.3, max_queued=2)
+
+
+@pytest.fixture
+def server(queue, tmp_path):
+    server = JobServer(queue, str(tmp_path / "server"), port=0, workers=0).start()
+    yield server
+    server.drain(timeout=0)
+
+
+@pytest.fixture
+def worker(queue, tmp_path):
+    """Runs queued jobs in this process until the test ends."""
+    converter = Image2VideoConverter(
+        job_store=JobStore(str(tmp_path / "jobs.db")),
+        preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed")),
+    )
+    queue_worker = QueueWorker(queue, converter, concurrency=1, poll_interval=0.02)
+    stop = threading.Event()
+    thread = threading.Thread(target=queue_worker.run, args=(stop,))
+    thread.start()
+    yield queue_worker
+    stop.set()
+    thread.join(10)
+
+
+def _inputs(server: JobServer):
+    return os.listdir(os.path.join(server.data_dir, "inputs"))
+
+
+def test_submitted_job_is_queued(server):
+    status, headers, body = _request(server, "POST", "/jobs", {"image_base64": _image_base64(), "prompt": "a cat"})
+    assert status == 202
+    job_id = json.loads(body)["id"]
+    assert headers["Location"] == f"/jobs/{job_id}"
+    status, _, body = _request(server, "GET", f"/jobs/{job_id}")
+    assert status == 200
+    assert json.loads(body)["state"] == QueueState.QUEUED.value
+    assert _inputs(server) == [f"{job_id}.jpg"]
+
+
+def test_full_queue_refuses_jobs_and_keeps_no_upload(server):
+    for _ in range(2):
+        assert _request(server, "POST", "/jobs", {"image_base64": _image_base64()})[0] == 202
+    status, headers, _ = _request(server, "POST", "/jobs", {"image_base64": _image_base64()})
+    assert status == 429
+    assert int(headers["Retry-After"]) >= 0
+    assert len(_inputs(server)) == 2
+
+
+@pytest.mark.parametrize("image", ["../queue.db", "/etc/passwd", "missing.jpg", ""])
+def test_images_outside_the_inputs_are_refused(server, image):
+    status, _, body = _request(server, "POST", "/jobs", {"image": image})
+    assert status == 400, body
+
+
+def test_job_runs_to_its_result(server, worker, fake_server, fast_polling, wait_for):
+    _, _, body = _request(server, "POST", "/jobs", {"image_base64": _image_base64(), "model": "Stability"})
+    job_id = json.loads(body)["id"]
+    wait_for(lambda: server.queue.get(job_id).state == QueueState.SUCCEEDED, timeout=10)
+    status, headers, video = _request(server, "GET", f"/jobs/{job_id}/result")
+    assert status == 200
+    assert headers["Content-Type"] == "video/mp4"
+    assert len(video) == fake_server.behavior.video_bytes
+
+
+def test_cancelling_a_running_job_cancels_its_provider_task(server, worker, fake_server, fast_polling, wait_for):
+    fake_server.behavior.generation_seconds = (60.0, 60.0)
+    _, _, body = _request(server, "POST", "/jobs", {"image_base64": _image_base64(), "model": "Replicate"})
+    job_id = json.loads(body)["id"]
+    wait_for(lambda: any(task.provider == "Replicate" for task in fake_server._tasks.values()))
+    status, _, body = _request(server, "DELETE", f"/jobs/{job_id}")
+    assert status == 200 and json.loads(body)["cancelled"]
+    wait_for(lambda: all(task.state() == "canceled" for task in fake_server._tasks.values()))
+    # The conversion ends with the provider task instead of waiting out the generation.
+    wait_for(lambda: not worker._running)
+    assert server.queue.get(job_id).state == QueueState.CANCELLED
+    assert not os.path.exists(server.queue.get(job_id).output_path)
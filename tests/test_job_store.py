@@ -0,0 +1,66 @@
+import os
+
+from PIL import Image
+
+from tools.common.job_store import JobState, JobStore
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image_preprocessor import ImagePreprocessor
+
+
+def _orphan(store: JobStore, job_id: str) -> None:
+    """Make ``job_id`` look like it belongs to a process that died."""
+    with store._active_lock:
+        store._active.discard(job_id)
+    store._update(job_id, lease_expires=0)
+
+
+def test_live_jobs_cannot_be_claimed(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    owner, other = JobStore(db_path), JobStore(db_path)
+    job_id = owner.create("Replicate", "in.jpg", "a cat", "/out.mp4")
+    owner.set_submitted(job_id, "task-1")
+    assert other.claim(job_id) is None
+    assert other.claim_orphans() == []
+    assert [job.id for job in other.unfinished_for("/out.mp4")] == [job_id]
+
+
+def test_orphaned_jobs_are_claimed_once(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    owner = JobStore(db_path)
+    job_id = owner.create("Replicate", "in.jpg", "a cat", "/out.mp4")
+    owner.set_submitted(job_id, "task-1")
+    _orphan(owner, job_id)
+
+    first, second = JobStore(db_path), JobStore(db_path)
+    jobs = first.claim_orphans()
+    assert [(job.id, job.provider_job_id, job.state) for job in jobs] == [(job_id, "task-1", JobState.SUBMITTED)]
+    assert second.claim_orphans() == []
+    assert second.claim(job_id) is None
+
+    first.finish(job_id, JobState.SUCCEEDED)
+    assert first.unfinished_for("/out.mp4") == []
+    assert first.get(job_id).lease_owner is None
+
+
+def test_converter_reattaches_instead_of_submitting_again(fake_server, tmp_path, fast_polling):
+    image = str(tmp_path / "start.jpg")
+    Image.new("RGB", (1024, 576), (128, 128, 128)).save(image, "JPEG")
+    output = os.path.abspath(str(tmp_path / "out.mp4"))
+    db_path = str(tmp_path / "jobs.db")
+
+    # A run that submitted a task and died before downloading it.
+    dead = JobStore(db_path)
+    first = Image2VideoConverter(preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed")))
+    task_id = first._client("Stability").submit_image2video(image, "a cat")
+    job_id = dead.create("Stability", image, "a cat", output)
+    dead.set_submitted(job_id, task_id)
+    _orphan(dead, job_id)
+
+    converter = Image2VideoConverter(
+        job_store=JobStore(db_path), preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed"))
+    )
+    result = converter.convert(image, "a cat", output, "Stability")
+    assert result.succeeded, result.error
+    assert os.path.getsize(output) == fake_server.behavior.video_bytes
+    assert fake_server.stats()["requests"]["Stability POST"] == 1
+    assert JobStore(db_path).get(job_id).state == JobState.SUCCEEDED
@@ -0,0 +1,83 @@
+import json
+import logging
+import queue
+import time
+import uuid
+
+from tools.common.logging import (
+    ContextFilter,
+    JsonFormatter,
+    LazyPayload,
+    RateLimitFilter,
+    _DeferredQueueHandler,
+    log_context,
+    setup_logger,
+)
+
+
+def _record(message="polling", lineno=10):
+    return logging.LogRecord("test", logging.DEBUG, "poller.py", lineno, message, None, None)
+
+
+def test_rate_limit_filter_reports_suppressed_records():
+    rate_limit = RateLimitFilter(rate=0.0, burst=2)
+    assert [rate_limit.filter(_record()) for _ in range(5)] == [True, True, False, False, False]
+    # Other call sites have buckets of their own.
+    assert rate_limit.filter(_record(lineno=11))
+
+    rate_limit.rate = 1000.0
+    time.sleep(0.01)
+    record = _record()
+    assert rate_limit.filter(record)
+    assert record.suppressed == 3
+
+
+def test_json_records_carry_the_log_context():
+    record = _record("submitted")
+    with log_context(job_id="job-1"):
+        with log_context(provider="Replicate"):
+            ContextFilter().filter(record)
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry["message"], entry["job_id"], entry["provider"]) == ("submitted", "job-1", "Replicate")
+    ContextFilter().filter(record)
+    assert record.context == {}
+
+
+def test_lazy_payload_is_serialized_only_when_written():
+    calls = []
+
+    class Payload:
+        def __str__(self):
+            calls.append(1)
+            return "payload"
+
+    logger = logging.getLogger(f"test-{uuid.uuid4().hex}")
+    logger.setLevel(logging.INFO)
+    logger.debug("submitted %s", LazyPayload(Payload()))
+    assert calls == []
+    assert str(LazyPayload("x" * 1000, max_chars=10)) == "xxxxxxxxxx... (1000 chars)"
+    assert str(LazyPayload({"id": 1})) == '{"id": 1}'
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = _DeferredQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record())
+    handler.handle(_record())
+    assert handler.dropped == 1
+    # Formatting is left to the background writer.
+    assert handler.queue.get_nowait().args is None
+
+
+def test_async_json_logger_writes_to_file(tmp_path, wait_for):
+    log_file = str(tmp_path / "logs" / "tools.log")
+    logger = setup_logger(f"test-{uuid.uuid4().hex}", log_file, json_format=True, async_mode=True)
+    with log_context(job_id="job-2"):
+        logger.info("done %s", LazyPayload({"bytes": 10}))
+
+    def written():
+        with open(log_file) as f:
+            return f.read().splitlines()
+
+    wait_for(written)
+    entry = json.loads(written()[0])
+    assert (entry["message"], entry["job_id"]) == ('done {"bytes": 10}', "job-2")
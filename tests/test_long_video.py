@@ -0,0 +1,103 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from tools.common.errors import PermanentError
+from tools.common.video import concat_videos, extract_last_frame
+from tools.image2video import long_video
+from tools.image2video.image2video_models import ConversionResult
+from tools.image2video.long_video import LongVideoGenerator, Storyboard, load_storyboards
+
+
+class _Converter:
+    """Writes each clip's start image and prompt into the clip, or fails on ``fail_prompt``."""
+
+    def __init__(self, fail_prompt=None):
+        self.calls = []
+        self.fail_prompt = fail_prompt
+
+    def accepts(self, model, image_path):
+        return True
+
+    def convert(self, image_path, prompt, output_path, model, on_status=None):
+        self.calls.append((image_path, prompt))
+        if prompt == self.fail_prompt:
+            return ConversionResult(output_path, model, PermanentError(model, "failed"))
+        with open(output_path, "w") as f:
+            f.write(f"{image_path}|{prompt}\n")
+        return ConversionResult(output_path, model)
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    def extract(video_path, output_path):
+        shutil.copyfile(video_path, output_path)
+
+    def concat(video_paths, output_path):
+        with open(output_path, "w") as out:
+            for path in video_paths:
+                with open(path) as f:
+                    out.write(f.read())
+
+    monkeypatch.setattr(long_video, "extract_last_frame", extract)
+    monkeypatch.setattr(long_video, "concat_videos", concat)
+
+
+def test_clips_start_from_the_previous_last_frame(tmp_path, fake_ffmpeg):
+    converter = _Converter()
+    generator = LongVideoGenerator(converter, work_dir=str(tmp_path))
+    output = str(tmp_path / "long.mp4")
+    assert generator.generate(Storyboard("start.jpg", ["walk", "run", "stop"], output, "Replicate"))
+    assert [prompt for _, prompt in converter.calls] == ["walk", "run", "stop"]
+    assert converter.calls[0][0] == "start.jpg"
+    assert [image.rsplit("/", 1)[-1] for image, _ in converter.calls[1:]] == ["frame-000.jpg", "frame-001.jpg"]
+    with open(output) as f:
+        assert len(f.read().splitlines()) == 3
+    # Clips and frames are removed once joined.
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["long.mp4"]
+
+
+def test_failed_clip_stops_the_storyboard(tmp_path, fake_ffmpeg):
+    converter = _Converter(fail_prompt="run")
+    generator = LongVideoGenerator(converter, work_dir=str(tmp_path))
+    results = generator.generate_many([
+        Storyboard("a.jpg", ["walk", "run", "stop"], str(tmp_path / "a.mp4"), "Replicate"),
+        Storyboard("b.jpg", ["walk"], str(tmp_path / "b.mp4"), "Replicate"),
+    ])
+    assert results == {str(tmp_path / "a.mp4"): False, str(tmp_path / "b.mp4"): True}
+    assert "stop" not in [prompt for _, prompt in converter.calls]
+
+
+def test_storyboards_need_a_single_provider(tmp_path):
+    with pytest.raises(ValueError):
+        Storyboard("a.jpg", ["walk"], "a.mp4", "Auto")
+    path = tmp_path / "boards.jsonl"
+    path.write_text(
+        json.dumps({"image": "a.jpg", "prompts": ["walk"], "output": "a.mp4"}) + "\n"
+        + json.dumps({"image": "b.jpg", "prompts": ["run"], "output": "b.mp4", "model": "PiAPI"}) + "\n"
+    )
+    assert [board.model for board in load_storyboards(str(path), "Replicate")] == ["Replicate", "PiAPI"]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_clips_are_joined_by_stream_copy(tmp_path):
+    clips = []
+    for n in range(2):
+        clip = str(tmp_path / f"clip-{n}.mp4")
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=64x64:rate=10:duration=1",
+             "-pix_fmt", "yuv420p", clip],
+            check=True,
+        )
+        clips.append(clip)
+    output = str(tmp_path / "joined" / "long.mp4")
+    concat_videos(clips, output)
+    duration = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", output],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    assert float(duration) == pytest.approx(2.0, abs=0.2)
+    extract_last_frame(output, str(tmp_path / "frame.jpg"))
+    assert (tmp_path / "frame.jpg").stat().st_size > 0
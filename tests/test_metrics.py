@@ -0,0 +1,66 @@
+import json
+import urllib.request
+
+import pytest
+from PIL import Image
+
+from tools.common.metrics import Histogram, Metrics, MetricsServer
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image_preprocessor import ImagePreprocessor
+
+
+def test_histogram_quantiles_interpolate_inside_buckets():
+    histogram = Histogram((1, 2, 4))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4)
+
+
+def test_spans_count_bytes_requests_and_errors():
+    metrics = Metrics()
+    with metrics.span("download", "Replicate", "Auto", "job-1") as span:
+        span.add(bytes=100, requests=1)
+    with pytest.raises(ValueError):
+        with metrics.span("download", "Replicate", "Auto", "job-2"):
+            raise ValueError("cut off")
+    metrics.record("queue_wait", 3.0, "Replicate", "Auto")
+
+    stages = {stage["stage"]: stage for stage in metrics.as_dict()["stages"]}
+    assert (stages["download"]["count"], stages["download"]["bytes"], stages["download"]["errors"]) == (2, 100, 1)
+    assert stages["queue_wait"]["sum"] == 3.0
+    assert [span["job_id"] for span in metrics.as_dict()["recent_spans"]] == ["job-1", "job-2", None]
+    assert set(metrics.summary()) == {"download/Replicate/Auto", "queue_wait/Replicate/Auto"}
+
+
+def test_server_exposes_prometheus_text_and_json():
+    metrics = Metrics()
+    metrics.record("generation", 7.0, "PiAPI", "PiAPI", requests=2)
+    server = MetricsServer(metrics, port=0).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            text = response.read().decode("utf-8")
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics.json") as response:
+            data = json.load(response)
+    finally:
+        server.stop()
+    labels = 'stage="generation",provider="PiAPI",model="PiAPI"'
+    assert f'tools_stage_seconds_bucket{{{labels},le="10"}} 1' in text
+    assert f"tools_stage_requests_total{{{labels}}} 2" in text
+    assert data["stages"][0]["count"] == 1
+
+
+def test_conversion_records_every_stage(fake_server, tmp_path, fast_polling):
+    image = str(tmp_path / "start.jpg")
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(image, "JPEG")
+    metrics = Metrics()
+    converter = Image2VideoConverter(
+        metrics=metrics, preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed"))
+    )
+    assert converter.convert(image, "a cat", str(tmp_path / "out.mp4"), "Replicate").succeeded
+    stages = {stage["stage"]: stage for stage in metrics.as_dict()["stages"]}
+    assert set(stages) == {"preprocess", "upload", "queue_wait", "generation", "download"}
+    assert stages["download"]["bytes"] == fake_server.behavior.video_bytes
+    assert {(stage["provider"], stage["model"]) for stage in stages.values()} == {("Replicate", "Replicate")}
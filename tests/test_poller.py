@@ -0,0 +1,213 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from tools.api.piapi.piapi_client import PiAPIClient
+from tools.api.replicate.replicate_client import parse_webhook as parse_replicate_webhook
+from tools.common.errors import DeadlineExceeded, PermanentError, TransientError
+from tools.common.poller import Poller, TaskState, TaskStatus, async_watch
+from tools.common.webhook import WebhookReceiver, verify_standard_webhook
+
+
+@pytest.fixture
+def poller():
+    poller = Poller(max_workers=2)
+    yield poller
+    poller.stop()
+
+
+@pytest.fixture
+def receiver(poller):
+    receiver = WebhookReceiver("http://unused", host="127.0.0.1", port=0, poller=poller, shared_secret="test-secret")
+    receiver.public_url = f"http://127.0.0.1:{receiver.port}"
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def _pending(task_id: str) -> TaskStatus:
+    return TaskStatus(TaskState.PENDING)
+
+
+def test_check_resolves_final_status(poller, fast_polling):
+    statuses = iter([TaskState.PENDING, TaskState.RUNNING, TaskState.SUCCEEDED])
+    status = poller.watch("test", "a", lambda task_id: TaskStatus(next(statuses)), timeout=5).result(5)
+    assert status.state == TaskState.SUCCEEDED
+    assert status.elapsed is not None and status.queue_seconds is not None
+
+
+def test_notify_resolves_watched_task(poller, fast_polling):
+    future = poller.watch("test", "a", _pending, timeout=5)
+    poller.notify("test", "a", TaskStatus(TaskState.SUCCEEDED))
+    assert future.result(1).state == TaskState.SUCCEEDED
+
+
+def test_early_notification_is_kept_for_watch(poller, fast_polling):
+    poller.notify("test", "a", TaskStatus(TaskState.FAILED, error="boom"))
+    future = poller.watch("test", "a", _pending, timeout=5)
+    assert future.done()
+    assert future.result().error == "boom"
+
+
+def test_early_notification_expires(fast_polling):
+    poller = Poller(max_workers=1, early_ttl=0.05)
+    try:
+        poller.notify("test", "a", TaskStatus(TaskState.SUCCEEDED))
+        time.sleep(0.1)
+        with pytest.raises(DeadlineExceeded):
+            poller.watch("test", "a", _pending, timeout=0.2).result(5)
+    finally:
+        poller.stop()
+
+
+def test_early_notifications_are_capped(fast_polling):
+    poller = Poller(max_workers=1, max_early=2)
+    try:
+        for task_id in ("a", "b", "c"):
+            poller.notify("test", task_id, TaskStatus(TaskState.SUCCEEDED))
+        assert poller.watch("test", "c", _pending, timeout=0.2).done()
+        with pytest.raises(DeadlineExceeded):
+            poller.watch("test", "a", _pending, timeout=0.2).result(5)
+    finally:
+        poller.stop()
+
+
+def test_deadline_exceeded_at_timeout(poller, fast_polling):
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as info:
+        poller.watch("test", "a", _pending, timeout=0.3).result(5)
+    assert info.value.stage == "poll"
+    assert isinstance(info.value, TimeoutError)
+    assert time.monotonic() - started < 2
+
+
+def test_transient_errors_keep_polling(fast_polling):
+    poller = Poller(max_workers=1, max_check_errors=1)
+    calls = []
+
+    def check(task_id):
+        calls.append(task_id)
+        if len(calls) < 4:
+            raise TransientError("test", "connection reset")
+        return TaskStatus(TaskState.SUCCEEDED)
+
+    try:
+        assert poller.watch("test", "a", check, timeout=5).result(5).state == TaskState.SUCCEEDED
+        assert len(calls) == 4
+    finally:
+        poller.stop()
+
+
+def test_transient_errors_fail_after_max_transient_errors(fast_polling):
+    poller = Poller(max_workers=1, max_transient_errors=3)
+    calls = []
+
+    def check(task_id):
+        calls.append(task_id)
+        raise TransientError("test", "HTTP 503")
+
+    try:
+        started = time.monotonic()
+        with pytest.raises(TransientError):
+            poller.watch("test", "a", check, timeout=60).result(5)
+        assert len(calls) == 3
+        assert time.monotonic() - started < 2
+    finally:
+        poller.stop()
+
+
+def test_permanent_error_fails_at_once(poller, fast_polling):
+    calls = []
+
+    def check(task_id):
+        calls.append(task_id)
+        raise PermanentError("test", "task not found")
+
+    with pytest.raises(PermanentError):
+        poller.watch("test", "a", check, timeout=5).result(5)
+    assert len(calls) == 1
+
+
+def test_other_errors_fail_after_max_check_errors(fast_polling):
+    poller = Poller(max_workers=1, max_check_errors=2)
+    try:
+        with pytest.raises(KeyError):
+            poller.watch("test", "a", lambda task_id: {}["status"], timeout=5).result(5)
+    finally:
+        poller.stop()
+
+
+def test_async_watch_resolves_final_status(fast_polling):
+    calls = []
+
+    async def check(task_id):
+        calls.append(task_id)
+        if len(calls) < 3:
+            raise TransientError("test", "connection reset")
+        return TaskStatus(TaskState.SUCCEEDED)
+
+    status = asyncio.run(async_watch("test", "a", check, timeout=5))
+    assert status.state == TaskState.SUCCEEDED
+    assert status.elapsed is not None
+    assert len(calls) == 3
+
+
+def test_async_watch_stops_at_timeout_and_transient_error_cap(fast_polling):
+    async def pending(task_id):
+        return TaskStatus(TaskState.PENDING)
+
+    with pytest.raises(DeadlineExceeded) as info:
+        asyncio.run(async_watch("test", "a", pending, timeout=0.3))
+    assert info.value.stage == "poll"
+
+    async def unavailable(task_id):
+        raise TransientError("test", "HTTP 503")
+
+    started = time.monotonic()
+    with pytest.raises(TransientError):
+        asyncio.run(async_watch("test", "a", unavailable, timeout=60, max_transient_errors=3))
+    assert time.monotonic() - started < 2
+
+
+def test_piapi_webhook_resolves_watch(fake_server, poller, receiver, wait_for):
+    client = PiAPIClient(poller=poller, webhook_receiver=receiver)
+    task_id = client.submit_image2video(fake_server.image_url(), "a cat")
+    # Pushing providers are only polled every two minutes, so only the callback can resolve this.
+    status = client.watch_image2video(task_id, timeout=10).result(5)
+    assert status.state == TaskState.SUCCEEDED
+    wait_for(lambda: fake_server.stats()["webhooks"] == 1)
+    assert fake_server.stats()["requests"].get("PiAPI GET", 0) == 0
+
+
+def test_piapi_webhook_delivered_before_watch(fake_server, poller, receiver, wait_for):
+    client = PiAPIClient(poller=poller, webhook_receiver=receiver)
+    task_id = client.submit_image2video(fake_server.image_url(), "a cat")
+    wait_for(lambda: fake_server.stats()["webhooks"] == 1)
+    future = client.watch_image2video(task_id, timeout=10)
+    assert future.done()
+    assert future.result().state == TaskState.SUCCEEDED
+
+
+def test_replicate_webhook_signature_is_verified(fake_server, poller, receiver):
+    receiver.register("Replicate", parse_replicate_webhook, fake_server.webhook_secret, verify_standard_webhook)
+    response = requests.post(
+        f"{fake_server.url}/v1/models/fake/fake/predictions",
+        json={"input": {}, "webhook": receiver.endpoint("Replicate"), "webhook_events_filter": ["completed"]},
+    )
+    task_id = response.json()["id"]
+    status = poller.watch("Replicate", task_id, _pending, timeout=10).result(5)
+    assert status.state == TaskState.SUCCEEDED
+
+
+def test_webhook_with_wrong_signature_is_rejected(fake_server, poller, receiver):
+    receiver.register("Replicate", parse_replicate_webhook, "whsec_d3Jvbmc=", verify_standard_webhook)
+    response = requests.post(
+        f"{fake_server.url}/v1/models/fake/fake/predictions",
+        json={"input": {}, "webhook": receiver.endpoint("Replicate")},
+    )
+    task_id = response.json()["id"]
+    time.sleep(0.5)
+    assert fake_server.stats()["webhooks"] == 0
+    assert not poller.watch("Replicate", task_id, _pending, timeout=10).done()
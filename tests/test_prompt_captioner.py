@@ -0,0 +1,78 @@
+import shutil
+import threading
+
+from PIL import Image
+
+from tools.image2video.image2video_converter import Image2VideoConverter
+from tools.image2video.image_preprocessor import ImagePreprocessor
+from tools.image2video.prompt_captioner import PromptCaptioner
+
+
+class _Captions:
+    """Captions every image "a grey square", or "" while ``failing`` is set."""
+
+    def __init__(self, release=None):
+        self.calls = []
+        self.failing = False
+        self.release = release
+
+    def __call__(self, image_path):
+        self.calls.append(image_path)
+        if self.release is not None:
+            self.release.wait(5)
+        return "" if self.failing else " a grey square "
+
+
+def _image(path, color=(128, 128, 128)):
+    Image.new("RGB", (64, 64), color).save(path, "JPEG")
+    return str(path)
+
+
+def test_same_content_is_captioned_once(tmp_path):
+    release = threading.Event()
+    captions = _Captions(release)
+    captioner = PromptCaptioner(captions)
+    first = _image(tmp_path / "a.jpg")
+    copy = str(tmp_path / "copy.jpg")
+    shutil.copyfile(first, copy)
+    futures = [captioner.submit(first), captioner.submit(first), captioner.submit(copy)]
+    release.set()
+    assert [future.result(5) for future in futures] == ["a grey square"] * 3
+    assert captions.calls == [first]
+    assert captioner.caption_many([first, _image(tmp_path / "b.jpg", (0, 0, 0))]) == {
+        first: "a grey square", str(tmp_path / "b.jpg"): "a grey square",
+    }
+    assert len(captions.calls) == 2
+
+
+def test_failed_captions_are_retried(tmp_path):
+    captions = _Captions()
+    captioner = PromptCaptioner(captions)
+    image = _image(tmp_path / "a.jpg")
+    captions.failing = True
+    assert captioner.caption(image) == ""
+    captions.failing = False
+    assert captioner.caption(image) == "a grey square"
+    assert len(captions.calls) == 2
+
+
+def test_memo_keeps_the_most_recent_images(tmp_path):
+    captions = _Captions()
+    captioner = PromptCaptioner(captions, max_entries=2)
+    images = [_image(tmp_path / f"{n}.jpg", (n, n, n)) for n in range(3)]
+    for image in images:
+        captioner.caption(image)
+    assert len(captioner._by_path) == len(captioner._by_hash) == 2
+    captioner.caption(images[0])
+    assert captions.calls == images + [images[0]]
+
+
+def test_blank_prompt_is_replaced_by_a_caption(fake_server, tmp_path, fast_polling):
+    captions = _Captions()
+    converter = Image2VideoConverter(
+        captioner=PromptCaptioner(captions), preprocessor=ImagePreprocessor(cache_dir=str(tmp_path / "preprocessed"))
+    )
+    image = _image(tmp_path / "start.jpg")
+    result = converter.convert(image, "  ", str(tmp_path / "out.mp4"), "Replicate")
+    assert result.succeeded, result.error
+    assert captions.calls == [image]
@@ -0,0 +1,57 @@
+from importlib.metadata import EntryPoint
+
+import click
+import pytest
+
+from tools.image2video import provider_registry
+from tools.image2video.provider_registry import (
+    ENTRY_POINT_GROUP,
+    ProviderRegistry,
+    load_reference,
+    model_names,
+    validate_model,
+)
+
+
+class _Client:
+    def __init__(self, **options):
+        self.options = options
+
+
+def test_clients_are_constructed_on_first_use_with_options():
+    registry = ProviderRegistry(lambda name: {"transport": f"{name}-transport"})
+    registry.register("Mine", _Client)
+    assert registry.loaded() == []
+    client = registry.get("Mine")
+    assert client.options == {"transport": "Mine-transport"}
+    assert registry.get("Mine") is client
+    assert registry.loaded() == ["Mine"]
+
+
+def test_references_are_imported_lazily():
+    registry = ProviderRegistry()
+    registry.register("Mine", f"{__name__}:_Client")
+    assert "Mine" in registry.names()
+    assert isinstance(registry.get("Mine"), _Client)
+    assert load_reference("tools.image2video.provider_registry:ProviderRegistry.get") is ProviderRegistry.get
+
+
+def test_unknown_and_broken_providers_return_none():
+    registry = ProviderRegistry()
+    registry.register("Broken", "tools.no_such_module:Client")
+    assert registry.get("Nope") is None
+    assert registry.get("Broken") is None
+
+
+def test_entry_points_add_providers(monkeypatch):
+    entry_point = EntryPoint("Plugin", f"{__name__}:_Client", ENTRY_POINT_GROUP)
+
+    def entry_points(group):
+        return [entry_point] if group == ENTRY_POINT_GROUP else []
+
+    monkeypatch.setattr(provider_registry.metadata, "entry_points", entry_points)
+    assert isinstance(ProviderRegistry().get("Plugin"), _Client)
+    assert model_names()[-3:] == ["Plugin", "Fastest", "Auto"]
+    assert validate_model(None, None, "Plugin") == "Plugin"
+    with pytest.raises(click.BadParameter):
+        validate_model(None, None, "Nope")
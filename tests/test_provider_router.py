@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from tools.common.errors import DeadlineExceeded
+from tools.common.poller import TaskState, TaskStatus
+from tools.image2video.provider_router import ProviderLimits, ProviderRouter, TokenBucket
+
+
+def _hold_slots(router: ProviderRouter, provider: str, count: int, release: threading.Event) -> list:
+    def hold():
+        with router.slot(provider):
+            release.wait(5)
+
+    threads = [threading.Thread(target=hold) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_waiting_jobs_are_counted(wait_for):
+    router = ProviderRouter({"a": ProviderLimits(rate=0, max_concurrency=1)}, initial_generation=10)
+    release = threading.Event()
+    threads = _hold_slots(router, "a", 4, release)
+    wait_for(lambda: router.stats()["a"]["waiting"] == 3)
+    assert router.stats()["a"]["in_flight"] == 1
+    # Four jobs ahead with one slot: four jobs' worth of waiting, then our own.
+    assert router.expected_seconds("a") == pytest.approx(50)
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert router.stats()["a"] == {"in_flight": 0, "waiting": 0, "queue_wait": 0.0, "generation": 10.0}
+
+
+def test_slot_timeout_raises_deadline_exceeded(wait_for):
+    router = ProviderRouter({"a": ProviderLimits(rate=0, max_concurrency=1)})
+    release = threading.Event()
+    threads = _hold_slots(router, "a", 1, release)
+    wait_for(lambda: router.stats()["a"]["in_flight"] == 1)
+    with pytest.raises(DeadlineExceeded):
+        with router.slot("a", timeout=0.05):
+            pass
+    assert router.stats()["a"]["waiting"] == 0
+    release.set()
+    threads[0].join(5)
+
+
+def test_choose_avoids_backlogged_provider(wait_for):
+    router = ProviderRouter({provider: ProviderLimits(rate=0, max_concurrency=1) for provider in "ab"})
+    assert router.choose(["a", "b"]) == "a"
+    release = threading.Event()
+    threads = _hold_slots(router, "a", 1, release)
+    wait_for(lambda: router.stats()["a"]["in_flight"] == 1)
+    assert router.choose(["a", "b"]) == "b"
+    release.set()
+    threads[0].join(5)
+
+
+def test_choose_prefers_faster_provider():
+    router = ProviderRouter(initial_generation=60)
+    status = TaskStatus(TaskState.SUCCEEDED)
+    status.elapsed, status.queue_seconds = 10.0, 2.0
+    for _ in range(10):
+        router.observe("b", status)
+    assert router.choose(["a", "b"]) == "b"
+
+
+def test_rate_limited_provider_is_deferred():
+    router = ProviderRouter({provider: ProviderLimits(rate=0) for provider in "ab"}, initial_generation=1)
+    router.rate_limited("a", 30)
+    assert router.expected_seconds("a") > 30
+    assert router.choose(["a", "b"]) == "b"
+
+
+def test_token_bucket_without_rate_never_blocks():
+    bucket = TokenBucket(rate=0, burst=0)
+    started = time.monotonic()
+    for _ in range(100):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.5
+    assert bucket.delay() == 0.0
+
+
+def test_token_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(rate=20, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    assert bucket.delay() > 0
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.03
+
+
+def test_token_bucket_defer_blocks_unlimited_bucket():
+    bucket = TokenBucket(rate=0, burst=1)
+    bucket.defer(0.1)
+    assert bucket.delay() > 0.05
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.08
+
+
+def test_rate_limit_without_retry_after_backs_off_exponentially():
+    router = ProviderRouter({"a": ProviderLimits(rate=0)})
+    pauses = []
+    for _ in range(4):
+        router.rate_limited("a", None)
+        pauses.append(router._state("a").bucket.delay())
+    assert pauses[0] == pytest.approx(0.5, abs=0.05)
+    assert pauses[3] == pytest.approx(4.0, abs=0.05)
+    router.rate_limited("a", 0.2)
+    # A Retry-After never shortens a pause already in force.
+    assert router._state("a").bucket.delay() > 3
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+from tools.api.replicate import replicate_client
+from tools.api.replicate.replicate_client import ReplicateClient
+from tools.common.errors import RateLimitError
+from tools.common.poller import Poller, TaskState
+from tools.common.result_cache import ResultCache
+from tools.common.staging import InputStager
+
+
+@pytest.fixture
+def client(fake_server, tmp_path):
+    poller = Poller(max_workers=2)
+    yield ReplicateClient(poller=poller, stager=InputStager())
+    poller.stop()
+
+
+@pytest.fixture
+def image(tmp_path):
+    from PIL import Image
+
+    path = str(tmp_path / "start.jpg")
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(path, "JPEG")
+    return path
+
+
+def test_submit_creates_prediction_over_pooled_transport(fake_server, client, image, fast_polling):
+    prediction_id = client.submit_image2video(image, "a cat")
+    requests = fake_server.stats()["requests"]
+    assert requests["Replicate POST"] == 1
+    assert requests["Replicate files"] == 1
+    assert client.watch_image2video(prediction_id, timeout=10).result(5).state == TaskState.SUCCEEDED
+
+
+def test_rate_limit_carries_retry_after(fake_server, client, image):
+    fake_server.behavior.rate_limit_rate = 1.0
+    fake_server.behavior.retry_after = 0.25
+    with pytest.raises(RateLimitError) as info:
+        client.submit_image2video(image, "a cat")
+    assert info.value.retry_after == 0.25
+
+
+class _FakeRun:
+    """Stands in for replicate.run: returns ``num_outputs`` image URLs after a short wait."""
+
+    def __init__(self, image_url, fail_for=()):
+        self.image_url = image_url
+        self.fail_for = set(fail_for)
+        self.prompts = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model, input):
+        with self._lock:
+            self.prompts.append(input["prompt"])
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(0.1)
+            if input["prompt"] in self.fail_for:
+                raise RuntimeError("prediction failed")
+            return [self.image_url] * input["num_outputs"]
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_text2image_batch_generates_each_prompt_once(fake_server, client, tmp_path, monkeypatch):
+    run = _FakeRun(fake_server.image_url(), fail_for=["broken"])
+    monkeypatch.setattr(replicate_client.replicate, "run", run)
+    results = client.text2image_batch(
+        ["a cat", "a dog", "a cat", "broken", "a bird"], str(tmp_path), num_outputs=2, max_workers=2
+    )
+    assert sorted(run.prompts) == ["a bird", "a cat", "a dog", "broken"]
+    assert run.peak == 2
+    assert results["broken"] == []
+    assert results["a cat"] == [str(tmp_path / "image-0000-0.png"), str(tmp_path / "image-0000-1.png")]
+    for prompt in ("a cat", "a dog", "a bird"):
+        assert len(results[prompt]) == 2
+        assert all(os.path.getsize(path) > 0 for path in results[prompt])
+
+
+def test_text2image_batch_reuses_cached_images(fake_server, tmp_path, monkeypatch):
+    poller = Poller(max_workers=1)
+    client = ReplicateClient(poller=poller, stager=InputStager(), cache=ResultCache(str(tmp_path / "cache")))
+    try:
+        run = _FakeRun(fake_server.image_url())
+        monkeypatch.setattr(replicate_client.replicate, "run", run)
+        client.text2image_batch(["a cat"], str(tmp_path / "first"), num_outputs=2)
+        results = client.text2image_batch(["a cat"], str(tmp_path / "second"), num_outputs=2)
+    finally:
+        poller.stop()
+    assert run.prompts == ["a cat"]
+    assert all(os.path.exists(path) for path in results["a cat"])
+
+
+def test_rejected_staged_file_is_uploaded_again(fake_server, client, image, monkeypatch):
+    post = client.transport.post
+    rejected = []
+
+    def reject_first_prediction(url, **kwargs):
+        if "predictions" in url and not rejected:
+            rejected.append(url)
+            response = requests.Response()
+            response.status_code = 422
+            response._content = b'{"detail": "- input.start_image: could not fetch file, got 404"}'
+            return response
+        return post(url, **kwargs)
+
+    monkeypatch.setattr(client.transport, "post", reject_first_prediction)
+    assert client.submit_image2video(image, "a cat")
+    assert fake_server.stats()["requests"]["Replicate files"] == 2
+
+
+def test_only_unfetchable_start_images_count_as_stale():
+    assert replicate_client._rejects_input(422, '{"detail": "input.start_image: failed to download file"}')
+    assert not replicate_client._rejects_input(422, '{"detail": "input.prompt: too long"}')
+    assert not replicate_client._rejects_input(422, '{"detail": "input.start_image: unsupported format"}')
+    assert not replicate_client._rejects_input(429, '{"detail": "start_image not found"}')
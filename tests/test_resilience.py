@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from tools.common.errors import (
+    CircuitOpenError,
+    ConnectionFailedError,
+    Deadline,
+    DeadlineExceeded,
+    PermanentError,
+    RateLimitError,
+    TransientError,
+    never_processed,
+)
+from tools.common.resilience import CircuitBreaker, async_retry_call, network_errors, retry_call
+
+
+class _Calls:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retry_call_retries_transient_errors():
+    call = _Calls(TransientError("test", "reset"), TransientError("test", "reset"))
+    assert retry_call("test", call, base_delay=0.01) == "ok"
+    assert call.count == 3
+
+
+def test_retry_call_gives_up_after_max_attempts():
+    call = _Calls(*[TransientError("test", "reset")] * 3)
+    with pytest.raises(TransientError):
+        retry_call("test", call, max_attempts=3, base_delay=0.01)
+    assert call.count == 3
+
+
+def test_retry_call_raises_permanent_errors_at_once():
+    call = _Calls(PermanentError("test", "bad request"))
+    with pytest.raises(PermanentError):
+        retry_call("test", call, base_delay=0.01)
+    assert call.count == 1
+
+
+def test_retry_call_honours_retry_after():
+    call = _Calls(RateLimitError("test", "slow down", retry_after=0.1))
+    started = time.monotonic()
+    assert retry_call("test", call, base_delay=0.01) == "ok"
+    assert time.monotonic() - started >= 0.08
+
+
+def test_retry_call_retry_if_stops_retries():
+    call = _Calls(TransientError("test", "read timeout"))
+    with pytest.raises(TransientError):
+        retry_call("test", call, base_delay=0.01, retry_if=never_processed)
+    assert call.count == 1
+
+    call = _Calls(ConnectionFailedError("test", "refused"))
+    assert retry_call("test", call, base_delay=0.01, retry_if=never_processed) == "ok"
+
+
+def test_retry_call_does_not_sleep_past_deadline():
+    call = _Calls(RateLimitError("test", "slow down", retry_after=5))
+    with pytest.raises(DeadlineExceeded):
+        retry_call("test", call, deadline=Deadline(1), stage="submit")
+    assert call.count == 1
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05)
+    for _ in range(2):
+        with pytest.raises(TransientError):
+            retry_call("test", _Calls(TransientError("test", "503")), max_attempts=1, breaker=breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial at a time.
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_breaker_failed_trial_opens_again():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(TransientError):
+        retry_call("test", _Calls(TransientError("test", "503")), max_attempts=1, breaker=breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allows()
+
+
+def test_breaker_ignores_rate_limits_and_rejected_requests():
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    for error in (RateLimitError("test", "slow down", retry_after=0.01), PermanentError("test", "bad request")):
+        with pytest.raises(type(error)):
+            retry_call("test", _Calls(error), max_attempts=1, breaker=breaker)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_local_bug_releases_half_open_trial():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        retry_call("test", _Calls(KeyError("status")), breaker=breaker)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allows()
+    assert retry_call("test", _Calls(), breaker=breaker) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_network_errors_classifies_connection_refused(fake_server):
+    url = fake_server.url
+    fake_server.stop()
+    with pytest.raises(ConnectionFailedError):
+        with network_errors("test"):
+            requests.get(f"{url}/api/v1/task/missing", timeout=5)
+
+
+def test_network_errors_maps_http_status(fake_server):
+    with pytest.raises(PermanentError):
+        with network_errors("test"):
+            requests.get(f"{fake_server.url}/api/v1/task/missing", timeout=5).raise_for_status()
+
+
+def test_network_errors_passes_other_errors_through():
+    with pytest.raises(KeyError):
+        with network_errors("test"):
+            {}["status"]
+
+
+def test_async_retry_call_retries_and_records_breaker_outcomes():
+    calls = _Calls(TransientError("test", "reset"), TransientError("test", "reset"))
+
+    async def call():
+        return calls()
+
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    assert asyncio.run(async_retry_call("test", call, base_delay=0.01, breaker=breaker)) == "ok"
+    assert calls.count == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    calls = _Calls(*[TransientError("test", "reset")] * 3)
+    with pytest.raises(TransientError):
+        asyncio.run(async_retry_call("test", call, base_delay=0.01, breaker=breaker))
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(async_retry_call("test", call, breaker=breaker))
+
+
+def test_async_retry_call_does_not_sleep_past_deadline():
+    calls = _Calls(RateLimitError("test", "slow down", retry_after=5))
+
+    async def call():
+        return calls()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(async_retry_call("test", call, deadline=Deadline(1), stage="submit"))
+    assert calls.count == 1
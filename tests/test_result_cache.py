@@ -0,0 +1,52 @@
+import os
+
+from tools.common.result_cache import ResultCache
+
+
+def _file(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return str(path)
+
+
+def test_key_depends_on_content_and_payload_not_order(tmp_path):
+    a = _file(tmp_path / "a.jpg", 10)
+    b = _file(tmp_path / "b.jpg", 10)
+    c = _file(tmp_path / "c.jpg", 11)
+    assert ResultCache.key({"x": 1, "y": 2}, [a]) == ResultCache.key({"y": 2, "x": 1}, [b])
+    assert ResultCache.key({"x": 1}, [a]) != ResultCache.key({"x": 1}, [c])
+    assert ResultCache.key({"x": 1}, [a]) != ResultCache.key({"x": 2}, [a])
+
+
+def test_hit_links_the_stored_result(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = ResultCache.key({"prompt": "a cat"})
+    output = str(tmp_path / "out.mp4")
+    assert not cache.get(key, output)
+    cache.put(key, _file(tmp_path / "video.mp4", 100))
+    assert cache.get(key, output)
+    assert os.path.getsize(output) == 100
+    assert cache.stats() == {"hits": 1, "misses": 1, "bytes": 100}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    keys = [ResultCache.key({"n": n}) for n in range(3)]
+    for n, key in enumerate(keys[:2]):
+        cache.put(key, _file(tmp_path / f"{n}.mp4", 100))
+        os.utime(cache._path(key), (n, n))
+    # Reading the oldest entry makes it the most recently used one.
+    assert cache.get(keys[0], str(tmp_path / "hit.mp4"))
+    cache.put(keys[2], _file(tmp_path / "2.mp4", 100))
+    assert cache.get(keys[0], str(tmp_path / "out0.mp4"))
+    assert not cache.get(keys[1], str(tmp_path / "out1.mp4"))
+    assert cache.stats()["bytes"] == 200
+
+
+def test_text_results_and_size_survive_reopening(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = ResultCache.key({"task": "caption"})
+    assert cache.get_text(key) is None
+    cache.put_text(key, "a grey square")
+    assert cache.get_text(key) == "a grey square"
+    assert ResultCache(str(tmp_path / "cache")).stats()["bytes"] == len("a grey square")
@@ -0,0 +1,38 @@
+import pytest
+
+from tools.api.stabilityai.stability_ai_client import StabilityAIClient
+from tools.common.errors import TransientError
+from tools.common.poller import Poller, TaskState
+
+
+@pytest.fixture
+def poller():
+    poller = Poller(max_workers=2)
+    yield poller
+    poller.stop()
+
+
+def test_failed_generation_is_a_final_status(fake_server, poller, fast_polling):
+    fake_server.behavior.failure_rate = 1.0
+    task = fake_server._create("Stability")
+    task.finishes = task.starts
+    status = StabilityAIClient(poller=poller).watch_image2video(task.id, timeout=60).result(5)
+    assert status.state == TaskState.FAILED
+    assert "generation_failed" in status.error
+
+
+class _ProxyError:
+    """A 502 from a proxy in front of the API: no JSON error envelope."""
+    status_code = 502
+    text = "<html>Bad gateway</html>"
+    headers = {}
+
+    def json(self):
+        raise ValueError("not JSON")
+
+
+def test_server_error_without_envelope_is_transient(poller, monkeypatch):
+    client = StabilityAIClient(poller=poller)
+    monkeypatch.setattr(client.transport, "get", lambda *args, **kwargs: _ProxyError())
+    with pytest.raises(TransientError):
+        client.get_status("abc")
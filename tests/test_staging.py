@@ -0,0 +1,79 @@
+import threading
+import time
+import urllib.request
+
+import requests
+
+from tools.common.staging import InputStager, LocalFileStore, MultipartStream
+
+
+def _file(path, content=b"image"):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_concurrent_stages_of_one_image_upload_once(tmp_path):
+    stager = InputStager()
+    image = _file(tmp_path / "a.jpg")
+    uploads = []
+
+    def upload(path):
+        uploads.append(path)
+        time.sleep(0.1)
+        return "https://files/a"
+
+    threads = [threading.Thread(target=stager.stage, args=("Replicate", image, upload)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert uploads == [image]
+    assert stager.stats() == {"uploads": 1, "reused": 3}
+    # Namespaces, e.g. two provider accounts, do not share staged copies.
+    assert stager.stage("Other", image, lambda path: "https://other/a") == "https://other/a"
+
+
+def test_forgotten_or_expired_copies_are_uploaded_again(tmp_path):
+    stager = InputStager()
+    image = _file(tmp_path / "a.jpg")
+    values = iter(["first", "second", "third"])
+    assert stager.stage("Replicate", image, lambda path: next(values)) == "first"
+    stager.forget("Replicate", image)
+    assert stager.stage("Replicate", image, lambda path: next(values), ttl=0) == "second"
+    assert stager.stage("Replicate", image, lambda path: next(values)) == "third"
+
+
+def test_memos_keep_the_most_recent_files(tmp_path):
+    stager = InputStager(max_entries=2)
+    images = [_file(tmp_path / f"{n}.jpg", bytes([n])) for n in range(3)]
+    for image in images:
+        stager.stage("Replicate", image, lambda path: path)
+    assert len(stager._hashes) == len(stager._locks) == 2
+    assert stager.stage("Replicate", images[0], lambda path: "again") == images[0]
+
+
+def test_url_for_publishes_local_files(tmp_path):
+    store = LocalFileStore(str(tmp_path / "staged"), "http://127.0.0.1:0", host="127.0.0.1", port=0).start()
+    try:
+        store.public_url = f"http://127.0.0.1:{store.port}"
+        stager = InputStager(store)
+        image = _file(tmp_path / "a.jpg", b"jpeg bytes")
+        url = stager.url_for(image)
+        assert stager.url_for(image) == url
+        assert stager.url_for("https://example.com/b.jpg") == "https://example.com/b.jpg"
+        with urllib.request.urlopen(url) as response:
+            assert response.read() == b"jpeg bytes"
+    finally:
+        store.stop()
+
+
+def test_multipart_stream_matches_its_length(tmp_path):
+    image = _file(tmp_path / "a.jpg", b"x" * 3000)
+    body = MultipartStream({"metadata": "{}"}, {"content": image})
+    data = b"".join(body)
+    assert len(data) == len(body)
+    assert b'filename="a.jpg"\r\nContent-Type: image/jpeg' in data
+
+    # requests sends it with a Content-Length instead of chunked.
+    prepared = requests.Request("POST", "http://example.com", data=MultipartStream(files={"f": image})).prepare()
+    assert "Content-Length" in prepared.headers
@@ -0,0 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.common.transport import HTTPTransport
+
+
+def test_connections_per_host_are_capped(fake_server):
+    fake_server.behavior.request_latency = 0.1
+    transport = HTTPTransport(pool_maxsize=2)
+    url = f"{fake_server.url}/api/v1/task/missing"
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        statuses = list(executor.map(lambda _: transport.get(url).status_code, range(6)))
+    assert statuses == [404] * 6
+    assert fake_server.stats()["peak_connections"] <= 2
+    assert transport.stats()[fake_server.url]["connections"] == 2
+    transport.close()